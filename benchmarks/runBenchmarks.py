@@ -0,0 +1,378 @@
+"""
+Benchmarks - Time every stage of the RAG pipeline on a synthetic corpus.
+
+Stages: reading and splitting the files with the configured chunker
+(read_files), building the index (create_vectorstore), saving and loading it, retrieval
+(get_retriever().invoke and batch_retrieve) and answer generation
+(QAChain.get_answer). Each stage reports wall time, throughput, latency
+percentiles where it makes sense, and the peak resident memory of this
+process while it ran. Results are written as JSON; pass an earlier
+result with --compare to see what changed.
+
+Small randomly initialized stand-in models are used unless --real-models
+is given, so a run needs no downloads and no GPU. The corpus is read
+with syntheticCorpus.read_document, so only .docx files need an extra
+package (python-docx).
+
+Usage (from the repository root):
+    python -m benchmarks.runBenchmarks --files 500 --types txt:0.6,md:0.2,html:0.2
+    python -m benchmarks.runBenchmarks --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from benchmarks.syntheticCorpus import (
+    generate_corpus, missing_packages, parse_type_mix, read_document, sample_queries
+)
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # No procfs: fall back to the lifetime peak (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """Tracks the peak RSS of this process while a stage runs."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def latency_stats(seconds) -> dict:
+    """Mean and p50/p95/p99 of per-call latencies, in milliseconds."""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "count": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def run_stage(results: dict, name: str, fn):
+    """Run fn() under timing and memory tracking and store its metrics."""
+    print(f"\n▶ {name}")
+    with MemorySampler() as memory:
+        start = time.perf_counter()
+        value, metrics = fn()
+        elapsed = time.perf_counter() - start
+
+    metrics = dict(metrics)
+    metrics["seconds"] = elapsed
+    metrics["peak_rss_mb"] = memory.peak / 2**20
+    metrics["rss_growth_mb"] = (memory.peak - memory.start) / 2**20
+    results[name] = metrics
+    print("  " + ", ".join(f"{key}={_format(value_)}" for key, value_ in metrics.items()
+                           if not isinstance(value_, dict)))
+    return value
+
+
+def _format(value) -> str:
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def timed_calls(fn, items):
+    """Call fn on every item; return the results and per-call durations."""
+    outputs, durations = [], []
+    for item in items:
+        start = time.perf_counter()
+        outputs.append(fn(item))
+        durations.append(time.perf_counter() - start)
+    return outputs, durations
+
+
+def run(args) -> dict:
+    from content.fileScanner import list_files
+    from logic.qaChain import QAChain
+    from processor.tokenChunker import make_splitter
+    from tmp.vectorStore import VectorStoreManager, batch_retrieve
+
+    from instrumentation import MemorySink, instrumentation
+
+    # Per-stage breakdown of the pipeline (embedding, FAISS, prefill, ...)
+    breakdown = None
+    if args.instrument:
+        breakdown = MemorySink()
+        instrumentation.configure(sinks=[breakdown])
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="sol-bench-")
+    corpus_path = os.path.join(workdir, "corpus")
+    store_path = os.path.join(workdir, "vectorstore")
+    stages = {}
+
+    if args.real_models:
+        embedding_model, llm_model = config.EMBEDDING_MODEL, config.LLM_MODEL
+        llm_kwargs = None
+    else:
+        from benchmarks.standInModels import build_embedding_model, build_llm
+        models_dir = args.models_dir or os.path.join(workdir, "models")
+        embedding_model = build_embedding_model(models_dir)
+        llm_model = build_llm(models_dir)
+        llm_kwargs = {}
+
+    type_mix = parse_type_mix(args.types)
+    if os.path.exists(corpus_path):
+        shutil.rmtree(corpus_path)
+    corpus = run_stage(stages, "generate_corpus", lambda: _with_metrics(
+        generate_corpus(corpus_path, args.files, type_mix, args.words,
+                        duplicate_share=args.duplicates, seed=args.seed)
+    ))
+
+    splitter = make_splitter(args.chunk_size, args.chunk_overlap, args.chunker, embedding_model)
+
+    def ingest():
+        start = time.perf_counter()
+        documents = []
+        for file_path in list_files(corpus_path):
+            documents.extend(splitter.split_documents(read_document(file_path)))
+        elapsed = time.perf_counter() - start
+        return documents, {
+            "files": corpus["files"],
+            "chunks": len(documents),
+            "files_per_s": corpus["files"] / elapsed,
+            "chunks_per_s": len(documents) / elapsed,
+        }
+
+    documents = run_stage(stages, "read_files", ingest)
+
+    manager = VectorStoreManager(embedding_model, cache_path=None, index_type=args.index_type)
+
+    def load_embedding_model():
+        manager.engine.load()
+        return None, {}
+
+    run_stage(stages, "load_embedding_model", load_embedding_model)
+
+    def build():
+        start = time.perf_counter()
+        manager.create_vectorstore(documents)
+        chunks = len(manager.vectorstore.index_to_docstore_id)
+        return None, {
+            "chunks_in": len(documents),
+            "vectors": chunks,
+            "chunks_per_s": len(documents) / (time.perf_counter() - start),
+        }
+
+    run_stage(stages, "create_vectorstore", build)
+
+    def save():
+        if os.path.exists(store_path):
+            shutil.rmtree(store_path)
+        manager.save_vectorstore(store_path)
+        size = sum(os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path))
+        return None, {"bytes_on_disk": size}
+
+    run_stage(stages, "save_vectorstore", save)
+
+    # Reuse the already loaded embedding model; only the index load is timed
+    loaded = VectorStoreManager(embedding_model, cache_path=None, index_type=args.index_type)
+    loaded.engine = loaded.embeddings = manager.engine
+
+    def load():
+        loaded.load_vectorstore(store_path)
+        return None, {}
+
+    run_stage(stages, "load_vectorstore", load)
+
+    # Retrieval runs on the loaded store, as in a normal session
+    retriever = loaded.get_retriever({"k": args.k})
+    queries = sample_queries(args.queries, seed=args.seed + 1)
+    retriever.invoke(queries[0])
+
+    def retrieve():
+        _, durations = timed_calls(retriever.invoke, queries)
+        return None, {
+            "queries_per_s": len(queries) / sum(durations),
+            "latency": latency_stats(durations),
+        }
+
+    run_stage(stages, "retrieve", retrieve)
+
+    def retrieve_batch():
+        start = time.perf_counter()
+        batch_retrieve(retriever, queries)
+        elapsed = time.perf_counter() - start
+        return None, {"queries_per_s": len(queries) / elapsed}
+
+    run_stage(stages, "retrieve_batch", retrieve_batch)
+
+    if args.generate:
+        qa = QAChain(llm_model, config.PROMPT_TEMPLATE, lazy=False, model_kwargs=llm_kwargs,
+                     generation_kwargs={"max_new_tokens": args.max_new_tokens})
+        qa.create_chain(retriever)
+        questions = queries[:args.generate]
+        qa.get_answer(questions[0])
+
+        def generate():
+            _, durations = timed_calls(qa.get_answer, questions)
+            metrics = {
+                "questions_per_s": len(questions) / sum(durations),
+                "latency": latency_stats(durations),
+            }
+            if qa.acceptance_rate is not None:
+                metrics["draft_acceptance_rate"] = qa.acceptance_rate
+            return None, metrics
+
+        run_stage(stages, "get_answer", generate)
+
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_model": embedding_model if args.real_models else "stand-in",
+            "llm_model": llm_model if args.real_models else "stand-in",
+            "parameters": vars(args),
+            "corpus": corpus,
+        },
+        "stages": stages,
+    }
+    if breakdown is not None:
+        breakdown.report()
+        results["instrumentation"] = breakdown.summary()
+    return results
+
+
+def _with_metrics(stats):
+    return stats, {"files": stats["files"], "bytes": stats["bytes"]}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(metrics: dict, prefix: str = ""):
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+def compare(old: dict, new: dict):
+    """Print every metric present in both results with its relative change."""
+    print("\n" + "=" * 60)
+    print(f"Compared with {old['meta'].get('git_commit')} ({old['meta'].get('timestamp')})")
+    print("=" * 60)
+    for stage, metrics in new["stages"].items():
+        before = dict(_flatten(old["stages"].get(stage, {})))
+        for name, value in _flatten(metrics):
+            if name not in before:
+                continue
+            previous = before[name]
+            change = (value - previous) / previous * 100 if previous else 0.0
+            print(f"{stage:>22} {name:<22} {previous:>12.3f} -> {value:>12.3f} ({change:+.1f}%)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline on a synthetic corpus.")
+    parser.add_argument("--files", type=int, default=200, help="Files in the synthetic corpus")
+    parser.add_argument("--types", default="txt:0.6,md:0.2,html:0.2",
+                        help="File type mix, e.g. txt:0.6,md:0.2,docx:0.2 "
+                             "(docx needs python-docx)")
+    parser.add_argument("--words", type=int, default=1500, help="Average words per file")
+    parser.add_argument("--duplicates", type=float, default=0.0,
+                        help="Share of files that are exact copies of others")
+    parser.add_argument("--chunker", default=config.CHUNKER, choices=["tokens", "characters"])
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="In the chunker's unit (default: its configured size)")
+    parser.add_argument("--chunk-overlap", type=int, default=None)
+    parser.add_argument("--index-type", default=config.FAISS_INDEX_TYPE)
+    parser.add_argument("--queries", type=int, default=100, help="Retrieval queries")
+    parser.add_argument("--k", type=int, default=4, help="Chunks retrieved per query")
+    parser.add_argument("--generate", type=int, default=5,
+                        help="Questions answered by the LLM (0 skips generation)")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--instrument", action="store_true",
+                        help="Also record per-stage spans (see instrumentation.py)")
+    parser.add_argument("--real-models", action="store_true",
+                        help="Use the models from config.py instead of stand-ins")
+    parser.add_argument("--models-dir", help="Where stand-in models are built and reused")
+    parser.add_argument("--workdir", help="Keep corpus and vectorstore in this folder")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary folder")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    try:
+        missing = missing_packages(parse_type_mix(args.types))
+    except ValueError as e:
+        parser.error(str(e))
+    if missing:
+        parser.error("--types " + ", ".join(
+            f"{ext[1:]} needs the '{package}' package (pip install {package})"
+            for ext, package in missing.items()
+        ))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
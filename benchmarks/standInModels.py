@@ -0,0 +1,95 @@
+"""
+Stand-in Models - Tiny randomly initialized models for offline benchmarks.
+
+They have the same architecture families and file layout as the real
+models (a BERT sentence-transformer and a GPT-2 causal LM), so the code
+paths being timed are the real ones. They are built once into a local
+folder and reused, so no network access is needed. Their answers are
+meaningless.
+"""
+
+import os
+
+from benchmarks.syntheticCorpus import VOCABULARY
+
+_SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def _write_vocab(path: str):
+    characters = [chr(c) for c in range(33, 127)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(_SPECIAL_TOKENS + characters + VOCABULARY))
+
+
+def build_embedding_model(models_dir: str, hidden_size: int = 384, layers: int = 4) -> str:
+    """
+    Create a sentence-transformer with a BERT encoder and mean pooling.
+
+    Returns:
+        Path to pass as the embedding model name
+    """
+    path = os.path.join(models_dir, f"embedding-{hidden_size}x{layers}")
+    if os.path.exists(os.path.join(path, "modules.json")):
+        return path
+
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    encoder_path = os.path.join(path, "encoder")
+    os.makedirs(encoder_path, exist_ok=True)
+    _write_vocab(os.path.join(encoder_path, "vocab.txt"))
+    tokenizer = BertTokenizerFast(vocab_file=os.path.join(encoder_path, "vocab.txt"))
+    tokenizer.model_max_length = 512
+
+    BertModel(BertConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=hidden_size,
+        num_hidden_layers=layers,
+        num_attention_heads=max(1, hidden_size // 64),
+        intermediate_size=hidden_size * 4,
+    )).save_pretrained(encoder_path)
+    tokenizer.save_pretrained(encoder_path)
+
+    transformer = models.Transformer(encoder_path, max_seq_length=512)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension())
+    SentenceTransformer(modules=[transformer, pooling]).save(path)
+    return path
+
+
+def build_llm(models_dir: str, hidden_size: int = 256, layers: int = 4) -> str:
+    """
+    Create a small GPT-2 causal LM with a word-level tokenizer.
+
+    Returns:
+        Path to pass as the LLM model name
+    """
+    path = os.path.join(models_dir, f"llm-{hidden_size}x{layers}")
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    characters = [chr(c) for c in range(33, 127)]
+    vocab = {token: i for i, token in enumerate(["<unk>", "<eos>"] + characters + VOCABULARY)}
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Sequence([
+        pre_tokenizers.WhitespaceSplit(), pre_tokenizers.Punctuation()
+    ])
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend, unk_token="<unk>", eos_token="<eos>", pad_token="<eos>"
+    )
+    tokenizer.model_max_length = 2048
+
+    GPT2LMHeadModel(GPT2Config(
+        vocab_size=len(vocab),
+        n_positions=2048,
+        n_embd=hidden_size,
+        n_layer=layers,
+        n_head=max(1, hidden_size // 64),
+        bos_token_id=1,
+        eos_token_id=1,
+    )).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
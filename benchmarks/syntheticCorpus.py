@@ -0,0 +1,191 @@
+"""
+Synthetic Corpus - Generate reproducible document folders for benchmarks.
+
+Text is drawn from a fixed vocabulary of numbered words so that the
+stand-in models in standInModels.py can tokenize it without any
+downloads. The same seed always produces the same files, and
+read_document() reads them back as Documents without the application's
+file loaders.
+"""
+
+import importlib.util
+import os
+import random
+import re
+from html import unescape
+from typing import Dict, List
+
+# Shared with the stand-in tokenizers
+VOCABULARY = [f"w{i}" for i in range(2000)]
+
+SUPPORTED_TYPES = (".txt", ".md", ".html", ".docx")
+
+# Formats that need an optional package: extension -> (module, pip package)
+_OPTIONAL_PACKAGES = {".docx": ("docx", "python-docx")}
+
+
+def parse_type_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse a file type mix such as "txt:0.6,md:0.2,docx:0.2".
+
+    Returns:
+        Extension -> share of files, normalized to sum to 1
+    """
+    mix = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        ext, _, weight = part.partition(":")
+        ext = ext if ext.startswith(".") else f".{ext}"
+        if ext not in SUPPORTED_TYPES:
+            raise ValueError(f"Unsupported file type '{ext}'. Choose from {SUPPORTED_TYPES}")
+        mix[ext] = float(weight) if weight else 1.0
+
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError(f"Invalid file type mix: '{spec}'")
+    return {ext: weight / total for ext, weight in mix.items()}
+
+
+def missing_packages(type_mix: Dict[str, float]) -> Dict[str, str]:
+    """Extension -> pip package for the types in the mix that cannot be written or read."""
+    return {
+        ext: package for ext, (module, package) in _OPTIONAL_PACKAGES.items()
+        if type_mix.get(ext) and importlib.util.find_spec(module) is None
+    }
+
+
+def _paragraphs(rng: random.Random, words: int) -> List[str]:
+    paragraphs = []
+    while words > 0:
+        length = min(words, rng.randint(40, 160))
+        sentence_words = rng.choices(VOCABULARY, k=length)
+        paragraphs.append(" ".join(sentence_words) + ".")
+        words -= length
+    return paragraphs
+
+
+def _write_txt(path, title, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(title + "\n\n" + "\n\n".join(paragraphs))
+
+
+def _write_md(path, title, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {title}\n\n")
+        for i, paragraph in enumerate(paragraphs):
+            if i % 4 == 0:
+                f.write(f"## Section {i // 4 + 1}\n\n")
+            f.write(paragraph + "\n\n")
+
+
+def _write_html(path, title, paragraphs):
+    body = "\n".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<html><head><title>{title}</title></head><body><h1>{title}</h1>\n{body}\n</body></html>")
+
+
+def _write_docx(path, title, paragraphs):
+    import docx
+
+    document = docx.Document()
+    document.add_heading(title, level=1)
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+_WRITERS = {
+    ".txt": _write_txt,
+    ".md": _write_md,
+    ".html": _write_html,
+    ".docx": _write_docx,
+}
+
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _read_html(path):
+    text = re.sub(r"<title>.*?</title>|<[^>]+>", " ", _read_text(path))
+    return unescape(re.sub(r"[ \t]+", " ", text)).strip()
+
+
+def _read_docx(path):
+    import docx
+
+    return "\n\n".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+
+
+_READERS = {
+    ".txt": _read_text,
+    ".md": _read_text,
+    ".html": _read_html,
+    ".docx": _read_docx,
+}
+
+
+def read_document(path: str) -> List:
+    """The text of a corpus file as a one-element list of Documents."""
+    from langchain_core.documents import Document
+
+    text = _READERS[os.path.splitext(path)[1].lower()](path)
+    return [Document(page_content=text, metadata={"source": path})]
+
+
+def generate_corpus(path: str, n_files: int, type_mix: Dict[str, float],
+                    words_per_file: int = 1500, duplicate_share: float = 0.0,
+                    seed: int = 0) -> Dict:
+    """
+    Write a synthetic corpus to `path`.
+
+    Files are spread over nested folders and vary in length around
+    words_per_file. A share of them can be exact copies of earlier files,
+    as found on backup drives.
+
+    Args:
+        path: Output folder (created if missing)
+        n_files: Number of files
+        type_mix: Extension -> share of files (see parse_type_mix)
+        words_per_file: Average words per file
+        duplicate_share: Fraction of files that copy an earlier file
+        seed: Random seed
+
+    Returns:
+        Dictionary with file counts by type and total bytes
+    """
+    rng = random.Random(seed)
+    extensions = list(type_mix)
+    weights = [type_mix[ext] for ext in extensions]
+    written = []
+    stats = {"files": 0, "by_type": {}, "bytes": 0}
+
+    for i in range(n_files):
+        ext = rng.choices(extensions, weights)[0]
+        folder = os.path.join(path, f"dept{i % 7}", f"year{2015 + i % 9}")
+        os.makedirs(folder, exist_ok=True)
+        file_path = os.path.join(folder, f"doc{i:06d}{ext}")
+
+        copies = [p for p in written if p.endswith(ext)]
+        if copies and rng.random() < duplicate_share:
+            with open(rng.choice(copies), "rb") as src, open(file_path, "wb") as dst:
+                dst.write(src.read())
+        else:
+            words = max(50, int(rng.gauss(words_per_file, words_per_file / 3)))
+            _WRITERS[ext](file_path, f"Document {i}", _paragraphs(rng, words))
+
+        written.append(file_path)
+        stats["files"] += 1
+        stats["by_type"][ext] = stats["by_type"].get(ext, 0) + 1
+        stats["bytes"] += os.path.getsize(file_path)
+
+    return stats
+
+
+def sample_queries(n: int, seed: int = 1, words: int = 8) -> List[str]:
+    """Questions made of corpus vocabulary, so retrieval finds real matches."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(VOCABULARY, k=words)) + "?" for _ in range(n)]
@@ -3,11 +3,157 @@ import os
 # Model Configuration
 EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
 LLM_MODEL = "microsoft/Phi-3.5-mini-instruct"
+# Passed to AutoModelForCausalLM.from_pretrained
+LLM_MODEL_KWARGS = {"device_map": "auto", "load_in_8bit": True, "torch_dtype": "auto"}
+# Inference backend (logic/inferenceBackend.py): "transformers" loads
+# LLM_MODEL with LLM_MODEL_KWARGS (8-bit needs a CUDA GPU), "torch_int8" and
+# "onnx" run int8-quantized on the CPU, "torch_cpu" unquantized. "auto"
+# picks the fastest one this host can run.
+LLM_BACKEND = "auto"
+LLM_THREADS = None          # CPU threads for inference (None = all cores)
+LLM_ONNX_DIR = "onnx_models"  # Exported and quantized models for "onnx"
+
+# Assisted decoding: a small draft model proposes tokens that LLM_MODEL
+# checks several at a time in one forward pass; answers stay the same.
+# Works best with a draft sharing LLM_MODEL's tokenizer (None = off)
+LLM_DRAFT_MODEL = None
+LLM_DRAFT_TOKENS = 8        # Tokens drafted per step to start with (adapted while generating)
+
+# Startup
+# Import heavy libraries on first use, load the LLM in a background thread
+# and the embedding model only when something needs to be embedded
+LAZY_LOADING = True
 
 # Paths
 PDF_PATH = "content/qlora_paper.pdf"
 VECTORSTORE_PATH = "vectorstore.db"
 
+# Indexing
+# Re-runs only embed new/changed files and drop vectors of deleted ones,
+# using a manifest saved inside VECTORSTORE_PATH
+INCREMENTAL_INDEXING = True
+# Processes used to parse and split files in parallel (1 = sequential)
+INGEST_WORKERS = os.cpu_count() or 1
+# Threads listing folders in parallel when scanning a drive; helps most
+# on USB and network mounts where each directory read waits on the device
+SCAN_WORKERS = 16
+# Files and folders skipped while scanning (glob patterns on the name, or
+# on the path relative to the scanned folder if they contain a '/')
+SCAN_IGNORE = [
+    ".git", "__pycache__", "node_modules", ".Trash*", ".Spotlight-V100",
+    ".fseventsd", "$RECYCLE.BIN", "System Volume Information", "~$*",
+]
+# Deduplication at ingest: identical files are parsed once, and chunks
+# that nearly match a stored chunk (MinHash estimate of word-shingle
+# Jaccard similarity) reuse its vector; every file is kept in "sources"
+DEDUP_FILES = True
+DEDUP_CHUNKS = True
+DEDUP_THRESHOLD = 0.9
+# Chunking (processor/tokenChunker.py): "tokens" sizes chunks in tokens of
+# EMBEDDING_MODEL and cuts at paragraph, sentence or word boundaries;
+# "characters" uses LangChain's RecursiveCharacterTextSplitter (1000/200 chars)
+CHUNKER = "tokens"
+# bge-small reads at most 512 tokens per chunk, including 2 special ones
+CHUNK_SIZE_TOKENS = 384
+CHUNK_OVERLAP_TOKENS = 64
+# Parsed-text cache (processor/textCache.py): pages extracted from files
+# that are slow to parse, keyed by file content and loader version, so
+# re-chunking or switching EMBEDDING_MODEL skips parsing (None = off)
+TEXT_CACHE_PATH = "text_cache.sqlite"
+TEXT_CACHE_MAX_MB = 1024
+TEXT_CACHE_EXTENSIONS = [".pdf", ".docx", ".doc", ".xlsx", ".xls", ".pptx", ".ppt", ".odt", ".epub"]
+# Chunks embedded and added to the index per batch; bounds peak memory
+EMBED_BATCH_SIZE = 256
+# Commit every embedded batch to <vectorstore path>.checkpoint so a build
+# that crashes or is stopped resumes where it left off on the next run
+BUILD_CHECKPOINTS = True
+
+# Embedding workers: chunks are sorted by token length, batched and encoded
+# in separate processes. None uses cores / threads-per-worker processes on
+# CPU-only machines and a single process when a GPU is present. Raise
+# EMBED_BATCH_SIZE so each call gives every worker several batches.
+EMBED_WORKERS = None
+EMBED_THREADS_PER_WORKER = 4
+EMBED_ENCODE_BATCH_SIZE = 32       # Most chunks per model call
+EMBED_MAX_BATCH_TOKENS = 8192      # Most padded tokens per model call
+
+# Embedding cache: chunk embeddings are reused across builds (None = off)
+EMBEDDING_CACHE_PATH = "embedding_cache"
+EMBEDDING_CACHE_MAX_MB = 2048
+
+# Vector index
+# "flat" (exact), "ivf_flat", "ivf_pq", "hnsw" or "sq8" (scalar-quantized)
+FAISS_INDEX_TYPE = "flat"
+FAISS_NLIST = 1024          # IVF lists (capped by the training sample size)
+FAISS_PQ_M = 96             # PQ sub-quantizers, i.e. bytes per vector
+FAISS_HNSW_M = 32           # HNSW neighbours per node
+FAISS_TRAIN_SIZE = 50000    # Vectors collected to train IVF/SQ indexes
+FAISS_NPROBE = 16           # IVF lists searched per query
+FAISS_EF_SEARCH = 64        # HNSW search breadth per query
+
+# Hybrid search: a BM25 keyword index is built alongside the vectors and
+# its results are merged with vector search by reciprocal rank fusion.
+# Exact identifiers and rare terms then rank well with a small k.
+HYBRID_SEARCH = True
+HYBRID_K = 4                # Chunks passed to the LLM per question
+HYBRID_FETCH_K = 20         # Candidates taken from each search before fusion
+HYBRID_RRF_K = 60           # Rank fusion constant; higher flattens rank differences
+HYBRID_DENSE_WEIGHT = 1.0
+HYBRID_SPARSE_WEIGHT = 1.0
+
+# Sharded vectorstore (python main.py shards ...): one independently
+# built store per drive ("drive"), per top-level folder ("folder") or per
+# path hash ("hash:<n>"), searched in parallel and merged
+SHARDED_VECTORSTORE_PATH = "vectorstore_shards"
+SHARD_PARTITION = "drive"
+SHARD_SEARCH_WORKERS = 8
+
+# Vectorstores saved by older versions used pickle. Only enable this for
+# stores you created yourself; they are converted on first load.
+ALLOW_LEGACY_PICKLE_LOAD = False
+
+# Question answering
+QA_BATCH_SIZE = 8           # Prompts per generation call in batch/async queries
+QA_BATCH_WAIT_MS = 20       # How long aquery waits to group concurrent questions
+
+# Prefix KV cache: the attention state of the prompt preamble and of recent
+# prompts is kept, so a question only prefills the tokens after the longest
+# prefix it shares with them (e.g. the same leading context chunks)
+PREFIX_CACHE_ENABLED = True
+PREFIX_CACHE_MAX_MB = 1024
+PREFIX_CACHE_MIN_TOKENS = 16      # Shorter shared prefixes are prefilled normally
+
+# Query server (python main.py serve): one model shared by all clients
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_SOCKET_PATH = None         # Unix socket path; replaces host/port when set
+SERVER_MAX_QUEUE = 64             # Waiting questions beyond this get 503 (retry later)
+SERVER_REQUEST_TIMEOUT_S = 120    # Questions not answered in time get 504
+SERVER_MAX_BODY_BYTES = 65536
+
+# Context assembly: overlapping chunks are merged, near-duplicates dropped
+# and the rest packed into this many tokens (None = no limit)
+CONTEXT_MAX_TOKENS = 1536
+CONTEXT_DEDUP_THRESHOLD = 0.8     # Estimated Jaccard similarity of a duplicate
+
+# Answer cache: reuse answers for repeated or reworded questions
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_THRESHOLD = 0.95      # Cosine similarity for a near-duplicate hit
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_TTL_SECONDS = 86400
+ANSWER_CACHE_PATH = "answer_cache.jsonl"  # Appended per answer; None keeps it in memory only
+
+# Instrumentation: timing spans and counters for every pipeline stage
+# (ingest, embedding, retrieval, context, generation). Disabled spans are
+# no-ops. Sinks: "memory" prints a per-stage summary at exit,
+# "log:<file>" writes JSON lines ("log:-" for stderr) and
+# "prometheus:<file>" keeps a text file for node_exporter's textfile collector
+INSTRUMENTATION_ENABLED = False
+INSTRUMENTATION_SINKS = ["memory"]
+# Stages run under cProfile ("*" for all), one .prof file per run
+PROFILE_STAGES = []
+PROFILE_DIR = "profiles"
+
 # Prompt Template
 PROMPT_TEMPLATE = """
 You are an assistant for question-answering tasks.
@@ -4,17 +4,43 @@ or any mounted storage device without copying to local folder.
 """
 
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
 from processor.contentReader import ContentReader
+from content.fileScanner import list_files, list_subdirectories, scan_files
+from processor.deduplicator import group_identical_files
+from processor.textCache import TextCache
+from processor.tokenChunker import make_splitter
+from instrumentation import count, record, span
+import config
 import platform
 
 class ExternalDriveReader(ContentReader):
     """Read documents directly from external drives and storage devices."""
     
-    def __init__(self, chunk_size=1000, chunk_overlap=200):
-        super().__init__(content_dir="", chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    def __init__(self, chunk_size=None, chunk_overlap=None, workers=None,
+                 chunker=config.CHUNKER, tokenizer_name=config.EMBEDDING_MODEL,
+                 text_cache_path=config.TEXT_CACHE_PATH):
+        splitter = make_splitter(chunk_size, chunk_overlap, chunker, tokenizer_name)
+        super().__init__(content_dir="", chunk_size=splitter.chunk_size,
+                         chunk_overlap=splitter.chunk_overlap)
+        # Sized in tokens of the embedding model unless chunker="characters"
+        self.text_splitter = splitter
+        # Parsed pages of slow formats, reused when only chunking or the
+        # embedding model changed (see _load_file)
+        self.text_cache = TextCache(text_cache_path) if text_cache_path else None
         self.detected_drives = []
+        # Number of processes used to parse and split files (1 = sequential)
+        self.workers = workers if workers is not None else config.INGEST_WORKERS
+        # Threads listing folders in parallel while scanning
+        self.scan_workers = config.SCAN_WORKERS
+    
+    def get_all_files(self) -> List[str]:
+        """List all files under content_dir with the parallel scanner."""
+        return list_files(self.content_dir, workers=self.scan_workers)
     
     def detect_drives(self) -> List[str]:
         """
@@ -39,8 +65,7 @@ class ExternalDriveReader(ContentReader):
             # macOS: Check /Volumes
             volumes_path = "/Volumes"
             if os.path.exists(volumes_path):
-                for volume in os.listdir(volumes_path):
-                    drive_path = os.path.join(volumes_path, volume)
+                for _, drive_path in list_subdirectories(volumes_path):
                     if os.path.ismount(drive_path):
                         drives.append(drive_path)
         
@@ -50,13 +75,14 @@ class ExternalDriveReader(ContentReader):
             for mount_base in mount_points:
                 if os.path.exists(mount_base):
                     # Check user-specific mounts
-                    for user_dir in os.listdir(mount_base):
-                        user_path = os.path.join(mount_base, user_dir)
-                        if os.path.isdir(user_path):
-                            for mount in os.listdir(user_path):
-                                drive_path = os.path.join(user_path, mount)
-                                if os.path.ismount(drive_path):
-                                    drives.append(drive_path)
+                    for _, user_path in list_subdirectories(mount_base):
+                        try:
+                            mounts = list_subdirectories(user_path)
+                        except PermissionError:
+                            continue
+                        for _, drive_path in mounts:
+                            if os.path.ismount(drive_path):
+                                drives.append(drive_path)
         
         self.detected_drives = drives
         return drives
@@ -118,15 +144,8 @@ class ExternalDriveReader(ContentReader):
             print("=" * 60)
             
             try:
-                items = []
-                # List directories
-                for item in os.listdir(current_path):
-                    item_path = os.path.join(current_path, item)
-                    if os.path.isdir(item_path):
-                        items.append(("📁", item, item_path))
-                
-                # Sort directories
-                items.sort(key=lambda x: x[1].lower())
+                # List directories, sorted by name
+                items = [("📁", name, path) for name, path in list_subdirectories(current_path)]
                 
                 # Display options
                 print("\nDirectories:")
@@ -169,21 +188,19 @@ class ExternalDriveReader(ContentReader):
             except Exception as e:
                 print(f"Error: {e}")
     
-    def read_from_drive(self, drive_path: str, 
-                       subfolder: Optional[str] = None,
-                       file_types: Optional[List[str]] = None,
-                       split_docs: bool = True) -> List:
+    def collect_files(self, drive_path: str,
+                      subfolder: Optional[str] = None,
+                      file_types: Optional[List[str]] = None) -> Tuple[str, List[str]]:
         """
-        Read all documents from a drive or specific subfolder.
+        Resolve the folder to read and list the files in it.
         
         Args:
             drive_path: Path to the drive (e.g., 'D:\\' or '/media/usb')
             subfolder: Optional subfolder within the drive
             file_types: Filter by file extensions (e.g., ['.pdf', '.docx'])
-            split_docs: Whether to split documents into chunks
             
         Returns:
-            List of Document objects
+            Tuple of (full folder path, list of file paths)
         """
         # Construct full path
         if subfolder:
@@ -204,32 +221,56 @@ class ExternalDriveReader(ContentReader):
         # Set the content directory temporarily
         self.content_dir = full_path
         
-        # Get all files
-        all_files = self.get_all_files()
+        # File types are filtered while scanning, not afterwards
+        with span("ingest.scan") as stage:
+            all_files = list_files(full_path, extensions=file_types, workers=self.scan_workers)
+            stage.set(files=len(all_files))
         
-        # Filter by file types if specified
-        if file_types:
-            all_files = [f for f in all_files if any(f.endswith(ext) for ext in file_types)]
+        return full_path, all_files
+    
+    def iter_from_drive(self, drive_path: str,
+                        subfolder: Optional[str] = None,
+                        file_types: Optional[List[str]] = None,
+                        split_docs: bool = True) -> Iterator:
+        """
+        Stream documents from a drive or specific subfolder.
+        
+        Only the chunks of the files currently being read are held in
+        memory, so the result can be fed straight into
+        VectorStoreManager.create_vectorstore for drives of any size.
+        
+        Args:
+            drive_path: Path to the drive (e.g., 'D:\\' or '/media/usb')
+            subfolder: Optional subfolder within the drive
+            file_types: Filter by file extensions (e.g., ['.pdf', '.docx'])
+            split_docs: Whether to split documents into chunks
+            
+        Yields:
+            Document objects, file by file
+        """
+        full_path, all_files = self.collect_files(drive_path, subfolder, file_types)
         
         print(f"Found {len(all_files)} file(s) to process")
         
-        # Read all files
-        results = {}
-        for file_path in all_files:
-            file_name = os.path.basename(file_path)
-            print(f"\nReading: {file_name}")
+        yield from iter_documents(self, all_files, split_docs, workers=self.workers)
+    
+    def read_from_drive(self, drive_path: str, 
+                       subfolder: Optional[str] = None,
+                       file_types: Optional[List[str]] = None,
+                       split_docs: bool = True) -> List:
+        """
+        Read all documents from a drive or specific subfolder.
+        
+        Args:
+            drive_path: Path to the drive (e.g., 'D:\\' or '/media/usb')
+            subfolder: Optional subfolder within the drive
+            file_types: Filter by file extensions (e.g., ['.pdf', '.docx'])
+            split_docs: Whether to split documents into chunks
             
-            documents = self.read_single_file(file_path)
-            if documents:
-                if split_docs:
-                    documents = self.text_splitter.split_documents(documents)
-                results[file_path] = documents
-                print(f"  ✓ Loaded {len(documents)} chunk(s)")
-        
-        # Combine all documents
-        all_documents = []
-        for docs in results.values():
-            all_documents.extend(docs)
+        Returns:
+            List of Document objects
+        """
+        all_documents = list(self.iter_from_drive(drive_path, subfolder, file_types, split_docs))
         
         print("\n" + "=" * 60)
         print(f"Total documents loaded: {len(all_documents)}")
@@ -237,33 +278,41 @@ class ExternalDriveReader(ContentReader):
         
         return all_documents
     
-    def quick_scan(self, drive_path: str) -> Dict:
+    def quick_scan(self, drive_path: str,
+                   file_types: Optional[List[str]] = None,
+                   progress_every: int = 10000) -> Dict:
         """
         Quick scan to show file statistics without loading content.
         
+        Sizes come from the same directory listing as the file names, and
+        a running count is printed while the scan is still going.
+        
         Args:
             drive_path: Path to scan
+            file_types: Only count files with these extensions
+            progress_every: Print progress after this many files (0 = never)
             
         Returns:
             Dictionary with file statistics
         """
         self.content_dir = drive_path
-        all_files = self.get_all_files()
         
         stats = {
-            'total_files': len(all_files),
+            'total_files': 0,
             'by_extension': {},
             'total_size': 0
         }
         
-        for file_path in all_files:
-            ext = Path(file_path).suffix.lower()
+        for entry in scan_files(drive_path, extensions=file_types,
+                                workers=self.scan_workers, with_stat=True):
+            ext = Path(entry.path).suffix.lower()
             stats['by_extension'][ext] = stats['by_extension'].get(ext, 0) + 1
+            stats['total_size'] += entry.size
+            stats['total_files'] += 1
             
-            try:
-                stats['total_size'] += os.path.getsize(file_path)
-            except:
-                pass
+            if progress_every and stats['total_files'] % progress_every == 0:
+                print(f"  ...{stats['total_files']} file(s) so far "
+                      f"({self._format_bytes(stats['total_size'])})")
         
         return stats
     
@@ -282,8 +331,176 @@ class ExternalDriveReader(ContentReader):
         return f"{bytes_size:.2f} PB"
 
 
-def interactive_drive_selection():
-    """Interactive mode to select and read from external drive."""
+# Reader copy owned by each ingestion worker process
+_worker_reader = None
+
+
+def _init_worker(reader: ContentReader):
+    """Keep one reader per worker so it is only pickled once."""
+    global _worker_reader
+    _worker_reader = reader
+
+
+def _load_file(reader: ContentReader, file_path: str, split_docs: bool):
+    """
+    Parse and optionally split a single file.
+    
+    Parsed pages come from the reader's text_cache when it has one, so any
+    ContentReader can use the cache by setting that attribute.
+    
+    Returns:
+        Tuple of (file_path, documents, error, seconds, cached). Documents
+        is None and error holds the message when the file could not be
+        read; cached tells whether parsing was skipped.
+    """
+    start = time.perf_counter()
+    cached = False
+    try:
+        text_cache = getattr(reader, "text_cache", None)
+        if text_cache is not None:
+            documents, cached = text_cache.read(reader, file_path)
+        else:
+            documents = reader.read_single_file(file_path)
+        documents = documents or []
+        if documents and split_docs:
+            documents = reader.text_splitter.split_documents(documents)
+        return file_path, documents, None, time.perf_counter() - start, cached
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}", time.perf_counter() - start, cached
+
+
+def _load_file_in_worker(file_path: str, split_docs: bool):
+    return _load_file(_worker_reader, file_path, split_docs)
+
+
+def iter_file_documents(reader: ContentReader, file_paths: List[str],
+                        split_docs: bool = True,
+                        workers: int = 1,
+                        dedup_files: bool = config.DEDUP_FILES) -> Iterator[Tuple[str, Optional[List]]]:
+    """
+    Read files and yield their documents in the order of `file_paths`.
+    
+    Works with any ContentReader, so local folders and external drives
+    share the same loading loop. With more than one worker, files are
+    parsed and split in a process pool; at most a few files per worker
+    are in flight, so results stream back without piling up in memory.
+    A file that fails to load is reported and does not stop the batch.
+    
+    With dedup_files, files with identical content are only parsed once;
+    each copy is yielded right after the original with the same chunks,
+    their source set to the copy's path.
+    
+    Args:
+        reader: Reader used to parse and split each file
+        file_paths: Files to read, in order
+        split_docs: Whether to split documents into chunks
+        workers: Number of worker processes (1 = read in this process)
+        dedup_files: Parse identical files only once
+        
+    Yields:
+        Tuples of (file_path, list of Document objects), or
+        (file_path, None) for files that failed to load
+    """
+    copies = {}
+    if dedup_files and len(file_paths) > 1:
+        with span("ingest.dedup_files", files=len(file_paths)):
+            file_paths, copies = group_identical_files(file_paths)
+        skipped = sum(len(paths) for paths in copies.values())
+        if skipped:
+            print(f"Skipping {skipped} file(s) identical to another file")
+    
+    if workers <= 1 or len(file_paths) <= 1:
+        results = (_load_file(reader, path, split_docs) for path in file_paths)
+        yield from _with_copies(_report_loaded(results), copies)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(reader,)) as executor:
+        results = _ordered_results(executor, file_paths, split_docs, workers)
+        yield from _with_copies(_report_loaded(results), copies)
+
+
+def iter_documents(reader: ContentReader, file_paths: List[str],
+                   split_docs: bool = True, workers: int = 1) -> Iterator:
+    """
+    Stream the documents of all files as one flat sequence.
+    
+    Args:
+        reader: Reader used to parse and split each file
+        file_paths: Files to read, in order
+        split_docs: Whether to split documents into chunks
+        workers: Number of worker processes (1 = read in this process)
+        
+    Yields:
+        Document objects, file by file
+    """
+    for _, documents in iter_file_documents(reader, file_paths, split_docs, workers):
+        if documents:
+            yield from documents
+
+
+def _ordered_results(executor, file_paths, split_docs, workers):
+    """Submit files through a bounded window and yield results in input order."""
+    window = deque()
+    pending = iter(file_paths)
+    
+    for file_path in pending:
+        window.append(executor.submit(_load_file_in_worker, file_path, split_docs))
+        if len(window) >= workers * 2:
+            break
+    
+    while window:
+        yield window.popleft().result()
+        for file_path in pending:
+            window.append(executor.submit(_load_file_in_worker, file_path, split_docs))
+            break
+
+
+def _report_loaded(results):
+    """Print progress and record timings for loaded files; keep (path, documents)."""
+    for file_path, documents, error, seconds, cached in results:
+        file_name = os.path.basename(file_path)
+        print(f"\nReading: {file_name}")
+        
+        # Parsing may have run in a worker process, so it is timed there
+        # and reported here
+        chunks = len(documents) if documents else 0
+        record("ingest.read_file", seconds, extension=os.path.splitext(file_name)[1].lower(),
+               chunks=chunks, failed=error is not None, cached=cached)
+        count("ingest.files")
+        if cached:
+            count("ingest.text_cache_hits")
+        if error is not None:
+            count("ingest.failed_files")
+            print(f"  ⚠ Failed: {error}")
+        elif documents:
+            count("ingest.chunks", chunks)
+            print(f"  ✓ Loaded {len(documents)} chunk(s)" + (" (cached text)" if cached else ""))
+        
+        yield file_path, documents
+
+
+def _with_copies(results, copies):
+    """Yield each loaded file followed by its identical copies."""
+    for file_path, documents in results:
+        yield file_path, documents
+        for copy_path in copies.get(file_path, ()):
+            if documents is None:
+                yield copy_path, None
+                continue
+            yield copy_path, [
+                doc.model_copy(update={"metadata": dict(doc.metadata, source=copy_path)})
+                for doc in documents
+            ]
+
+
+def select_drive_source():
+    """
+    Interactive mode to pick a drive, folder and file type filter.
+    
+    Returns:
+        Tuple of (reader, folder path, file types) or None if cancelled
+    """
     reader = ExternalDriveReader()
     
     print("\n" + "=" * 60)
@@ -329,20 +546,31 @@ def interactive_drive_selection():
     
     # Step 4: Quick scan
     print("\nPerforming quick scan...")
-    stats = reader.quick_scan(read_path)
+    stats = reader.quick_scan(read_path, file_types=file_types)
     print(f"\nFound {stats['total_files']} file(s)")
     print(f"Total size: {reader._format_bytes(stats['total_size'])}")
     print("\nFile types:")
     for ext, count in stats['by_extension'].items():
         print(f"  {ext}: {count} file(s)")
     
-    # Step 5: Confirm and read
+    # Step 5: Confirm
     confirm = input("\nProceed with reading these files? (y/n): ").strip().lower()
     if confirm != 'y':
         print("Operation cancelled.")
         return None
     
-    # Step 6: Read documents
+    return reader, read_path, file_types
+
+
+def interactive_drive_selection():
+    """Interactive mode to select and read from external drive."""
+    selection = select_drive_source()
+    if selection is None:
+        return None
+    
+    reader, read_path, file_types = selection
+    
+    # Read documents
     documents = reader.read_from_drive(
         drive_path=read_path,
         file_types=file_types,
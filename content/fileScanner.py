@@ -0,0 +1,165 @@
+"""
+File Scanner - List the files under a folder quickly, even on slow drives.
+
+Directories are read with os.scandir, so file type checks come from the
+directory listing itself instead of one stat call per entry, and several
+subtrees are listed at once by a thread pool, which hides the latency of
+USB and network mounts. Extension filters and ignore patterns are applied
+during the walk: ignored folders are never opened. Files are yielded as
+soon as their directory has been listed.
+"""
+
+import fnmatch
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import config
+
+
+class FileEntry(NamedTuple):
+    """A file found by scan_files. Size and mtime are None unless requested."""
+    path: str
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+
+
+def normalize_extensions(extensions: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    """Lowercase extensions and make sure they start with a dot."""
+    if not extensions:
+        return None
+    return tuple(
+        ext if ext.startswith(".") else f".{ext}"
+        for ext in (e.strip().lower() for e in extensions) if ext
+    ) or None
+
+
+def _is_ignored(name: str, rel_path: str, ignore: Tuple[str, ...]) -> bool:
+    # Plain patterns match the entry name anywhere in the tree, patterns
+    # with a slash match the path relative to the scan root
+    for pattern in ignore:
+        target = rel_path if "/" in pattern else name
+        if fnmatch.fnmatch(target, pattern):
+            return True
+    return False
+
+
+def _scan_dir(path: str, root: str, extensions, ignore, with_stat: bool):
+    """
+    List one directory.
+
+    Returns:
+        Tuple of (files, subdirectories, error message or None)
+    """
+    files = []
+    dirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                if ignore and _is_ignored(entry.name, rel_path, ignore):
+                    continue
+                try:
+                    # Symlinked folders are not followed, so the walk cannot loop
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if extensions and not entry.name.lower().endswith(extensions):
+                        continue
+                    if with_stat:
+                        stat = entry.stat()
+                        files.append(FileEntry(entry.path, stat.st_size, stat.st_mtime))
+                    else:
+                        files.append(FileEntry(entry.path))
+                except OSError:
+                    # Broken link or entry removed while listing
+                    continue
+    except OSError as e:
+        return files, dirs, f"{type(e).__name__}: {e}"
+    return files, dirs, None
+
+
+def scan_files(root: str,
+               extensions: Optional[Iterable[str]] = None,
+               ignore: Optional[Iterable[str]] = None,
+               workers: int = config.SCAN_WORKERS,
+               with_stat: bool = False) -> Iterator[FileEntry]:
+    """
+    Walk `root` and yield its files as they are found.
+
+    Files come out in no particular order. Folders that cannot be read
+    are reported and skipped.
+
+    Args:
+        root: Folder to scan
+        extensions: Only yield files with these extensions (e.g. ['.pdf'])
+        ignore: Glob patterns for files and folders to skip; defaults to
+                config.SCAN_IGNORE
+        workers: Directories listed in parallel (1 = walk in this thread)
+        with_stat: Fill in size and mtime of each file
+
+    Yields:
+        FileEntry objects
+    """
+    extensions = normalize_extensions(extensions)
+    ignore = tuple(config.SCAN_IGNORE if ignore is None else ignore)
+
+    if workers <= 1:
+        stack = [root]
+        while stack:
+            files, dirs, error = _scan_dir(stack.pop(), root, extensions, ignore, with_stat)
+            if error is not None:
+                print(f"  ⚠ Skipped folder: {error}")
+            yield from files
+            stack.extend(reversed(dirs))
+        return
+
+    results = queue.Queue()
+
+    def scan(path):
+        try:
+            results.put(_scan_dir(path, root, extensions, ignore, with_stat))
+        except BaseException as e:
+            results.put(([], [], f"{type(e).__name__}: {e}"))
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        executor.submit(scan, root)
+        pending = 1
+        while pending:
+            files, dirs, error = results.get()
+            pending -= 1
+            for path in dirs:
+                executor.submit(scan, path)
+                pending += 1
+            if error is not None:
+                print(f"  ⚠ Skipped folder: {error}")
+            yield from files
+    finally:
+        # Also reached when the caller stops iterating early
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def list_files(root: str,
+               extensions: Optional[Iterable[str]] = None,
+               ignore: Optional[Iterable[str]] = None,
+               workers: int = config.SCAN_WORKERS) -> List[str]:
+    """All file paths under `root`, sorted so repeated scans match."""
+    return sorted(entry.path for entry in scan_files(root, extensions, ignore, workers))
+
+
+def list_subdirectories(path: str) -> List[Tuple[str, str]]:
+    """(name, path) of the folders directly inside `path`, by name."""
+    with os.scandir(path) as entries:
+        dirs = [(entry.name, entry.path) for entry in entries if _is_dir(entry)]
+    return sorted(dirs, key=lambda item: item[0].lower())
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
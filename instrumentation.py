@@ -0,0 +1,465 @@
+"""
+Instrumentation - Timing spans and counters for every pipeline stage.
+
+Code marks a stage with `with span("retrieve.faiss_search", queries=n):`
+and counts things with `count("generate.tokens_out", n)`. Measurements go
+to pluggable sinks: JSON lines, a Prometheus text file, or an in-memory
+aggregator that prints a per-stage summary. Profiling hooks can run any
+stage under cProfile, or start and stop an external profiler around it.
+
+While disabled, span() returns a shared no-op object and record()/count()
+return at once, so instrumented code pays one attribute check per call.
+
+Configured from config.py on import; call instrumentation.configure()
+to change it at runtime (e.g. in benchmarks).
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+import config
+
+
+class _NullSpan:
+    """Returned by span() while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """A timed stage; nested spans record the enclosing stage as parent."""
+
+    __slots__ = ("name", "attributes", "parent", "start", "_owner", "_hooks")
+
+    def __init__(self, owner: "Instrumentation", name: str, attributes: Dict):
+        self._owner = owner
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.start = None
+        self._hooks = ()
+
+    def set(self, **attributes):
+        """Attach values known only once the stage has run (tokens, sizes)."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self._owner._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self._hooks = self._owner._enter_hooks(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        for hook in reversed(self._hooks):
+            hook.__exit__(None, None, None)
+        self._owner._stack().pop()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self._owner._emit_span(self.name, seconds, self.attributes, self.parent)
+        return False
+
+
+class JsonLogSink:
+    """Writes one JSON object per span or counter update."""
+
+    def __init__(self, path: str = "-"):
+        """
+        Args:
+            path: File to append to, or "-" for stderr
+        """
+        self.path = path
+        if path == "-":
+            self._file = sys.stderr
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def span(self, name, seconds, attributes, parent):
+        self._write({"type": "span", "name": name, "seconds": seconds,
+                     "parent": parent, **attributes})
+
+    def count(self, name, value, labels):
+        self._write({"type": "counter", "name": name, "value": value, **labels})
+
+    def _write(self, event):
+        event = {"ts": time.time(), "pid": os.getpid(),
+                 "thread": threading.current_thread().name, **event}
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._file is not sys.stderr:
+            self._file.close()
+
+
+class PrometheusSink:
+    """
+    Keeps a Prometheus text exposition file up to date.
+
+    Stage durations become one histogram with a `stage` label, counters
+    become `sol_<name>_total`. The file is rewritten atomically at most
+    every `interval` seconds and on close, which suits node_exporter's
+    textfile collector.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, path: str, interval: float = 10.0):
+        self.path = path
+        self.interval = interval
+        self._histograms: Dict[str, List] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._written = 0.0
+
+    def span(self, name, seconds, attributes, parent):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [[0] * len(self.BUCKETS), 0, 0.0]
+            buckets, _, _ = histogram
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+        self._maybe_write()
+
+    def count(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_write()
+
+    def _maybe_write(self):
+        if time.monotonic() - self._written >= self.interval:
+            self.flush()
+
+    def render(self) -> str:
+        """Current metrics in the Prometheus text format."""
+        lines = [
+            "# HELP sol_stage_seconds Time spent per pipeline stage",
+            "# TYPE sol_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, (buckets, total, seconds) in sorted(self._histograms.items()):
+                for bound, hits in zip(self.BUCKETS, buckets):
+                    lines.append(f'sol_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {hits}')
+                lines.append(f'sol_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {total}')
+                lines.append(f'sol_stage_seconds_sum{{stage="{stage}"}} {seconds}')
+                lines.append(f'sol_stage_seconds_count{{stage="{stage}"}} {total}')
+
+            families = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                families.setdefault(_metric_name(name), []).append((labels, value))
+        for metric, samples in families.items():
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        self._written = time.monotonic()
+        text = self.render()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.flush()
+
+
+def _metric_name(name: str) -> str:
+    cleaned = "".join(c if c.isalnum() else "_" for c in name)
+    return f"sol_{cleaned}_total"
+
+
+class MemorySink:
+    """
+    Aggregates spans and counters in memory.
+
+    Keeps count, total, min and max per stage and the most recent
+    `max_samples` durations for percentiles.
+    """
+
+    def __init__(self, max_samples: int = 10000, print_on_close: bool = False):
+        self.max_samples = max_samples
+        self.print_on_close = print_on_close
+        self.stages: Dict[str, Dict] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, seconds, attributes, parent):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {
+                    "count": 0, "total": 0.0, "min": seconds, "max": seconds,
+                    "samples": deque(maxlen=self.max_samples),
+                }
+            stage["count"] += 1
+            stage["total"] += seconds
+            stage["min"] = min(stage["min"], seconds)
+            stage["max"] = max(stage["max"], seconds)
+            stage["samples"].append(seconds)
+
+    def count(self, name, value, labels):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict:
+        """
+        Returns:
+            Dictionary with per-stage timings in milliseconds
+            (count, total, mean, min, p50, p95, max) and counter totals
+        """
+        with self._lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                samples = sorted(stage["samples"])
+                stages[name] = {
+                    "count": stage["count"],
+                    "total_ms": stage["total"] * 1000,
+                    "mean_ms": stage["total"] / stage["count"] * 1000,
+                    "min_ms": stage["min"] * 1000,
+                    "p50_ms": _percentile(samples, 50) * 1000,
+                    "p95_ms": _percentile(samples, 95) * 1000,
+                    "max_ms": stage["max"] * 1000,
+                }
+            return {"stages": stages, "counters": dict(self.counters)}
+
+    def report(self):
+        """Print the summary as a table, slowest stages first."""
+        summary = self.summary()
+        if not summary["stages"] and not summary["counters"]:
+            return
+        print("\n" + "=" * 60)
+        print("Stage timings (ms)")
+        print("=" * 60)
+        print(f"{'stage':<28}{'count':>7}{'total':>10}{'mean':>9}{'p50':>9}{'p95':>9}")
+        for name, stage in sorted(summary["stages"].items(), key=lambda s: -s[1]["total_ms"]):
+            print(f"{name:<28}{stage['count']:>7}{stage['total_ms']:>10.1f}"
+                  f"{stage['mean_ms']:>9.2f}{stage['p50_ms']:>9.2f}{stage['p95_ms']:>9.2f}")
+        for name, value in sorted(summary["counters"].items()):
+            print(f"{name:<28}{value:>7}")
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.print_on_close:
+            self.report()
+
+
+def _percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(q / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class CProfileHook:
+    """
+    Runs selected stages under cProfile and writes one .prof file per run.
+
+    Open the files with `python -m pstats` or snakeviz. Nested profiled
+    stages are covered by the outer profile.
+    """
+
+    def __init__(self, stages: Iterable[str], output_dir: str = "profiles"):
+        self.stages = set(stages)
+        self.output_dir = output_dir
+        self._local = threading.local()
+
+    def __call__(self, name: str):
+        if "*" not in self.stages and name not in self.stages:
+            return None
+        if getattr(self._local, "active", False):
+            return None
+        return _Profiled(self, name)
+
+
+class _Profiled:
+    def __init__(self, hook: CProfileHook, name: str):
+        self.hook = hook
+        self.name = name
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this thread
+            self.profiler = None
+            return self
+        self.hook._local.active = True
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is None:
+            return False
+        self.profiler.disable()
+        self.hook._local.active = False
+        os.makedirs(self.hook.output_dir, exist_ok=True)
+        file_name = f"{self.name}-{os.getpid()}-{time.time_ns()}.prof"
+        self.profiler.dump_stats(os.path.join(self.hook.output_dir, file_name))
+        return False
+
+
+def make_sink(spec: str):
+    """
+    Build a sink from a config string.
+
+    "memory" -> MemorySink printing its summary at exit,
+    "log:<path>" -> JsonLogSink ("log:-" for stderr),
+    "prometheus:<path>" -> PrometheusSink
+    """
+    kind, _, target = spec.partition(":")
+    if kind == "memory":
+        return MemorySink(print_on_close=True)
+    if kind == "log":
+        return JsonLogSink(target or "-")
+    if kind == "prometheus":
+        if not target:
+            raise ValueError("The prometheus sink needs a file path, e.g. 'prometheus:metrics.prom'")
+        return PrometheusSink(target)
+    raise ValueError(f"Unknown instrumentation sink '{spec}'")
+
+
+class Instrumentation:
+    """Dispatches spans and counters to sinks and runs profiling hooks."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sinks = []
+        # Callables taking a stage name and returning a context manager
+        # to run around it, or None to leave the stage alone
+        self.hooks: List[Callable] = []
+        self._local = threading.local()
+
+    def configure(self, enabled: bool = True, sinks: Iterable = (),
+                  profile_stages: Iterable[str] = (), profile_dir: str = config.PROFILE_DIR):
+        """
+        Replace the current sinks and hooks.
+
+        Args:
+            enabled: Turn instrumentation on or off
+            sinks: Sink objects or config strings (see make_sink)
+            profile_stages: Stage names to run under cProfile ("*" for all)
+            profile_dir: Where .prof files are written
+        """
+        self.close()
+        self.sinks = [make_sink(sink) if isinstance(sink, str) else sink for sink in sinks]
+        profile_stages = list(profile_stages)
+        self.hooks = [CProfileHook(profile_stages, profile_dir)] if profile_stages else []
+        self.enabled = enabled and bool(self.sinks or self.hooks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        self.enabled = True
+        return sink
+
+    def add_hook(self, hook: Callable):
+        """Run hook(stage_name) around every stage, e.g. to drive py-spy or perf."""
+        self.hooks.append(hook)
+        self.enabled = True
+        return hook
+
+    def span(self, name: str, **attributes):
+        """Context manager timing one stage."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def record(self, name: str, seconds: float, **attributes):
+        """Report a stage that was timed elsewhere (e.g. in another thread)."""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        self._emit_span(name, seconds, attributes, stack[-1].name if stack else None)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Add to a counter."""
+        if not self.enabled:
+            return
+        for sink in self.sinks:
+            sink.count(name, value, labels)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter_hooks(self, name: str):
+        entered = []
+        for hook in self.hooks:
+            manager = hook(name)
+            if manager is not None:
+                manager.__enter__()
+                entered.append(manager)
+        return entered
+
+    def _emit_span(self, name, seconds, attributes, parent):
+        for sink in self.sinks:
+            sink.span(name, seconds, attributes, parent)
+
+
+instrumentation = Instrumentation()
+if config.INSTRUMENTATION_ENABLED:
+    instrumentation.configure(
+        sinks=config.INSTRUMENTATION_SINKS,
+        profile_stages=config.PROFILE_STAGES,
+        profile_dir=config.PROFILE_DIR
+    )
+atexit.register(instrumentation.close)
+
+span = instrumentation.span
+record = instrumentation.record
+count = instrumentation.count
@@ -0,0 +1,252 @@
+"""
+Answer Cache - Reuse answers for repeated and near-duplicate questions.
+
+Exact repeats are found by normalized question text; rewordings by cosine
+similarity of question embeddings from the VectorStoreManager's model.
+Every entry is tied to the version of the index it was answered from and
+to the generator signature (model, prompt and generation settings, see
+QAChain.answer_signature), so rebuilding or updating the index or
+changing how answers are generated invalidates it automatically.
+
+The optional file is a JSON-lines log: a header with that version, then
+one line per stored answer. Each answer only appends its line; the file
+is rewritten when the version changes, when loading it dropped expired
+or superseded lines, or when such lines outnumber the live entries.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class AnswerCache:
+    """LRU/TTL cache of answers keyed by index version and question."""
+
+    def __init__(self, vector_manager, similarity_threshold: float = 0.95,
+                 max_entries: int = 1000, ttl_seconds: Optional[float] = 86400,
+                 path: Optional[str] = None, generator: str = ""):
+        """
+        Args:
+            vector_manager: Provides the embedding model and index version
+            similarity_threshold: Minimum cosine similarity for a
+                                  near-duplicate hit (None disables it)
+            max_entries: Least recently used entries are evicted beyond this
+            ttl_seconds: Entries older than this are ignored (None = forever)
+            path: Optional JSON-lines file to persist the cache across runs
+            generator: Signature of what produces the answers (see
+                       QAChain.answer_signature); entries stored under
+                       another signature are dropped
+        """
+        self.vector_manager = vector_manager
+        self.generator = generator
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+        self._entries = OrderedDict()
+        self._version = None
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Lines in the file, and whether it must be rewritten before the
+        # next append (new index version, cleared)
+        self._log_lines = 0
+        self._rewrite = True
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def get(self, question: str) -> Optional[str]:
+        """Return a cached answer for the question or a close rewording."""
+        return self.lookup(question)[0]
+
+    def lookup(self, question: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Cached answer for the question or a close rewording.
+
+        Returns:
+            Tuple of (answer or None, the question's embedding if it was
+            computed for the search). Pass the embedding to put() after a
+            miss so the question is not embedded twice.
+        """
+        with self._lock:
+            self._check_version()
+            key = normalize_question(question)
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["answer"], None
+                del self._entries[key]
+                self._matrix = None
+
+        similar, vector = self._find_similar(question)
+        with self._lock:
+            if similar is not None and similar in self._entries:
+                self._entries.move_to_end(similar)
+                self.hits += 1
+                return self._entries[similar]["answer"], vector
+            self.misses += 1
+            return None, vector
+
+    def put(self, question: str, answer: str, vector: Optional[np.ndarray] = None):
+        """
+        Store the answer produced for a question.
+
+        Args:
+            question: The question as asked
+            answer: Generated answer
+            vector: The question's embedding from lookup(), if it has one
+        """
+        if vector is None and self.similarity_threshold is not None:
+            vector = self._embed(question)
+
+        with self._lock:
+            self._check_version()
+            key = normalize_question(question)
+            entry = {
+                "answer": answer,
+                "created": time.time(),
+                "vector": vector,
+            }
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+            if self.path:
+                self._append(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            if self.path:
+                self._save()
+
+    def _check_version(self):
+        """Drop every entry once the index or the generator has changed."""
+        version = f"{self.vector_manager.version}|{self.generator}"
+        if version != self._version:
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+            self._rewrite = True
+
+    def _expired(self, entry) -> bool:
+        return self.ttl_seconds is not None and time.time() - entry["created"] > self.ttl_seconds
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.vector_manager.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _find_similar(self, question: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Key of the most similar cached question above the threshold, and its embedding."""
+        if self.similarity_threshold is None:
+            return None, None
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix_keys = [
+                    key for key, entry in self._entries.items()
+                    if entry["vector"] is not None and not self._expired(entry)
+                ]
+                self._matrix = (
+                    np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+                    if self._matrix_keys else np.empty((0, 0), dtype=np.float32)
+                )
+            matrix, keys = self._matrix, self._matrix_keys
+
+        vector = self._embed(question)
+        if not keys:
+            return None, vector
+
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None, vector
+
+        key = keys[best]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                return None, vector
+        return key, vector
+
+    @staticmethod
+    def _line(key, entry) -> str:
+        return json.dumps({
+            "question": key,
+            "answer": entry["answer"],
+            "created": entry["created"],
+            "vector": entry["vector"].tolist() if entry["vector"] is not None else None,
+        }) + "\n"
+
+    def _append(self, key, entry):
+        """Add one stored answer to the file, rewriting it when it is stale or bloated."""
+        if self._rewrite or self._log_lines >= 2 * len(self._entries) + 16:
+            self._save()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(self._line(key, entry))
+        self._log_lines += 1
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": self._version}) + "\n")
+            for key, entry in self._entries.items():
+                f.write(self._line(key, entry))
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(self._entries)
+        self._rewrite = False
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines:
+            return
+
+        header, items = lines[0], lines[1:]
+        if "entries" in header:
+            # Single JSON object written by earlier versions
+            items = header["entries"]
+        self._version = header.get("version")
+
+        for item in items:
+            entry = {
+                "answer": item["answer"],
+                "created": item["created"],
+                "vector": np.asarray(item["vector"], dtype=np.float32) if item["vector"] else None,
+            }
+            # Later lines replace earlier answers to the same question
+            self._entries.pop(item["question"], None)
+            if not self._expired(entry):
+                self._entries[item["question"]] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._log_lines = len(items)
+        self._rewrite = "entries" in header
+        if len(self._entries) < len(items):
+            # Expired, superseded or evicted lines: compact now so the
+            # next load does not read them again
+            self._save()
@@ -0,0 +1,166 @@
+"""
+Context Builder - Turn retrieved chunks into a compact prompt context.
+
+Retrieved chunks often repeat each other: neighbouring chunks of one file
+share the splitter's overlap, and the same passage can be indexed from
+several copies of a document. Every repeated token lengthens prefill,
+which dominates response time for long prompts on CPU. The builder
+    1. merges chunks of the same source and page that overlap or touch,
+    2. drops near-duplicates (MinHash over word shingles),
+    3. packs what is left, best ranked first, into a token budget.
+"""
+
+from typing import Callable, List, Optional
+
+from processor.textSimilarity import MinHasher, estimate_similarity, find_overlap
+import config
+
+# A piece cut down to fewer tokens than this is left out instead
+MIN_TRUNCATED_TOKENS = 32
+
+
+class _Piece:
+    __slots__ = ("text", "source", "page", "rank", "start")
+
+    def __init__(self, text, source, page, rank, start):
+        self.text = text
+        self.source = source
+        # start_index counts from the start of the loaded document, which
+        # is one page for PDFs; offsets only compare within the same page
+        self.page = page
+        self.rank = rank
+        self.start = start
+
+
+def _approx_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return (len(text) + 3) // 4
+
+
+class ContextBuilder:
+    """Merges, deduplicates and budgets retrieved chunks."""
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None,
+                 max_tokens: Optional[int] = config.CONTEXT_MAX_TOKENS,
+                 dedup_threshold: Optional[float] = config.CONTEXT_DEDUP_THRESHOLD,
+                 min_overlap: int = 20, separator: str = "\n\n"):
+        """
+        Args:
+            count_tokens: Returns the number of model tokens in a text;
+                          estimated from its length if not given
+            max_tokens: Token budget for the whole context (None = no limit)
+            dedup_threshold: Estimated Jaccard similarity at which a chunk
+                             counts as a duplicate of a better ranked one
+                             (None keeps near-duplicates)
+            min_overlap: Shortest shared text (characters) that merges
+                         two chunks of the same source
+            separator: Placed between the pieces of the context
+        """
+        self.count_tokens = count_tokens or _approx_tokens
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.min_overlap = min_overlap
+        self.separator = separator
+        self.hasher = MinHasher()
+
+    def build(self, docs) -> str:
+        """Context text for documents given best first."""
+        pieces = [
+            _Piece(doc.page_content, doc.metadata.get("source"), doc.metadata.get("page"),
+                   rank, doc.metadata.get("start_index"))
+            for rank, doc in enumerate(docs)
+            if doc.page_content.strip()
+        ]
+        pieces = self._merge(pieces)
+        if self.dedup_threshold is not None:
+            pieces = self._dedup(pieces)
+        pieces.sort(key=lambda piece: piece.rank)
+        return self.separator.join(self._pack([piece.text for piece in pieces]))
+
+    def _merge(self, pieces: List[_Piece]) -> List[_Piece]:
+        """Join chunks of one source and page that contain, overlap or touch each other."""
+        merged = True
+        while merged:
+            merged = False
+            for a in pieces:
+                for b in pieces:
+                    if a is b or a.source is None or (a.source, a.page) != (b.source, b.page):
+                        continue
+                    text = self._join(a, b)
+                    if text is None:
+                        continue
+                    a.text = text
+                    a.rank = min(a.rank, b.rank)
+                    pieces.remove(b)
+                    merged = True
+                    break
+                if merged:
+                    break
+        return pieces
+
+    def _join(self, a: _Piece, b: _Piece) -> Optional[str]:
+        """Text of `a` followed by `b` if they line up, otherwise None."""
+        if b.text in a.text:
+            return a.text
+
+        # Exact positions from a splitter with add_start_index=True
+        if a.start is not None and b.start is not None:
+            end = a.start + len(a.text)
+            if a.start <= b.start <= end:
+                return a.text + b.text[end - b.start:]
+            # The splitter strips the whitespace between touching chunks
+            if 0 < b.start - end <= 2:
+                return a.text + " " + b.text
+            return None
+
+        overlap = find_overlap(a.text, b.text, self.min_overlap)
+        if overlap:
+            return a.text + b.text[overlap:]
+        return None
+
+    def _dedup(self, pieces: List[_Piece]) -> List[_Piece]:
+        """Keep only the best ranked of each group of near-identical pieces."""
+        kept = []
+        signatures = []
+        for piece in sorted(pieces, key=lambda p: p.rank):
+            signature = self.hasher.signature(piece.text)
+            if any(estimate_similarity(signature, other) >= self.dedup_threshold
+                   for other in signatures):
+                continue
+            kept.append(piece)
+            signatures.append(signature)
+        return kept
+
+    def _pack(self, texts: List[str]) -> List[str]:
+        """Take texts in order while they fit the token budget."""
+        if self.max_tokens is None:
+            return texts
+
+        separator_tokens = self.count_tokens(self.separator) if self.separator.strip() else 0
+        packed = []
+        used = 0
+        for text in texts:
+            cost = self.count_tokens(text) + (separator_tokens if packed else 0)
+            if used + cost <= self.max_tokens:
+                packed.append(text)
+                used += cost
+                continue
+
+            remaining = self.max_tokens - used - (separator_tokens if packed else 0)
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                packed.append(self._truncate(text, remaining))
+                break
+            # Too little room for this one; a shorter one further down may fit
+        return packed
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Longest run of whole words from the start of `text` within max_tokens."""
+        words = text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
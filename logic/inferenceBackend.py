@@ -0,0 +1,253 @@
+"""
+Inference Backend - How the LLM is loaded and run.
+
+QAChain asks a backend for the model and uses it the same way whatever
+the backend, so query/get_answer do not change:
+
+    transformers   from_pretrained with LLM_MODEL_KWARGS as given (the
+                   8-bit bitsandbytes path needs a CUDA GPU)
+    torch_int8     CPU, Linear layers quantized to int8 weights with torch
+                   dynamic quantization
+    onnx           CPU, exported to ONNX Runtime with optimum and quantized
+                   to int8 (needs `pip install optimum[onnxruntime]`)
+    torch_cpu      CPU, unquantized; works everywhere
+
+"auto" walks the fixed preference list AUTO_ORDER and takes the first
+backend whose requirements are met (installed packages, a CUDA GPU,
+quantized CPU kernels). Nothing is measured: the order is a static guess
+at what is fastest, with transformers skipped when there is no GPU.
+"""
+
+import importlib.util
+import os
+import platform
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import config
+
+# Preference order for "auto", fastest first. Without a GPU the
+# transformers path is skipped: the CPU backends are made for that case.
+AUTO_ORDER = ["transformers", "onnx", "torch_int8", "torch_cpu"]
+
+# Loading options that only work on a GPU
+_GPU_ONLY_KWARGS = ("device_map", "load_in_8bit", "load_in_4bit", "quantization_config")
+
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _cuda_available() -> bool:
+    import torch
+    return torch.cuda.is_available()
+
+
+class InferenceBackend(ABC):
+    """Loads models for QAChain; subclasses decide how."""
+
+    name = None
+    # Whether generate() accepts a DynamicCache (prefix cache) and an
+    # assistant model (assisted decoding)
+    supports_cache_reuse = True
+
+    def __init__(self, model_kwargs: Optional[Dict] = None,
+                 threads: Optional[int] = config.LLM_THREADS):
+        """
+        Args:
+            model_kwargs: Passed to from_pretrained (see LLM_MODEL_KWARGS)
+            threads: CPU threads used for inference (None = all cores)
+        """
+        self.model_kwargs = dict(model_kwargs or {})
+        self.threads = threads or os.cpu_count() or 1
+
+    @classmethod
+    def unavailable_reason(cls, model_kwargs: Dict) -> Optional[str]:
+        """Why this backend cannot run on this host, or None if it can."""
+        return None
+
+    @abstractmethod
+    def load(self, model_name: str):
+        """Load a causal LM ready for generate() and the text-generation pipeline."""
+
+    def _cpu_kwargs(self) -> Dict:
+        import torch
+
+        torch.set_num_threads(self.threads)
+        kwargs = {k: v for k, v in self.model_kwargs.items() if k not in _GPU_ONLY_KWARGS}
+        # Half precision is slow or unsupported in most CPU kernels
+        kwargs.pop("torch_dtype", None)
+        kwargs["dtype"] = torch.float32
+        return kwargs
+
+
+class TransformersBackend(InferenceBackend):
+    """from_pretrained with the configured kwargs (the original loading path)."""
+
+    name = "transformers"
+
+    @classmethod
+    def unavailable_reason(cls, model_kwargs):
+        quantized = any(model_kwargs.get(k) for k in ("load_in_8bit", "load_in_4bit"))
+        if quantized and not _cuda_available():
+            return "8/4-bit loading needs a CUDA GPU"
+        if quantized and not _installed("bitsandbytes"):
+            return "bitsandbytes is not installed"
+        if "device_map" in model_kwargs and not _installed("accelerate"):
+            return "device_map needs accelerate"
+        return None
+
+    def load(self, model_name):
+        from transformers import AutoModelForCausalLM
+
+        return AutoModelForCausalLM.from_pretrained(model_name, **self.model_kwargs)
+
+
+class TorchCPUBackend(InferenceBackend):
+    """Unquantized float32 model on the CPU."""
+
+    name = "torch_cpu"
+
+    def load(self, model_name):
+        from transformers import AutoModelForCausalLM
+
+        model = AutoModelForCausalLM.from_pretrained(model_name, **self._cpu_kwargs())
+        return model.eval()
+
+
+class TorchInt8Backend(TorchCPUBackend):
+    """
+    CPU model with int8 Linear weights (torch dynamic quantization).
+
+    Weights take a quarter of the float32 memory and matrix products run
+    on int8 kernels (fbgemm/x86 or qnnpack); activations stay float.
+    """
+
+    name = "torch_int8"
+
+    @classmethod
+    def unavailable_reason(cls, model_kwargs):
+        import torch
+
+        if not set(torch.backends.quantized.supported_engines) - {"none"}:
+            return "this torch build has no quantized CPU kernels"
+        return None
+
+    def load(self, model_name):
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+
+        model = super().load(model_name)
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    Model exported to ONNX and run by ONNX Runtime on the CPU.
+
+    The export and its int8 quantization are done once and kept under
+    LLM_ONNX_DIR; later starts load the quantized model directly.
+    """
+
+    name = "onnx"
+    # ORT models take past key/values as plain tensors
+    supports_cache_reuse = False
+
+    @classmethod
+    def unavailable_reason(cls, model_kwargs):
+        if not (_installed("optimum") and _installed("onnxruntime")):
+            return "optimum[onnxruntime] is not installed"
+        return None
+
+    def load(self, model_name):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForCausalLM
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        model_dir = os.path.join(config.LLM_ONNX_DIR, re.sub(r"[^\w.-]+", "_", model_name))
+        quantized_dir = os.path.join(model_dir, "int8")
+        if not os.path.exists(os.path.join(quantized_dir, "model_quantized.onnx")):
+            self._export(model_name, model_dir, quantized_dir)
+
+        return ORTModelForCausalLM.from_pretrained(
+            quantized_dir,
+            file_name="model_quantized.onnx",
+            provider="CPUExecutionProvider",
+            session_options=options,
+        )
+
+    def _export(self, model_name, model_dir, quantized_dir):
+        from optimum.onnxruntime import ORTModelForCausalLM, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        print(f"Exporting {model_name} to ONNX (first run only)...")
+        exported = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+        exported.save_pretrained(model_dir)
+
+        quantization = _quantization_config(AutoQuantizationConfig)
+        ORTQuantizer.from_pretrained(model_dir).quantize(
+            save_dir=quantized_dir, quantization_config=quantization
+        )
+        # The quantized directory needs the model config to load on its own
+        exported.config.save_pretrained(quantized_dir)
+        print(f"✓ Quantized ONNX model saved to {quantized_dir}")
+
+
+def _quantization_config(auto_config):
+    """Dynamic int8 quantization tuned for this CPU's instruction set."""
+    flags = ""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        pass
+    if "avx512_vnni" in flags:
+        return auto_config.avx512_vnni(is_static=False, per_channel=False)
+    if "avx512" in flags:
+        return auto_config.avx512(is_static=False, per_channel=False)
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return auto_config.arm64(is_static=False, per_channel=False)
+    return auto_config.avx2(is_static=False, per_channel=False)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TransformersBackend, TorchCPUBackend, TorchInt8Backend, OnnxRuntimeBackend)
+}
+
+
+def select_backend(name: str = config.LLM_BACKEND, model_kwargs: Optional[Dict] = None,
+                   threads: Optional[int] = config.LLM_THREADS) -> InferenceBackend:
+    """
+    Create the configured backend, or the best usable one for "auto".
+
+    A configured backend this host cannot run is replaced by the "auto"
+    choice with a warning, so a config written for a GPU server still
+    starts on a CPU-only one.
+    """
+    model_kwargs = dict(model_kwargs or {})
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown LLM backend '{name}'. Choose one of: auto, {', '.join(BACKENDS)}")
+        reason = BACKENDS[name].unavailable_reason(model_kwargs)
+        if reason is None:
+            return BACKENDS[name](model_kwargs, threads)
+        print(f"⚠ LLM backend '{name}' unavailable ({reason}); choosing automatically")
+
+    order = AUTO_ORDER if _cuda_available() else [n for n in AUTO_ORDER if n != "transformers"]
+    for candidate in order:
+        backend = BACKENDS[candidate]
+        reason = backend.unavailable_reason(model_kwargs)
+        if reason is None:
+            print(f"✓ LLM backend: {candidate}")
+            return backend(model_kwargs, threads)
+        print(f"  Skipping LLM backend '{candidate}': {reason}")
+    # Not reached while torch_cpu, which has no requirements, is in AUTO_ORDER
+    raise ValueError("No usable LLM backend")
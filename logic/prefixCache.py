@@ -0,0 +1,184 @@
+"""
+Prefix Cache - Reuse the attention state of prompt prefixes across questions.
+
+Every prompt starts with the same instruction preamble from
+PROMPT_TEMPLATE, and related questions often retrieve the same leading
+context chunks. Prefill recomputes the keys and values of those identical
+tokens for every question, which on CPU is a large share of the time to
+the first answer token.
+
+PrefixKVCache keeps the past key/values of recent prompts in an LRU with
+a memory cap. A new prompt starts from the longest token prefix it shares
+with any cached prompt, so only the remaining tokens are prefilled. The
+state of a token depends only on the tokens before it, so a reused prefix
+gives exactly the same result as computing it again. The template
+preamble is computed when the model loads and is never evicted.
+"""
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from transformers import DynamicCache
+
+from instrumentation import count
+import config
+
+
+def _layer_tensors(cache) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+    """(keys, values) of every layer of a DynamicCache, across transformers versions."""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def _slice(cache, length: int) -> DynamicCache:
+    """Copy of the first `length` positions of a cache."""
+    sliced = DynamicCache()
+    for layer_idx, (keys, values) in enumerate(_layer_tensors(cache)):
+        sliced.update(keys[:, :, :length].clone(), values[:, :, :length].clone(), layer_idx)
+    return sliced
+
+
+class _Entry:
+    __slots__ = ("ids", "cache", "nbytes")
+
+    def __init__(self, ids: np.ndarray, cache):
+        self.ids = ids
+        self.cache = cache
+        self.nbytes = sum(k.nbytes + v.nbytes for k, v in _layer_tensors(cache))
+
+
+class PrefixKVCache:
+    """
+    LRU of prompt KV states for one model, looked up by longest shared prefix.
+
+    Not thread-safe: QAChain only uses it while holding its generation lock.
+    """
+
+    def __init__(self, model, max_mb: float = config.PREFIX_CACHE_MAX_MB,
+                 min_tokens: int = config.PREFIX_CACHE_MIN_TOKENS):
+        """
+        Args:
+            model: Causal LM the states are computed with
+            max_mb: Memory for cached states, not counting pinned ones
+            min_tokens: Shorter shared prefixes are prefilled normally,
+                        since copying their state saves next to nothing
+        """
+        self.model = model
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.min_tokens = min_tokens
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "reused_tokens": 0, "prefilled_tokens": 0}
+        # Disabled when the model's cache drops old positions (sliding
+        # window), since a prefix of it would no longer be complete
+        self.enabled = True
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._pinned: List[_Entry] = []
+        self._next_key = 0
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._pinned)
+
+    def warm(self, input_ids: torch.Tensor):
+        """Compute the state of a prefix every prompt starts with and keep it for good."""
+        ids = input_ids[0].cpu().numpy()
+        if not self.enabled or len(ids) < self.min_tokens:
+            return
+        past = self._prefill(input_ids, DynamicCache(), 0, len(ids))
+        if past is not None:
+            self._pinned.append(_Entry(ids, past))
+
+    def prepare(self, input_ids: torch.Tensor) -> Optional[DynamicCache]:
+        """
+        Past key/values for generating from a single prompt.
+
+        Reuses the longest cached prefix, prefills the rest of the prompt
+        except its last token and caches the result. Pass the return value
+        as `past_key_values` to model.generate() together with the full
+        input IDs; generate() then only runs the last prompt token.
+
+        Returns:
+            The cache to generate with, or None to generate without one
+        """
+        if not self.enabled or input_ids.shape[0] != 1 or input_ids.shape[-1] < 2:
+            return None
+
+        ids = input_ids[0].cpu().numpy()
+        target = len(ids) - 1
+        entry, reused = self._longest_prefix(ids[:target])
+
+        if entry is not None:
+            self.stats["hits"] += 1
+            self.stats["reused_tokens"] += reused
+            count("prefix_cache.hits")
+            count("prefix_cache.reused_tokens", reused)
+            past = _slice(entry.cache, reused)
+        else:
+            self.stats["misses"] += 1
+            count("prefix_cache.misses")
+            reused = 0
+            past = DynamicCache()
+
+        if reused < target:
+            past = self._prefill(input_ids, past, reused, target)
+            if past is None:
+                return None
+            self._store(ids[:target], _slice(past, target))
+        return past
+
+    def _prefill(self, input_ids, past, start: int, end: int):
+        """Run the model over positions start..end-1, extending `past`."""
+        with torch.no_grad():
+            output = self.model(input_ids[:, start:end], past_key_values=past, use_cache=True)
+        past = output.past_key_values
+        self.stats["prefilled_tokens"] += end - start
+
+        if any(keys.shape[-2] != end for keys, _ in _layer_tensors(past)):
+            print("⚠ Model cache keeps a sliding window; prefix caching disabled")
+            self.enabled = False
+            self.clear()
+            return None
+        return past
+
+    def _longest_prefix(self, ids: np.ndarray) -> Tuple[Optional[_Entry], int]:
+        best, best_len = None, 0
+        for key, entry in list(self._entries.items()) + [(None, e) for e in self._pinned]:
+            length = min(len(entry.ids), len(ids))
+            equal = entry.ids[:length] == ids[:length]
+            shared = length if equal.all() else int(np.argmin(equal))
+            if shared > best_len:
+                best, best_len = (key, entry), shared
+
+        if best is None or best_len < self.min_tokens:
+            return None, 0
+        key, entry = best
+        if key is not None:
+            self._entries.move_to_end(key)
+        return entry, best_len
+
+    def _store(self, ids: np.ndarray, cache):
+        entry = _Entry(ids, cache)
+        if entry.nbytes > self.max_bytes:
+            return
+
+        # Cached prompts that this one extends are no longer needed
+        for key, other in list(self._entries.items()):
+            if len(other.ids) <= len(ids) and np.array_equal(other.ids, ids[:len(other.ids)]):
+                self.bytes -= other.nbytes
+                del self._entries[key]
+
+        self._entries[self._next_key] = entry
+        self._next_key += 1
+        self.bytes += entry.nbytes
+        while self.bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            count("prefix_cache.evictions")
+
+    def clear(self):
+        """Drop all cached states, including pinned ones."""
+        self._entries.clear()
+        self._pinned = []
+        self.bytes = 0
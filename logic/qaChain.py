@@ -1,60 +1,646 @@
-from langchain_community.llms import HuggingFacePipeline
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from logic.contextBuilder import ContextBuilder
+from instrumentation import count, instrumentation, record, span
+import config
 
 class QAChain:
     """Handles the question-answering chain setup and execution."""
 
-    def __init__(self, llm_model, prompt_template):
-        print(f"Loading local model: {llm_model}...")
-        tokenizer = AutoTokenizer.from_pretrained(llm_model)
-        model = AutoModelForCausalLM.from_pretrained(
-            llm_model,
-            device_map="auto",
-            load_in_8bit=True,
-            torch_dtype="auto"
-        )
+    def __init__(self, llm_model, prompt_template,
+                 batch_size=config.QA_BATCH_SIZE, batch_wait_ms=config.QA_BATCH_WAIT_MS,
+                 lazy=config.LAZY_LOADING, model_kwargs=None, generation_kwargs=None,
+                 prefix_cache=config.PREFIX_CACHE_ENABLED, draft_model=config.LLM_DRAFT_MODEL,
+                 backend=config.LLM_BACKEND):
+        self.llm_model = llm_model
+        # Passed to AutoModelForCausalLM.from_pretrained
+        self.model_kwargs = dict(config.LLM_MODEL_KWARGS if model_kwargs is None else model_kwargs)
+        # How the model is loaded and run (see logic/inferenceBackend.py)
+        self.backend_name = backend
+        self.backend = None
+        self.generation_kwargs = {
+            "max_new_tokens": 512,
+            "temperature": 0.2,
+            "top_p": 0.9,
+            **(generation_kwargs or {})
+        }
+        self.model = None
+        self.tokenizer = None
+        self.pipe = None
+        self.llm = None
+        # Reuses the KV state of shared prompt prefixes (see logic/prefixCache.py)
+        self.use_prefix_cache = prefix_cache
+        self.prefix_cache = None
+        # Assisted decoding: a small model drafts tokens that the LLM
+        # verifies several at a time (None = normal decoding)
+        self.draft_model_name = draft_model
+        self.draft_model = None
+        self.draft_tokenizer = None
+        self.assist_stats = {"drafted": 0, "accepted": 0, "steps": 0}
+        self._draft_calls = 0
+        self.prompt_template = prompt_template
+        self.prompt = ChatPromptTemplate.from_template(prompt_template)
+        self.retriever = None
+        self.answer_cache = None
+        self.chain = None
+        # Merges overlapping chunks, drops near-duplicates and keeps the
+        # context within a token budget measured with the model's tokenizer
+        self.context_builder = ContextBuilder(count_tokens=self._count_tokens)
+
+        # Prompts per generation call in batch_query / aquery
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        # The model is shared by the interactive, batch and async paths
+        self._generate_lock = threading.Lock()
+        self._async_pending = []
+        self._async_flush = None
+
+        # Lazy mode loads the model in the background; anything that needs
+        # it waits in _ensure_loaded
+        self._load_error = None
+        self._loader = None
+        if lazy:
+            self._loader = threading.Thread(target=self._load_in_background, daemon=True)
+            self._loader.start()
+        else:
+            self._load_model()
+
+    def _load_model(self):
+        """Load tokenizer, model and generation pipeline."""
+        from langchain_community.llms import HuggingFacePipeline
+        from transformers import AutoTokenizer, pipeline
+        from logic.inferenceBackend import select_backend
+
+        self.backend = select_backend(self.backend_name, self.model_kwargs)
+        print(f"Loading local model: {self.llm_model}...")
+        tokenizer = AutoTokenizer.from_pretrained(self.llm_model)
+        model = self.backend.load(self.llm_model)
+
+        # Batched generation pads prompts on the left so they all end
+        # where generation starts
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
 
         pipe = pipeline(
             "text-generation",
             model=model,
             tokenizer=tokenizer,
-            max_new_tokens=512,
-            temperature=0.2,
-            top_p=0.9
+            **self.generation_kwargs
         )
 
+        self.model = model
+        self.tokenizer = tokenizer
+        self.pipe = pipe
         self.llm = HuggingFacePipeline(pipeline=pipe)
-        self.prompt = ChatPromptTemplate.from_template(prompt_template)
-        self.chain = None
-    
-    def create_chain(self, retriever):
-        """Create the retrieval QA chain using LCEL."""
-        def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
-        
+
+        if not self.backend.supports_cache_reuse:
+            if self.use_prefix_cache or self.draft_model_name:
+                print(f"⚠ Prefix cache and draft model are not supported by the "
+                      f"'{self.backend.name}' backend; generating without them")
+            return
+
+        if self.use_prefix_cache:
+            from logic.prefixCache import PrefixKVCache
+
+            self.prefix_cache = PrefixKVCache(model)
+            # The instructions before the context are the same in every prompt
+            preamble = self._render_prompt("\0", "").split("\0", 1)[0]
+            self.prefix_cache.warm(tokenizer(preamble, return_tensors="pt")["input_ids"].to(model.device))
+
+        if self.draft_model_name:
+            self._load_draft_model()
+
+    def _load_draft_model(self):
+        """Load the draft model; generation falls back to normal decoding if it fails."""
+        from transformers import AutoTokenizer
+
+        print(f"Loading draft model: {self.draft_model_name}...")
+        try:
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_name)
+            draft = self.backend.load(self.draft_model_name)
+        except Exception as e:
+            print(f"⚠ Could not load draft model {self.draft_model_name} ({e}); "
+                  "using normal decoding")
+            return
+
+        draft.generation_config.num_assistant_tokens = config.LLM_DRAFT_TOKENS
+        # Each draft forward pass proposes one token
+        draft.register_forward_hook(self._count_draft_call)
+        self.draft_model = draft
+        # Drafts with another vocabulary work too, with their tokens
+        # translated through text (slower, and fewer get accepted)
+        if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+            print("⚠ Draft model uses a different tokenizer; drafts are converted through text")
+            self.draft_tokenizer = draft_tokenizer
+
+    def _count_draft_call(self, module, args, output):
+        self._draft_calls += 1
+
+    @property
+    def acceptance_rate(self):
+        """Share of drafted tokens the LLM accepted, or None before any assisted generation."""
+        if not self.assist_stats["drafted"]:
+            return None
+        return self.assist_stats["accepted"] / self.assist_stats["drafted"]
+
+    def _assist_kwargs(self):
+        if self.draft_model is None:
+            return {}
+        kwargs = {"assistant_model": self.draft_model}
+        if self.draft_tokenizer is not None:
+            kwargs.update(tokenizer=self.tokenizer, assistant_tokenizer=self.draft_tokenizer)
+        return kwargs
+
+    def _record_assisted(self, steps, drafted):
+        """Update acceptance statistics after an assisted generate() call."""
+        accepted = max(steps.tokens - steps.steps, 0)
+        self.assist_stats["drafted"] += drafted
+        self.assist_stats["accepted"] += accepted
+        self.assist_stats["steps"] += steps.steps
+        count("generate.drafted_tokens", drafted)
+        count("generate.accepted_tokens", accepted)
+
+    def _load_in_background(self):
+        try:
+            self._load_model()
+        except Exception as e:
+            self._load_error = e
+
+    def _ensure_loaded(self):
+        """Wait for a background model load and surface its failure."""
+        if self._loader is not None:
+            self._loader.join()
+        if self._load_error is not None:
+            raise RuntimeError(f"Failed to load model {self.llm_model}") from self._load_error
+
+    def _call_llm(self, prompt_value):
+        """Generated answer for a prompt, without the prompt itself."""
+        self._ensure_loaded()
+        if not instrumentation.enabled:
+            return _strip_prompt(self._complete(prompt_value), prompt_value.to_string())
+
+        # The timer sees every token as generate() produces it, which
+        # splits the call into prefill and decoding
+        timer = _GenerationTimer()
+        with span("generate") as stage:
+            text = self._complete(prompt_value, timer)
+            timer.report(stage)
+        return _strip_prompt(text, prompt_value.to_string())
+
+    def _complete(self, prompt_value, streamer=None):
+        """Generate for one prompt; returns prompt and answer, like HuggingFacePipeline."""
+        if self.prefix_cache is None and self.draft_model is None:
+            if streamer is None:
+                return self.llm.invoke(prompt_value)
+            return self.llm.invoke(prompt_value, pipeline_kwargs={"streamer": streamer})
+
+        prompt = prompt_value.to_string()
+        return prompt + self._generate_one(prompt, streamer)
+
+    def _generate_kwargs(self, input_ids, streamer=None):
+        """
+        Extra generate() arguments for one prompt: the cached prefix state
+        and the draft model, if enabled.
+
+        Returns:
+            Tuple of (kwargs, step counter for assisted decoding or None)
+        """
+        kwargs = self._assist_kwargs()
+        if self.prefix_cache is not None:
+            past = self.prefix_cache.prepare(input_ids)
+            if past is not None:
+                kwargs["past_key_values"] = past
+
+        steps = None
+        if self.draft_model is not None:
+            steps = streamer = _StepCounter(streamer)
+        kwargs["streamer"] = streamer
+        return kwargs, steps
+
+    def _generate_one(self, prompt, streamer=None):
+        """Generate the answer to one prompt with the prefix cache and draft model."""
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+        kwargs, steps = self._generate_kwargs(inputs["input_ids"], streamer)
+        drafted = self._draft_calls
+        output = self.model.generate(
+            **inputs,
+            **kwargs,
+            pad_token_id=self.tokenizer.pad_token_id,
+            **self.generation_kwargs
+        )
+        if steps is not None:
+            self._record_assisted(steps, self._draft_calls - drafted)
+        new_tokens = output[0, inputs["input_ids"].shape[-1]:]
+        return self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+    def _retrieve(self, question):
+        with span("retrieve") as stage:
+            docs = self.retriever.invoke(question)
+            stage.set(chunks=len(docs))
+        return docs
+
+    def _count_tokens(self, text):
+        self._ensure_loaded()
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def answer_signature(self):
+        """
+        Hash of everything besides the retrieved context that shapes an answer.
+
+        AnswerCache keeps it with its entries, so changing the model, how it
+        is loaded, the prompt or the generation settings invalidates them.
+        """
+        settings = {
+            "model": self.llm_model,
+            "model_kwargs": self.model_kwargs,
+            "backend": self.backend_name,
+            "prompt": self.prompt_template,
+            "generation_kwargs": self.generation_kwargs,
+        }
+        return hashlib.sha1(
+            json.dumps(settings, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def format_docs(self, docs):
+        with span("context.build", chunks=len(docs)):
+            return self.context_builder.build(docs)
+
+    def create_chain(self, retriever, answer_cache=None):
+        """
+        Create the retrieval QA chain using LCEL.
+
+        Args:
+            retriever: Retriever providing context documents
+            answer_cache: Optional AnswerCache consulted before retrieval
+                          and generation
+        """
+        self.retriever = retriever
+        self.answer_cache = answer_cache
         self.chain = (
             {
-                "context": retriever | format_docs,
+                "context": RunnableLambda(self._retrieve) | self.format_docs,
                 "input": RunnablePassthrough()
             }
             | self.prompt
-            | self.llm
+            | RunnableLambda(self._call_llm)
             | StrOutputParser()
         )
         return self.chain
-    
+
     def query(self, question):
         """Ask a question and get an answer."""
         if self.chain is None:
             raise ValueError("Chain not created. Call create_chain first.")
-        
-        response = self.chain.invoke(question)
+
+        with span("query") as stage:
+            vector = None
+            if self.answer_cache is not None:
+                cached, vector = self.answer_cache.lookup(question)
+                if cached is not None:
+                    stage.set(cache_hit=True)
+                    count("query.cache_hits")
+                    return {"answer": cached}
+
+            with self._generate_lock:
+                response = self.chain.invoke(question)
+
+            if self.answer_cache is not None:
+                self.answer_cache.put(question, response, vector)
         return {"answer": response}
-    
+
     def get_answer(self, question):
         """Get only the answer text from a query."""
         response = self.query(question)
-        return response.get('answer', '')
\ No newline at end of file
+        return response.get('answer', '')
+
+    def stream_answer(self, question):
+        """
+        Yield the answer text piece by piece while it is being generated.
+
+        Retrieval and prompt building happen up front; generation runs in
+        a background thread and decoded tokens are yielded as soon as they
+        exist. Closing the generator early stops generation.
+        """
+        if self.chain is None:
+            raise ValueError("Chain not created. Call create_chain first.")
+
+        vector = None
+        if self.answer_cache is not None:
+            cached, vector = self.answer_cache.lookup(question)
+            if cached is not None:
+                yield cached
+                return
+
+        docs = self._retrieve(question)
+        prompt = self.build_prompt(question, docs)
+        pieces = []
+        first_piece = None
+
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+
+        self._ensure_loaded()
+        with self._generate_lock:
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+            streamer = TextIteratorStreamer(
+                self.tokenizer, skip_prompt=True, skip_special_tokens=True
+            )
+            stop = threading.Event()
+            errors = []
+            kwargs, steps = self._generate_kwargs(inputs["input_ids"], streamer)
+            drafted = self._draft_calls
+
+            def generate():
+                try:
+                    self.model.generate(
+                        **inputs,
+                        **kwargs,
+                        stopping_criteria=StoppingCriteriaList([_StopWhenSet(stop)]),
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        **self.generation_kwargs
+                    )
+                except Exception as e:
+                    errors.append(e)
+                    # Unblock the consumer, which re-raises below
+                    streamer.end()
+
+            generation = threading.Thread(target=generate, daemon=True)
+            start = time.perf_counter()
+            generation.start()
+            try:
+                for text in streamer:
+                    if text:
+                        if first_piece is None:
+                            first_piece = time.perf_counter()
+                        pieces.append(text)
+                        yield text
+            finally:
+                stop.set()
+                generation.join()
+                if steps is not None:
+                    self._record_assisted(steps, self._draft_calls - drafted)
+                if instrumentation.enabled and first_piece is not None:
+                    tokens_in = int(inputs["input_ids"].shape[-1])
+                    tokens_out = len(self.tokenizer.encode("".join(pieces), add_special_tokens=False))
+                    _report_generation(start, first_piece, time.perf_counter(), tokens_in, tokens_out)
+
+            if errors:
+                raise errors[0]
+
+        # Only reached when the answer was streamed to the end
+        if self.answer_cache is not None:
+            self.answer_cache.put(question, "".join(pieces), vector)
+
+    def build_prompt(self, question, docs):
+        """Render the prompt exactly as the chain would send it to the LLM."""
+        return self._render_prompt(self.format_docs(docs), question)
+
+    def _render_prompt(self, context, question):
+        return self.prompt.invoke({"context": context, "input": question}).to_string()
+
+    def batch_query(self, questions):
+        """
+        Answer many questions with batched retrieval and generation.
+
+        All questions are retrieved with one vectorized index search, then
+        prompts are fed to the model `batch_size` at a time with padding.
+        A failure only affects the questions it belongs to.
+
+        Args:
+            questions: List of question strings
+
+        Returns:
+            List of {"answer": str or None, "error": str or None}, one per
+            question and in the same order
+        """
+        # Imported here so importing QAChain does not load faiss
+        from tmp.vectorStore import batch_retrieve
+
+        if self.chain is None:
+            raise ValueError("Chain not created. Call create_chain first.")
+
+        questions = list(questions)
+        results = [{"answer": None, "error": None} for _ in questions]
+
+        # Only questions without a cached answer go through the model
+        todo = []
+        vectors = {}
+        for i, question in enumerate(questions):
+            cached = None
+            if self.answer_cache is not None:
+                cached, vectors[i] = self.answer_cache.lookup(question)
+            if cached is not None:
+                results[i]["answer"] = cached
+            else:
+                todo.append(i)
+
+        try:
+            with span("retrieve.batch", queries=len(todo)):
+                retrieved = batch_retrieve(self.retriever, [questions[i] for i in todo])
+        except Exception:
+            # Isolate the question(s) that broke the batched search
+            retrieved = []
+            for i in todo:
+                try:
+                    retrieved.append(self.retriever.invoke(questions[i]))
+                except Exception as e:
+                    retrieved.append(None)
+                    results[i]["error"] = f"Retrieval failed: {e}"
+
+        prompts = []
+        for i, docs in zip(todo, retrieved):
+            if docs is not None:
+                prompts.append((i, self.build_prompt(questions[i], docs)))
+
+        for start in range(0, len(prompts), self.batch_size):
+            batch = prompts[start:start + self.batch_size]
+            try:
+                answers = self._generate([prompt for _, prompt in batch])
+            except Exception:
+                # Retry one by one so a bad prompt does not fail its neighbours
+                answers = []
+                for i, prompt in batch:
+                    try:
+                        answers.extend(self._generate([prompt]))
+                    except Exception as e:
+                        answers.append(None)
+                        results[i]["error"] = f"Generation failed: {e}"
+
+            for (i, _), answer in zip(batch, answers):
+                if answer is not None:
+                    results[i]["answer"] = answer
+                    if self.answer_cache is not None:
+                        self.answer_cache.put(questions[i], answer, vectors.get(i))
+
+        return results
+
+    def _generate(self, prompts):
+        """Run the text-generation pipeline on a list of prompts."""
+        self._ensure_loaded()
+        kwargs = {}
+        timer = None
+        if instrumentation.enabled:
+            timer = kwargs["streamer"] = _GenerationTimer()
+        with self._generate_lock, span("generate", prompts=len(prompts)) as stage:
+            if len(prompts) == 1 and (self.prefix_cache is not None or self.draft_model is not None):
+                # Cached prefixes and assisted decoding only work for one
+                # prompt at a time (padded batches do not line up)
+                answers = [self._generate_one(prompts[0], timer)]
+            else:
+                outputs = self.pipe(
+                    prompts,
+                    batch_size=len(prompts),
+                    return_full_text=False,
+                    **kwargs
+                )
+                answers = [output[0]["generated_text"] for output in outputs]
+            if timer is not None:
+                timer.report(stage)
+        return answers
+
+    async def aquery(self, question):
+        """
+        Ask a question from asyncio code without blocking the event loop.
+
+        Calls made at about the same time are collected for up to
+        `batch_wait_ms` (or until `batch_size` are waiting) and answered
+        together through batch_query in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._async_pending.append((question, future))
+
+        if len(self._async_pending) >= self.batch_size:
+            self._flush_async(loop)
+        elif self._async_flush is None:
+            self._async_flush = loop.call_later(self.batch_wait, self._flush_async, loop)
+
+        result = await future
+        if result["error"] is not None:
+            raise RuntimeError(result["error"])
+        return {"answer": result["answer"]}
+
+    def _flush_async(self, loop):
+        """Send the waiting aquery calls to batch_query as one batch."""
+        if self._async_flush is not None:
+            self._async_flush.cancel()
+            self._async_flush = None
+
+        pending, self._async_pending = self._async_pending, []
+        if not pending:
+            return
+
+        questions = [question for question, _ in pending]
+        task = loop.run_in_executor(None, self.batch_query, questions)
+
+        def resolve(done):
+            for index, (_, future) in enumerate(pending):
+                if future.cancelled():
+                    continue
+                if done.exception() is not None:
+                    future.set_exception(done.exception())
+                else:
+                    future.set_result(done.result()[index])
+
+        task.add_done_callback(resolve)
+
+
+class _GenerationTimer:
+    """
+    Streamer for generate() that only notes when tokens arrive.
+
+    generate() first passes the prompt IDs, then the new token(s) after
+    every step, so the first step marks the end of prefill.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end_time = None
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            self.tokens_in = int(value.numel())
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens_out += int(value.numel())
+
+    def end(self):
+        self.end_time = time.perf_counter()
+
+    def report(self, stage):
+        if self.first_token is None:
+            return
+        end = self.end_time or time.perf_counter()
+        stage.set(tokens_in=self.tokens_in, tokens_out=self.tokens_out)
+        _report_generation(self.start, self.first_token, end, self.tokens_in, self.tokens_out)
+
+
+def _strip_prompt(text, prompt):
+    """
+    Answer part of a completion that starts with its prompt.
+
+    HuggingFacePipeline returns the prompt followed by the answer; query()
+    returns and caches only the answer, like batch_query and stream_answer.
+    """
+    return text[len(prompt):] if text.startswith(prompt) else text
+
+
+def _report_generation(start, first_token, end, tokens_in, tokens_out):
+    """Record prefill and decoding time and token counts of one generate() call."""
+    decode = end - first_token
+    record("generate.prefill", first_token - start, tokens_in=tokens_in)
+    record("generate.decode", decode, tokens_out=tokens_out,
+           tokens_per_s=tokens_out / decode if decode > 0 else None)
+    count("generate.tokens_in", tokens_in)
+    count("generate.tokens_out", tokens_out)
+
+
+class _StepCounter:
+    """
+    Streamer that counts decoding steps and passes tokens on to another one.
+
+    With assisted decoding every step adds the accepted draft tokens plus
+    one token from the LLM itself, so tokens - steps is the accepted count.
+    """
+
+    def __init__(self, streamer=None):
+        self.streamer = streamer
+        self.steps = 0
+        self.tokens = 0
+        self._prompt_seen = False
+
+    def put(self, value):
+        if self._prompt_seen:
+            self.steps += 1
+            self.tokens += int(value.numel())
+        else:
+            self._prompt_seen = True
+        if self.streamer is not None:
+            self.streamer.put(value)
+
+    def end(self):
+        if self.streamer is not None:
+            self.streamer.end()
+
+
+class _StopWhenSet:
+    """Stops generation once the consumer of a stream goes away."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
@@ -0,0 +1,380 @@
+"""
+Query Server - Answer questions for many users from one loaded model.
+
+One QAChain (and the vectorstore behind its retriever) is shared by every
+client. Requests go into a bounded queue; a single batcher task keeps
+taking whatever is waiting, up to `batch_size` questions, and answers
+them together with QAChain.batch_query in a worker thread. Questions that
+arrive while a batch is generating form the next batch as soon as it
+finishes, so the model is never idle while work is queued.
+
+A full queue is answered at once with 503 (backpressure) instead of
+piling up, and every request has a deadline after which it gets 504.
+
+The interface is a small JSON-over-HTTP/1.1 protocol served on TCP or a
+Unix socket, using only asyncio:
+
+    POST /query   {"question": "..."}  ->  {"answer": "..."}
+    GET  /health                       ->  {"status": "ok", "queue": 0, ...}
+    GET  /stats                        ->  request and batch counters
+"""
+
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from instrumentation import count, span
+import config
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class _Request:
+    __slots__ = ("question", "future", "deadline")
+
+    def __init__(self, question, future, deadline):
+        self.question = question
+        self.future = future
+        self.deadline = deadline
+
+
+class QueryServer:
+    """Serves a QAChain to many clients with a bounded, batched request queue."""
+
+    def __init__(self, qa_system, max_queue: int = config.SERVER_MAX_QUEUE,
+                 batch_size: int = config.QA_BATCH_SIZE,
+                 batch_wait_ms: float = config.QA_BATCH_WAIT_MS,
+                 request_timeout: float = config.SERVER_REQUEST_TIMEOUT_S,
+                 max_body_bytes: int = config.SERVER_MAX_BODY_BYTES):
+        """
+        Args:
+            qa_system: QAChain with a chain already created (anything with
+                       a compatible batch_query works, e.g. a stand-in)
+            max_queue: Requests waiting beyond this are rejected with 503
+            batch_size: Most questions answered per generation call
+            batch_wait_ms: How long a partial batch waits for more questions
+            request_timeout: Seconds before a request is answered with 504
+            max_body_bytes: Larger request bodies are rejected with 413
+        """
+        self.qa_system = qa_system
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+
+        self.stats = {
+            "answered": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "batches": 0,
+            "batched_questions": 0,
+        }
+        self._queue = None
+        self._batcher = None
+        self._servers = []
+        # Generation is serialized by the model anyway; one thread keeps
+        # batches in arrival order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-batch")
+
+    async def start(self, host: Optional[str] = config.SERVER_HOST,
+                    port: Optional[int] = config.SERVER_PORT,
+                    socket_path: Optional[str] = None):
+        """
+        Start listening and batching.
+
+        Args:
+            host: TCP address to bind (ignored with socket_path)
+            port: TCP port; 0 picks a free one
+            socket_path: Listen on this Unix socket instead of TCP
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batcher = asyncio.create_task(self._run_batches())
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+            print(f"✓ Query server listening on unix:{socket_path}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            bound = server.sockets[0].getsockname()
+            print(f"✓ Query server listening on http://{bound[0]}:{bound[1]}")
+        self._servers.append(server)
+        return server
+
+    async def serve_forever(self, **listen):
+        """Start (see start()) and run until cancelled."""
+        server = await self.start(**listen)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stop accepting connections and fail the questions still queued."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+
+        while self._queue is not None and not self._queue.empty():
+            request = self._queue.get_nowait()
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("Server shutting down"))
+        self._executor.shutdown(wait=False)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def ask(self, question: str, timeout: Optional[float] = None) -> str:
+        """
+        Queue a question and wait for its answer.
+
+        Raises:
+            asyncio.QueueFull: The queue is full (server overloaded)
+            asyncio.TimeoutError: No answer within the timeout
+            RuntimeError: Retrieval or generation failed for this question
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.request_timeout if timeout is None else timeout
+        request = _Request(question, loop.create_future(), loop.time() + timeout)
+
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            count("server.rejected")
+            raise
+
+        try:
+            # Cancels the future on timeout, so the batcher skips it
+            answer = await asyncio.wait_for(request.future, timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            count("server.timed_out")
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        self.stats["answered"] += 1
+        return answer
+
+    async def _next_batch(self):
+        """Wait for a question, then gather more for up to batch_wait."""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        flush_at = loop.time() + self.batch_wait
+
+        while len(batch) < self.batch_size:
+            if self._queue.empty():
+                remaining = flush_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+
+        # Requests whose caller already gave up are not worth generating
+        now = loop.time()
+        return [r for r in batch if not r.future.done() and r.deadline > now]
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["batched_questions"] += len(batch)
+            questions = [request.question for request in batch]
+            try:
+                with span("server.batch", size=len(batch), queued=self.queue_depth):
+                    results = await loop.run_in_executor(
+                        self._executor, self.qa_system.batch_query, questions
+                    )
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(RuntimeError(f"Batch failed: {e}"))
+                continue
+
+            for request, result in zip(batch, results):
+                if request.future.done():
+                    continue
+                if result["error"] is not None:
+                    request.future.set_exception(RuntimeError(result["error"]))
+                else:
+                    request.future.set_result(result["answer"])
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests on one connection until it is closed."""
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, self.max_body_bytes)
+                except _HttpError as e:
+                    await _respond(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status, payload, extra_headers = await self._dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await _respond(writer, status, payload, keep_alive, extra_headers)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        """Route one request; returns (status, JSON payload, extra headers)."""
+        path = path.split("?", 1)[0]
+
+        if path == "/health":
+            return 200, {
+                "status": "ok",
+                "queue": self.queue_depth,
+                "max_queue": self.max_queue,
+            }, None
+        if path == "/stats":
+            stats = dict(self.stats, queue=self.queue_depth)
+            if stats["batches"]:
+                stats["mean_batch_size"] = stats["batched_questions"] / stats["batches"]
+            acceptance_rate = getattr(self.qa_system, "acceptance_rate", None)
+            if acceptance_rate is not None:
+                stats["draft_acceptance_rate"] = acceptance_rate
+            return 200, stats, None
+        if path != "/query":
+            return 404, {"error": f"Unknown path '{path}'"}, None
+        if method != "POST":
+            return 405, {"error": "Use POST /query"}, {"Allow": "POST"}
+
+        try:
+            data = json.loads(body or b"{}")
+            question = data["question"].strip()
+            timeout = float(data.get("timeout", self.request_timeout))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 400, {"error": 'Expected a JSON body like {"question": "..."}'}, None
+        if not question:
+            return 400, {"error": "Question is empty"}, None
+        # NaN would never expire and a negative deadline has already passed
+        if not math.isfinite(timeout) or timeout <= 0:
+            return 400, {"error": "timeout must be a positive number of seconds"}, None
+        timeout = min(timeout, self.request_timeout)
+
+        start = time.perf_counter()
+        try:
+            answer = await self.ask(question, timeout)
+        except asyncio.QueueFull:
+            return 503, {"error": "Server busy, retry later"}, {"Retry-After": "1"}
+        except asyncio.TimeoutError:
+            return 504, {"error": f"No answer within {timeout:g}s"}, None
+        except Exception as e:
+            return 500, {"error": str(e)}, None
+        return 200, {"answer": answer, "seconds": time.perf_counter() - start}, None
+
+
+class _HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body_bytes: int):
+    """
+    Read one HTTP request.
+
+    Returns:
+        Tuple of (method, path, lower-cased headers, body), or None when
+        the client closed the connection
+    """
+    try:
+        request_line = await reader.readline()
+    except ValueError:
+        raise _HttpError(400, "Request line too long")
+    if not request_line:
+        return None
+
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise _HttpError(400, "Malformed request line")
+    method, path, _ = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise _HttpError(400, "Too many headers")
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise _HttpError(400, "Invalid Content-Length")
+    if length > max_body_bytes:
+        raise _HttpError(413, f"Body larger than {max_body_bytes} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload,
+                   keep_alive: bool = True, extra_headers=None):
+    body = json.dumps(payload).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+    }
+    headers.update(extra_headers or {})
+    head = f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+
+
+def run_server(qa_system, host: Optional[str] = config.SERVER_HOST,
+               port: Optional[int] = config.SERVER_PORT,
+               socket_path: Optional[str] = None, **options):
+    """Serve qa_system until interrupted (Ctrl+C)."""
+    server = QueryServer(qa_system, **options)
+    try:
+        asyncio.run(server.serve_forever(host=host, port=port, socket_path=socket_path))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped")
@@ -1,46 +1,112 @@
-from processor.documentProcessor import DocumentProcessor
-from processor.contentReader import ContentReader
-from processor.externalDriveReader import ExternalDriveReader, interactive_drive_selection
-from tmp.vectorStore import VectorStoreManager
-from logic.qaChain import QAChain
 import config
 import os
 
-def setup_from_local_folder(content_dir, vectorstore_path):
+# Readers, the vectorstore and the QA chain pull in langchain, faiss and
+# transformers. They are imported inside the functions that use them so
+# the menu comes up immediately.
+
+def build_checkpoint_path(vectorstore_path):
+    """Journal that lets an interrupted build of vectorstore_path resume, or None."""
+    if not (config.BUILD_CHECKPOINTS and vectorstore_path):
+        return None
+    from tmp.buildCheckpoint import checkpoint_path
+    return checkpoint_path(vectorstore_path)
+
+
+def build_incremental(reader, file_paths, root, vectorstore_path):
+    """Embed only new or changed files and drop vectors of deleted ones."""
+    from processor.externalDriveReader import iter_file_documents
+    from processor.tokenChunker import chunk_settings
+    from tmp.vectorStore import VectorStoreManager
+    
+    settings = chunk_settings(reader.text_splitter)
+    
+    vector_manager = VectorStoreManager(config.EMBEDDING_MODEL)
+    manifest = vector_manager.load_incremental(
+        vectorstore_path, settings, checkpoint_path=build_checkpoint_path(vectorstore_path)
+    )
+    changed, deleted = manifest.diff(file_paths, root)
+    
+    print(f"Incremental update: {len(changed)} new/changed, "
+          f"{len(deleted)} deleted, {len(file_paths) - len(changed)} unchanged")
+    
+    added, removed = vector_manager.update_vectorstore(
+        iter_file_documents(reader, changed, workers=config.INGEST_WORKERS), deleted
+    )
+    
+    if vector_manager.vectorstore is None:
+        raise ValueError(f"No documents found in '{root}'")
+    
+    vector_manager.save_vectorstore(vectorstore_path)
+    print(f"✓ Vectorstore updated (+{added} / -{removed} chunks) and saved to {vectorstore_path}")
+    
+    return vector_manager
+
+
+def setup_from_local_folder(content_dir, vectorstore_path,
+                            incremental=config.INCREMENTAL_INDEXING):
     """Setup RAG from local folder."""
     print("=" * 60)
     print("METHOD 1: Loading from LOCAL FOLDER")
     print("=" * 60)
     
+    from processor.contentReader import ContentReader
+    from processor.externalDriveReader import iter_documents
+    from processor.textCache import TextCache
+    from processor.tokenChunker import make_splitter
+    from tmp.vectorStore import VectorStoreManager
+    
     reader = ContentReader(content_dir=content_dir)
-    documents = reader.get_all_documents(split_docs=True)
+    reader.text_splitter = make_splitter()
+    if config.TEXT_CACHE_PATH:
+        reader.text_cache = TextCache(config.TEXT_CACHE_PATH)
     
-    if not documents:
-        raise ValueError(f"No documents found in '{content_dir}'")
+    if incremental:
+        return build_incremental(reader, reader.get_all_files(), content_dir, vectorstore_path)
+    
+    # Stream chunks straight into the index instead of collecting them first
+    documents = iter_documents(reader, reader.get_all_files(), workers=config.INGEST_WORKERS)
     
     vector_manager = VectorStoreManager(config.EMBEDDING_MODEL)
-    vector_manager.create_vectorstore(documents)
+    checkpoint = build_checkpoint_path(vectorstore_path)
+    if vector_manager.create_vectorstore(documents, checkpoint) is None:
+        raise ValueError(f"No documents found in '{content_dir}'")
+    
     vector_manager.save_vectorstore(vectorstore_path)
     print(f"✓ Vectorstore saved to {vectorstore_path}")
     
     return vector_manager
 
 
-def setup_from_external_drive_interactive(vectorstore_path):
+def setup_from_external_drive_interactive(vectorstore_path,
+                                          incremental=config.INCREMENTAL_INDEXING):
     """Setup RAG from external drive using interactive selection."""
     print("=" * 60)
     print("METHOD 2: Loading from EXTERNAL DRIVE (Interactive)")
     print("=" * 60)
     
-    # Use interactive selection
-    documents = interactive_drive_selection()
+    from processor.externalDriveReader import select_drive_source
+    from tmp.vectorStore import VectorStoreManager
     
-    if not documents:
+    # Use interactive selection
+    selection = select_drive_source()
+    if selection is None:
         raise ValueError("No documents loaded from external drive")
     
+    reader, read_path, file_types = selection
+    
+    if incremental:
+        read_path, file_paths = reader.collect_files(read_path, file_types=file_types)
+        return build_incremental(reader, file_paths, read_path, vectorstore_path)
+    
+    documents = reader.iter_from_drive(read_path, file_types=file_types)
+    
     # Create vectorstore
     vector_manager = VectorStoreManager(config.EMBEDDING_MODEL)
-    vector_manager.create_vectorstore(documents)
+    checkpoint = build_checkpoint_path(vectorstore_path)
+    if vector_manager.create_vectorstore(documents, checkpoint) is None:
+        raise ValueError("No documents loaded from external drive")
+    
     vector_manager.save_vectorstore(vectorstore_path)
     print(f"✓ Vectorstore saved to {vectorstore_path}")
     
@@ -48,7 +114,8 @@ def setup_from_external_drive_interactive(vectorstore_path):
 
 
 def setup_from_external_drive_direct(drive_path, subfolder=None, 
-                                     file_types=None, vectorstore_path=None):
+                                     file_types=None, vectorstore_path=None,
+                                     incremental=config.INCREMENTAL_INDEXING):
     """Setup RAG from external drive using direct path."""
     print("=" * 60)
     print("METHOD 3: Loading from EXTERNAL DRIVE (Direct Path)")
@@ -59,20 +126,27 @@ def setup_from_external_drive_direct(drive_path, subfolder=None,
     if file_types:
         print(f"File types: {file_types}")
     
+    from processor.externalDriveReader import ExternalDriveReader
+    from tmp.vectorStore import VectorStoreManager
+    
     reader = ExternalDriveReader()
-    documents = reader.read_from_drive(
+    
+    if incremental and vectorstore_path:
+        read_path, file_paths = reader.collect_files(drive_path, subfolder, file_types)
+        return build_incremental(reader, file_paths, read_path, vectorstore_path)
+    
+    documents = reader.iter_from_drive(
         drive_path=drive_path,
         subfolder=subfolder,
         file_types=file_types,
         split_docs=True
     )
     
-    if not documents:
-        raise ValueError("No documents loaded from external drive")
-    
     # Create vectorstore
     vector_manager = VectorStoreManager(config.EMBEDDING_MODEL)
-    vector_manager.create_vectorstore(documents)
+    checkpoint = build_checkpoint_path(vectorstore_path)
+    if vector_manager.create_vectorstore(documents, checkpoint) is None:
+        raise ValueError("No documents loaded from external drive")
     
     if vectorstore_path:
         vector_manager.save_vectorstore(vectorstore_path)
@@ -81,19 +155,56 @@ def setup_from_external_drive_direct(drive_path, subfolder=None,
     return vector_manager
 
 
-def load_existing_vectorstore(vectorstore_path):
+def load_existing_vectorstore(vectorstore_path, embedding_model=config.EMBEDDING_MODEL):
     """Load existing vectorstore (fastest option after first setup)."""
     print("=" * 60)
     print("METHOD 4: Loading EXISTING VECTORSTORE")
     print("=" * 60)
     
-    vector_manager = VectorStoreManager(config.EMBEDDING_MODEL)
+    from tmp.vectorStore import VectorStoreManager
+    
+    vector_manager = VectorStoreManager(embedding_model)
     vector_manager.load_vectorstore(vectorstore_path)
     print("✓ Vectorstore loaded successfully")
     
     return vector_manager
 
 
+def create_answer_cache(vector_manager, qa_system):
+    """Answer cache from config.py for qa_system's answers, or None when it is disabled."""
+    if not config.ANSWER_CACHE_ENABLED:
+        return None
+    
+    from logic.answerCache import AnswerCache
+    
+    return AnswerCache(
+        vector_manager,
+        similarity_threshold=config.ANSWER_CACHE_THRESHOLD,
+        max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+        path=config.ANSWER_CACHE_PATH,
+        generator=qa_system.answer_signature()
+    )
+
+
+def answer_questions_from_file(qa_system, questions_path):
+    """Answer every line of a text file in batches and print the results."""
+    with open(questions_path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    
+    print(f"\n🔍 Answering {len(questions)} question(s) from {questions_path}")
+    results = qa_system.batch_query(questions)
+    
+    for question, result in zip(questions, results):
+        print("-" * 60)
+        print(f"📝 {question}")
+        if result["error"]:
+            print(f"❌ {result['error']}")
+        else:
+            print(f"💡 {result['answer']}")
+    print("-" * 60)
+
+
 def main():
     """Main execution function with multiple storage options."""
     
@@ -109,7 +220,17 @@ def main():
     
     choice = input("\nSelect option (1-4): ").strip()
     
+    if choice not in ('1', '2', '3', '4'):
+        print("Invalid option!")
+        return
+    
     try:
+        from logic.qaChain import QAChain
+        
+        # With LAZY_LOADING the LLM loads in a background thread while the
+        # documents and index are being prepared
+        qa_system = QAChain(config.LLM_MODEL, config.PROMPT_TEMPLATE)
+        
         # Choose setup method based on user input
         if choice == '1':
             # Local folder
@@ -145,23 +266,19 @@ def main():
             # Load existing
             vector_manager = load_existing_vectorstore(config.VECTORSTORE_PATH)
         
-        else:
-            print("Invalid option!")
-            return
-        
         # Create retriever
         retriever = vector_manager.get_retriever()
         
         # Set up QA chain
         print("\nSetting up QA chain...")
-        qa_system = QAChain(config.LLM_MODEL, config.PROMPT_TEMPLATE)
-        qa_system.create_chain(retriever)
+        qa_system.create_chain(retriever, answer_cache=create_answer_cache(vector_manager, qa_system))
         
         # Interactive Q&A loop
         print("\n" + "=" * 60)
         print("RAG System Ready! Ask questions about your documents.")
         print("Commands:")
         print("  - Type your question to get an answer")
+        print("  - 'batch <file>' to answer one question per line of a file")
         print("  - 'quit' or 'exit' to stop")
         print("=" * 60 + "\n")
         
@@ -175,11 +292,19 @@ def main():
             if not question:
                 continue
             
+            if question.lower().startswith('batch '):
+                answer_questions_from_file(qa_system, question[6:].strip())
+                continue
+            
             print(f"\n🔍 Processing: {question}")
             print("-" * 60)
             
-            answer = qa_system.get_answer(question)
-            print(f"\n💡 Answer:\n{answer}")
+            # Print tokens as they are generated instead of waiting for
+            # the whole answer
+            print("\n💡 Answer:")
+            for text in qa_system.stream_answer(question):
+                print(text, end="", flush=True)
+            print()
             print("-" * 60)
     
     except Exception as e:
@@ -188,8 +313,101 @@ def main():
         traceback.print_exc()
 
 
+def serve(argv=None):
+    """
+    Serve questions over HTTP (or a Unix socket) from an existing vectorstore.
+    
+    The LLM and index are loaded once and shared by every client:
+        python main.py serve --port 8765
+        curl -d '{"question": "..."}' http://127.0.0.1:8765/query
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="main.py serve", description=serve.__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--socket", default=config.SERVER_SOCKET_PATH,
+                        help="Listen on this Unix socket instead of host/port")
+    parser.add_argument("--vectorstore", default=config.VECTORSTORE_PATH)
+    parser.add_argument("--llm-model", default=config.LLM_MODEL)
+    parser.add_argument("--embedding-model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--sharded", action="store_true",
+                        help="Serve the sharded store at SHARDED_VECTORSTORE_PATH instead")
+    args = parser.parse_args(argv)
+    
+    from logic.qaChain import QAChain
+    from logic.queryServer import run_server
+    
+    qa_system = QAChain(args.llm_model, config.PROMPT_TEMPLATE)
+    if args.sharded:
+        from tmp.shardedStore import ShardedStore
+        
+        vector_manager = ShardedStore(embedding_model=args.embedding_model).load()
+    else:
+        vector_manager = load_existing_vectorstore(args.vectorstore, args.embedding_model)
+    qa_system.create_chain(vector_manager.get_retriever(),
+                           answer_cache=create_answer_cache(vector_manager, qa_system))
+    
+    run_server(qa_system, host=args.host, port=args.port, socket_path=args.socket)
+
+
+def shards(argv=None):
+    """
+    Manage the sharded vectorstore, one shard per drive (or folder/hash):
+        python main.py shards index /media/user/USB_A /media/user/USB_B
+        python main.py shards index /media/user/USB_A --only USB_A --full
+        python main.py shards list
+        python main.py shards remove USB_B
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="main.py shards", description="Manage the sharded vectorstore.")
+    parser.add_argument("--path", default=config.SHARDED_VECTORSTORE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    index = commands.add_parser("index", help="Build or update the shards of these folders")
+    index.add_argument("folders", nargs="+")
+    index.add_argument("--only", nargs="+", help="Only (re)build these shards")
+    index.add_argument("--full", action="store_true", help="Rebuild instead of updating")
+    index.add_argument("--partition", help="drive, folder or hash:<n> (new stores only; "
+                                           "default SHARD_PARTITION)")
+    commands.add_parser("list", help="Show the shards")
+    remove = commands.add_parser("remove", help="Delete shards")
+    remove.add_argument("names", nargs="+")
+    args = parser.parse_args(argv)
+    
+    from tmp.shardedStore import ShardedStore
+    
+    store = ShardedStore(args.path, partition=getattr(args, "partition", None))
+    
+    if args.command == "index":
+        from processor.externalDriveReader import ExternalDriveReader
+        
+        reader = ExternalDriveReader()
+        for folder in args.folders:
+            read_path, file_paths = reader.collect_files(folder)
+            store.index_files(reader, file_paths, root=read_path, only=args.only,
+                              incremental=not args.full)
+    elif args.command == "remove":
+        for name in args.names:
+            store.remove_shard(name)
+            print(f"✓ Removed shard '{name}'")
+    
+    print(f"\n{len(store.shards)} shard(s) in {args.path} (partitioned by {store.partition}):")
+    for name, info in sorted(store.shards.items()):
+        print(f"  {name}: {info['vectors']} vectors from {info['files']} file(s), "
+              f"updated {info['updated']}")
+
+
 if __name__ == "__main__":
-    main()
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "shards":
+        shards(sys.argv[2:])
+    else:
+        main()
 
 
 # ============================================================================
@@ -0,0 +1,181 @@
+"""
+Deduplicator - Skip repeated files and chunks during ingestion.
+
+Archives hold many copies of the same material: backups, renamed
+versions, the same text exported to several formats. Two stages keep
+them from being parsed, embedded and stored more than once:
+    - identical files are found by size and content hash before parsing;
+      only one copy is read, the others reuse its chunks;
+    - near-duplicate chunks are found after splitting with MinHash
+      signatures and locality-sensitive hashing (LSH), so each unique
+      chunk gets one vector no matter how many files contain it.
+"""
+
+import os
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from processor.textSimilarity import MinHasher, estimate_similarity
+from tmp.indexManifest import hash_file
+
+DEDUP_FILENAME = "dedup.sqlite"
+
+
+def group_identical_files(file_paths: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Split files into one path per distinct content and the copies of it.
+
+    Only files that share their size with another file are hashed, so
+    unique files cost nothing beyond a stat.
+
+    Returns:
+        Tuple of (unique file paths in input order,
+                  {kept path: [paths of identical copies]})
+    """
+    by_size = defaultdict(list)
+    for file_path in file_paths:
+        try:
+            by_size[os.path.getsize(file_path)].append(file_path)
+        except OSError:
+            # Left for the reader to report
+            by_size[None, file_path].append(file_path)
+
+    copy_of = {}
+    copies = defaultdict(list)
+    for paths in by_size.values():
+        if len(paths) < 2:
+            continue
+        first_by_hash = {}
+        for file_path in paths:
+            try:
+                digest = hash_file(file_path)
+            except OSError:
+                continue
+            kept = first_by_hash.setdefault(digest, file_path)
+            if kept != file_path:
+                copy_of[file_path] = kept
+                copies[kept].append(file_path)
+
+    unique = [path for path in file_paths if path not in copy_of]
+    return unique, dict(copies)
+
+
+class ChunkDeduplicator:
+    """LSH index of MinHash signatures of the chunks stored so far."""
+
+    def __init__(self, threshold: float = 0.9, bands: int = 8, hasher: Optional[MinHasher] = None):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity at which a chunk counts
+                       as a duplicate of a stored one
+            bands: LSH bands; each band of num_perm / bands signature
+                   values is one bucket key. More bands find candidates at
+                   lower similarity but check more of them.
+            hasher: MinHasher for signatures (default settings if None)
+        """
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({self.hasher.num_perm})")
+        self.bands = bands
+        self._rows = self.hasher.num_perm // bands
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], set] = defaultdict(set)
+        self.version = None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(text)
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """ID of a stored chunk similar enough to the signature, or None."""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best_id, best_score = None, self.threshold
+        for doc_id in candidates:
+            score = estimate_similarity(signature, self._signatures[doc_id])
+            if score >= best_score:
+                best_id, best_score = doc_id, score
+        return best_id
+
+    def add(self, doc_id: str, signature: np.ndarray):
+        self._signatures[doc_id] = signature
+        for key in self._band_keys(signature):
+            self._buckets[key].add(doc_id)
+
+    def remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            signature = self._signatures.pop(doc_id, None)
+            if signature is None:
+                continue
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self._rows:(band + 1) * self._rows].tobytes()
+
+    def save(self, path: str, version: Optional[str] = None):
+        """Write the signatures to `path`/dedup.sqlite."""
+        os.makedirs(path, exist_ok=True)
+        db_path = os.path.join(path, DEDUP_FILENAME)
+        tmp_path = db_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE signatures (id TEXT PRIMARY KEY, signature BLOB NOT NULL)")
+        conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value)")
+        conn.executemany(
+            "INSERT INTO signatures VALUES (?, ?)",
+            ((doc_id, signature.tobytes()) for doc_id, signature in self._signatures.items())
+        )
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("num_perm", self.hasher.num_perm),
+            ("shingle_size", self.hasher.shingle_size),
+            ("version", version),
+        ])
+        conn.commit()
+        conn.close()
+        os.replace(tmp_path, db_path)
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.9, bands: int = 8) -> Optional["ChunkDeduplicator"]:
+        """
+        Read the signatures saved in `path`.
+
+        Returns:
+            The deduplicator, or None if none was saved or it was saved
+            with different MinHash settings
+        """
+        db_path = os.path.join(path, DEDUP_FILENAME)
+        if not os.path.exists(db_path):
+            return None
+
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT name, value FROM meta").fetchall())
+            deduplicator = cls(threshold, bands)
+            if (meta.get("num_perm") != deduplicator.hasher.num_perm
+                    or meta.get("shingle_size") != deduplicator.hasher.shingle_size):
+                return None
+            deduplicator.version = meta.get("version")
+            for doc_id, blob in conn.execute("SELECT id, signature FROM signatures"):
+                deduplicator.add(doc_id, np.frombuffer(blob, dtype=np.uint32))
+        finally:
+            conn.close()
+        return deduplicator
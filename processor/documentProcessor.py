@@ -1,17 +1,19 @@
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import config
+from processor.tokenChunker import make_splitter
+
 
 class DocumentProcessor:
     """Handles PDF loading and text splitting."""
     
-    def __init__(self, chunk_size=1000, chunk_overlap=200):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
+    def __init__(self, chunk_size=None, chunk_overlap=None, chunker=config.CHUNKER):
+        # Sizes are in tokens or characters depending on the chunker
+        # (None = its default, see config.CHUNKER)
+        self.text_splitter = make_splitter(chunk_size, chunk_overlap, chunker)
     
     def load_pdf(self, pdf_path):
         """Load a PDF file and return documents."""
+        from langchain_community.document_loaders import PyPDFLoader
+
         loader = PyPDFLoader(pdf_path)
         documents = loader.load()
         return documents
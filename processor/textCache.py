@@ -0,0 +1,220 @@
+"""
+Text Cache - Keep the parsed text of slow-to-parse files across builds.
+
+Parsing PDFs, Office documents and e-books is the slowest part of ingest,
+yet the extracted pages only change when the file or the parsing code
+does. Changing the chunking or the embedding model would otherwise parse
+every file again.
+
+Pages (text and metadata) are stored zlib-compressed in a SQLite file,
+keyed by the SHA-256 of the file content plus the loader version: the
+reader class, LOADER_VERSION and the versions of the parsing libraries.
+A copy or a moved file is served from the same entry. Least recently used
+entries are evicted once the cache grows beyond its size cap.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from importlib import metadata as package_metadata
+from typing import Dict, List, Optional, Tuple
+
+import config
+from tmp.indexManifest import hash_file
+
+# Bump when read_single_file changes what it extracts from a file
+LOADER_VERSION = 1
+
+# Libraries whose version changes the extracted text
+_PARSER_PACKAGES = (
+    "langchain-community", "pypdf", "pdfminer.six", "pymupdf", "python-docx",
+    "docx2txt", "openpyxl", "python-pptx", "unstructured",
+)
+
+
+def _parser_versions() -> str:
+    versions = []
+    for package in _PARSER_PACKAGES:
+        try:
+            versions.append(f"{package}={package_metadata.version(package)}")
+        except package_metadata.PackageNotFoundError:
+            continue
+    return ",".join(versions)
+
+
+class TextCache:
+    """On-disk, size-bounded store of parsed documents keyed by file content."""
+
+    def __init__(self, path: str = config.TEXT_CACHE_PATH,
+                 max_mb: float = config.TEXT_CACHE_MAX_MB,
+                 extensions=config.TEXT_CACHE_EXTENSIONS):
+        """
+        Args:
+            path: SQLite file holding the cache
+            max_mb: Upper bound for the compressed size of cached text
+            extensions: File types worth caching; others are read directly
+                        since parsing them costs no more than a lookup
+        """
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.extensions = {ext.lower() for ext in extensions}
+        self._conn = None
+        self._versions: Dict[type, str] = {}
+
+    def __getstate__(self):
+        # Each ingestion worker process opens its own connection
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Workers write concurrently; wait for each other's transactions
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    " key TEXT PRIMARY KEY, source TEXT NOT NULL, data BLOB NOT NULL,"
+                    " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)"
+                )
+                # Running total of entries.size, kept in step by put/_evict
+                # so checking the size cap does not scan the table
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+                )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO meta SELECT 'size', COALESCE(SUM(size), 0) FROM entries"
+                )
+        return self._conn
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        """Compressed bytes of all cached entries."""
+        return self.conn.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()[0]
+
+    def loader_version(self, reader) -> str:
+        """What the text extracted by `reader` depends on besides the file."""
+        cls = type(reader)
+        if cls not in self._versions:
+            self._versions[cls] = (f"{cls.__module__}.{cls.__qualname__}|v{LOADER_VERSION}|"
+                                   f"{_parser_versions()}")
+        return self._versions[cls]
+
+    def read(self, reader, file_path: str) -> Tuple[Optional[List], bool]:
+        """
+        Documents of a file from the cache, or parsed by the reader and cached.
+
+        Args:
+            reader: ContentReader whose read_single_file parses the file
+            file_path: File to read
+
+        Returns:
+            Tuple of (documents as read_single_file returns them,
+                      whether they came from the cache)
+        """
+        if os.path.splitext(file_path)[1].lower() not in self.extensions:
+            return reader.read_single_file(file_path), False
+
+        key = hashlib.sha256(
+            f"{hash_file(file_path)}|{self.loader_version(reader)}".encode("utf-8")
+        ).hexdigest()
+        documents = self.get(key, file_path)
+        if documents is not None:
+            return documents, True
+
+        documents = reader.read_single_file(file_path)
+        if documents:
+            self.put(key, file_path, documents)
+        return documents, False
+
+    def get(self, key: str, file_path: str) -> Optional[List]:
+        """Cached documents for `key` with their paths set to `file_path`, or None."""
+        from langchain_core.documents import Document
+
+        try:
+            row = self.conn.execute(
+                "SELECT source, data FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?",
+                                  (time.time(), key))
+        except sqlite3.Error as e:
+            print(f"⚠ Text cache unavailable: {e}")
+            return None
+
+        source, data = row
+        documents = []
+        for text, metadata in json.loads(zlib.decompress(data)):
+            # The entry may have been parsed from a copy at another path
+            for name, value in metadata.items():
+                if value == source:
+                    metadata[name] = file_path
+            documents.append(Document(page_content=text, metadata=metadata))
+        return documents
+
+    def put(self, key: str, file_path: str, documents: List):
+        """Store the documents parsed from `file_path`, evicting old entries if full."""
+        pages = [[doc.page_content, doc.metadata] for doc in documents]
+        data = zlib.compress(json.dumps(pages, default=str).encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return
+
+        try:
+            with self.conn:
+                # Take the write lock before reading the size being replaced
+                self.conn.execute("BEGIN IMMEDIATE")
+                replaced = self.conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries WHERE key = ?", (key,)
+                ).fetchone()[0]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, file_path, data, len(data), time.time())
+                )
+                self._add_size(len(data) - replaced)
+                self._evict()
+        except sqlite3.Error as e:
+            print(f"⚠ Could not cache text of {os.path.basename(file_path)}: {e}")
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits max_bytes."""
+        excess = self.size - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        freed = 0
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            evicted.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._add_size(-freed)
+
+    def _add_size(self, delta: int):
+        self.conn.execute("UPDATE meta SET value = value + ? WHERE name = 'size'", (delta,))
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self.conn:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("UPDATE meta SET value = 0 WHERE name = 'size'")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
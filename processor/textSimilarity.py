@@ -0,0 +1,88 @@
+"""
+Text Similarity - Cheap near-duplicate detection for chunks.
+
+Texts are compared by their sets of word shingles (runs of n consecutive
+words). MinHash compresses a shingle set into a short signature whose
+agreement with another signature estimates the Jaccard similarity of the
+two sets, so comparing chunks costs a few dozen integer comparisons.
+"""
+
+import re
+import zlib
+from typing import Optional, Set
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+# Mersenne prime for the universal hash family
+_PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """Hashes of the lowercase word n-grams of `text`."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode())
+        for i in range(len(words) - size + 1)
+    }
+
+
+class MinHasher:
+    """Turns texts into MinHash signatures of a fixed length."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        """
+        Args:
+            num_perm: Signature length; more is more accurate and slower
+            shingle_size: Words per shingle
+            seed: Fixes the hash functions so signatures are comparable
+                  across runs and processes
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of `text` (uint32 array of length num_perm)."""
+        hashed = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        if not len(hashed):
+            return np.full(self.num_perm, _PRIME, dtype=np.uint32)
+        values = (self._a[:, None] * hashed[None, :] + self._b[:, None]) % _PRIME
+        return values.min(axis=1).astype(np.uint32)
+
+
+def estimate_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def find_overlap(a: str, b: str, min_overlap: int = 20, max_overlap: Optional[int] = None) -> int:
+    """
+    Length of the longest suffix of `a` that is also a prefix of `b`.
+
+    This is how consecutive chunks of a text splitter with chunk_overlap
+    line up. Overlaps shorter than `min_overlap` characters count as none.
+    """
+    limit = min(len(a), len(b))
+    if max_overlap is not None:
+        limit = min(limit, max_overlap)
+    if limit < min_overlap:
+        return 0
+
+    anchor = b[:min_overlap]
+    start = len(a) - limit
+    best = 0
+    pos = a.find(anchor, start)
+    while pos != -1:
+        length = len(a) - pos
+        if b.startswith(a[pos:]) and length >= min_overlap:
+            # Earliest match is the longest overlap
+            best = length
+            break
+        pos = a.find(anchor, pos + 1)
+    return best
+
@@ -0,0 +1,209 @@
+"""
+Token Chunker - Split documents into chunks measured in embedding-model tokens.
+
+RecursiveCharacterTextSplitter sizes chunks in characters, so a 1000
+character chunk is anywhere from ~150 to over 512 tokens depending on the
+text: short chunks waste the embedding model's window and long ones are
+truncated by it. Its recursive splitting also copies the text again at
+every separator level and deep-copies the metadata of every chunk.
+
+TokenChunker tokenizes all documents of a file in one batched call to the
+fast (Rust) tokenizer of EMBEDDING_MODEL and works on the token character
+offsets: it picks each chunk end at the last paragraph, else sentence,
+else word boundary that fits CHUNK_SIZE_TOKENS, and slices the chunk out
+of the original text once. Chunks keep `start_index`, so the context
+builder still joins neighbouring chunks exactly.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+
+# Boundaries a chunk may end at, best first. Each match ends where the
+# next chunk would begin. Word boundaries come from the gaps between tokens.
+_PARAGRAPH = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE = re.compile(r"[.!?][\"')\]]*\s+|\n\s*")
+
+# Sizes used when none are given, by unit (see make_splitter)
+_CHARACTER_DEFAULTS = (1000, 200)
+
+
+class TokenChunker:
+    """Drop-in replacement for RecursiveCharacterTextSplitter that counts tokens."""
+
+    def __init__(self, chunk_size: int = config.CHUNK_SIZE_TOKENS,
+                 chunk_overlap: int = config.CHUNK_OVERLAP_TOKENS,
+                 tokenizer_name: str = config.EMBEDDING_MODEL,
+                 add_start_index: bool = True):
+        """
+        Args:
+            chunk_size: Maximum tokens per chunk
+            chunk_overlap: Tokens repeated from the end of the previous chunk
+            tokenizer_name: Model whose tokenizer measures the chunks
+            add_start_index: Store each chunk's character offset in its metadata
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than "
+                             f"chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer_name = tokenizer_name
+        self.add_start_index = add_start_index
+        # Boundaries closer than this to the chunk start would leave it too short
+        self.min_fill = chunk_size // 2
+        self._tokenizer = None
+
+    def __getstate__(self):
+        # Worker processes load their own tokenizer instead of unpickling one
+        state = self.__dict__.copy()
+        state["_tokenizer"] = None
+        return state
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name, use_fast=True)
+            if not tokenizer.is_fast:
+                raise ValueError(f"Tokenizer of '{self.tokenizer_name}' has no fast version; "
+                                 f"use CHUNKER = 'characters'")
+            # Whole documents are tokenized; some tokenizer.json files
+            # enable truncation at the model's input length
+            tokenizer.backend_tokenizer.no_truncation()
+            tokenizer.backend_tokenizer.no_padding()
+            self._tokenizer = tokenizer
+        return self._tokenizer
+
+    def split_text(self, text: str) -> List[str]:
+        """Split one text into chunks."""
+        return [text[start:end] for start, end in self._spans([text])[0]]
+
+    def split_documents(self, documents) -> List:
+        """Split documents into chunks, keeping each document's metadata."""
+        from langchain_core.documents import Document
+
+        documents = list(documents)
+        chunks = []
+        for doc, spans in zip(documents, self._spans([doc.page_content for doc in documents])):
+            text = doc.page_content
+            for start, end in spans:
+                metadata = dict(doc.metadata)
+                if self.add_start_index:
+                    metadata["start_index"] = start
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks
+
+    def _spans(self, texts: List[str]) -> List[List[tuple]]:
+        """(start, end) character offsets of the chunks of each text."""
+        if not texts:
+            return []
+        # The Rust tokenizer directly: the transformers wrapper would also
+        # build per-text attention masks and warn about long inputs
+        encodings = self.tokenizer.backend_tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [
+            self._text_spans(text, np.array(encoding.offsets, dtype=np.int64).reshape(-1, 2))
+            for text, encoding in zip(texts, encodings)
+        ]
+
+    def _text_spans(self, text: str, offsets: np.ndarray) -> List[tuple]:
+        n = len(offsets)
+        if n == 0:
+            return []
+        starts, ends = offsets[:, 0], offsets[:, 1]
+
+        # Token indices a chunk may end before (and the next one start at)
+        words = np.flatnonzero(starts[1:] > ends[:-1]) + 1
+        levels = [
+            self._boundaries(_PARAGRAPH, text, starts),
+            self._boundaries(_SENTENCE, text, starts),
+            words,
+        ]
+
+        spans = []
+        pos = 0
+        while pos < n:
+            end = min(pos + self.chunk_size, n)
+            if end < n:
+                end = self._best_end(levels, pos, end)
+            spans.append((int(starts[pos]), int(ends[end - 1])))
+            if end >= n:
+                break
+            pos = self._next_start(levels, pos, end)
+        return spans
+
+    @staticmethod
+    def _boundaries(pattern, text: str, starts: np.ndarray) -> np.ndarray:
+        positions = [match.end() for match in pattern.finditer(text)]
+        return np.unique(np.searchsorted(starts, positions))
+
+    def _best_end(self, levels: List[np.ndarray], pos: int, limit: int) -> int:
+        """Last boundary of the best level that leaves the chunk at least min_fill long."""
+        for bounds in levels:
+            i = np.searchsorted(bounds, limit, side="right") - 1
+            if i >= 0 and bounds[i] > pos + self.min_fill:
+                return int(bounds[i])
+        return limit
+
+    def _next_start(self, levels: List[np.ndarray], pos: int, end: int) -> int:
+        """Start of the next chunk: chunk_overlap tokens back, moved to a sentence or word."""
+        start = end - self.chunk_overlap
+        if start <= pos:
+            return end
+        for bounds in levels[1:]:
+            i = np.searchsorted(bounds, start, side="left")
+            if i < len(bounds) and bounds[i] < end:
+                return int(bounds[i])
+        return start
+
+
+def make_splitter(chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None,
+                  chunker: str = config.CHUNKER, tokenizer_name: str = config.EMBEDDING_MODEL):
+    """
+    Text splitter for the configured chunker.
+
+    The returned splitter has the resolved sizes as `chunk_size` and
+    `chunk_overlap` attributes, whichever chunker it is.
+
+    Args:
+        chunk_size: Chunk size in the chunker's unit (None = its default)
+        chunk_overlap: Overlap in the chunker's unit (None = its default)
+        chunker: "tokens" (TokenChunker) or "characters" (RecursiveCharacterTextSplitter)
+        tokenizer_name: Model whose tokenizer measures "tokens" chunks
+    """
+    if chunker == "tokens":
+        return TokenChunker(
+            config.CHUNK_SIZE_TOKENS if chunk_size is None else chunk_size,
+            config.CHUNK_OVERLAP_TOKENS if chunk_overlap is None else chunk_overlap,
+            tokenizer_name,
+        )
+    if chunker == "characters":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        chunk_size = _CHARACTER_DEFAULTS[0] if chunk_size is None else chunk_size
+        chunk_overlap = _CHARACTER_DEFAULTS[1] if chunk_overlap is None else chunk_overlap
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            # Lets the context builder join neighbouring chunks exactly
+            add_start_index=True
+        )
+        # LangChain keeps the sizes private; expose them like TokenChunker does
+        splitter.chunk_size = chunk_size
+        splitter.chunk_overlap = chunk_overlap
+        return splitter
+    raise ValueError(f"Unknown chunker '{chunker}'. Choose 'tokens' or 'characters'")
+
+
+def chunk_settings(splitter) -> Dict:
+    """Chunking settings a stored index depends on (for the incremental manifest)."""
+    settings = {
+        "chunk_size": splitter.chunk_size,
+        "chunk_overlap": splitter.chunk_overlap,
+    }
+    if isinstance(splitter, TokenChunker):
+        settings["chunk_tokenizer"] = splitter.tokenizer_name
+    return settings
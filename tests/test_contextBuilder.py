@@ -0,0 +1,29 @@
+from langchain_core.documents import Document
+
+from logic.contextBuilder import ContextBuilder
+
+
+def _chunk(text, page, start, source="paper.pdf"):
+    return Document(page_content=text, metadata={"source": source, "page": page, "start_index": start})
+
+
+def _builder():
+    return ContextBuilder(max_tokens=None, dedup_threshold=None)
+
+
+def test_chunks_of_different_pdf_pages_are_not_merged():
+    page_2 = _chunk("Quantization keeps the adapter weights in 16-bit precision " * 2, page=2, start=0)
+    page_7 = _chunk("Paged optimizers move optimizer states to CPU memory.", page=7, start=40)
+
+    context = _builder().build([page_2, page_7])
+
+    assert page_2.page_content in context
+    assert page_7.page_content in context
+
+
+def test_overlapping_chunks_of_one_page_are_merged():
+    text = "QLoRA backpropagates through a frozen 4-bit model into low-rank adapters."
+    first = _chunk(text[:50], page=3, start=100)
+    second = _chunk(text[30:], page=3, start=130)
+
+    assert _builder().build([first, second]) == text
@@ -0,0 +1,63 @@
+import os
+
+from tmp.diskStore import (
+    OLD_SUFFIX, publish, recover_publish, staging_path, wait_for_publish, write_stamp
+)
+
+
+def _store(path, content, stamped=True):
+    os.makedirs(path)
+    with open(os.path.join(path, "index.faiss"), "w") as f:
+        f.write(content)
+    if stamped:
+        write_stamp(path, version=content)
+
+
+def _content(path):
+    with open(os.path.join(path, "index.faiss")) as f:
+        return f.read()
+
+
+def test_publish_replaces_the_store_and_cleans_up(tmp_path):
+    path = str(tmp_path / "store")
+    _store(path, "old")
+    _store(staging_path(path), "new")
+
+    publish(staging_path(path), path)
+
+    assert _content(path) == "new"
+    assert not os.path.exists(staging_path(path))
+    assert not os.path.exists(path + OLD_SUFFIX)
+
+
+def test_recover_publish_finishes_a_complete_staging_store(tmp_path):
+    # Crash after the old store was moved away, before the new one was renamed
+    path = str(tmp_path / "store")
+    _store(path + OLD_SUFFIX, "old")
+    _store(staging_path(path), "new")
+
+    assert recover_publish(path)
+    assert _content(path) == "new"
+    assert not os.path.exists(path + OLD_SUFFIX)
+
+
+def test_recover_publish_restores_the_old_store_if_staging_is_incomplete(tmp_path):
+    path = str(tmp_path / "store")
+    _store(path + OLD_SUFFIX, "old")
+    _store(staging_path(path), "partial", stamped=False)
+
+    assert recover_publish(path)
+    assert _content(path) == "old"
+    assert not os.path.exists(staging_path(path))
+
+
+def test_recover_publish_leaves_a_published_store_alone(tmp_path):
+    path = str(tmp_path / "store")
+    _store(path, "current")
+
+    assert not recover_publish(path)
+    assert _content(path) == "current"
+
+
+def test_wait_for_publish_does_not_wait_without_a_publish_in_progress(tmp_path):
+    assert not wait_for_publish(str(tmp_path / "missing"), timeout=60)
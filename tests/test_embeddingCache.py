@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+
+from tmp.embeddingCache import EmbeddingCache
+
+
+def _cache(tmp_path, rows):
+    # Two float32 dimensions per vector: 8 bytes per row
+    return EmbeddingCache(str(tmp_path), "test-model", max_bytes=rows * 8)
+
+
+def _vector(i):
+    return [float(i), float(-i)]
+
+
+def test_least_recently_used_entries_are_evicted_when_full(tmp_path):
+    cache = _cache(tmp_path, rows=4)
+    cache.put_many(["a", "b", "c", "d"], [_vector(i) for i in range(4)])
+    time.sleep(0.01)
+    cache.get_many(["a", "b"])
+    time.sleep(0.01)
+
+    cache.put_many(["e", "f"], [_vector(4), _vector(5)])
+
+    assert len(cache) == 4
+    assert cache.capacity == 4
+    a, b, c, d, e, f = cache.get_many(["a", "b", "c", "d", "e", "f"])
+    assert c is None and d is None
+    # Evicted rows are reused without touching the vectors kept in others
+    np.testing.assert_array_equal(a, _vector(0))
+    np.testing.assert_array_equal(b, _vector(1))
+    np.testing.assert_array_equal(e, _vector(4))
+    np.testing.assert_array_equal(f, _vector(5))
+    cache.close()
+
+
+def test_only_the_most_recent_entries_of_an_oversized_batch_are_kept(tmp_path):
+    cache = _cache(tmp_path, rows=2)
+
+    cache.put_many(["a", "b", "c"], [_vector(i) for i in range(3)])
+
+    a, b, c = cache.get_many(["a", "b", "c"])
+    assert a is None
+    np.testing.assert_array_equal(b, _vector(1))
+    np.testing.assert_array_equal(c, _vector(2))
+    cache.close()
+
+
+def test_entries_survive_reopening(tmp_path):
+    cache = _cache(tmp_path, rows=4)
+    cache.put_many(["a"], [_vector(7)])
+    cache.close()
+
+    reopened = _cache(tmp_path, rows=4)
+
+    np.testing.assert_array_equal(reopened.get_many(["a"])[0], _vector(7))
+    reopened.close()
@@ -0,0 +1,63 @@
+import os
+
+from tmp.indexManifest import IndexManifest
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+
+def _manifest(*paths):
+    manifest = IndexManifest()
+    for i, path in enumerate(paths):
+        manifest.record(path, [f"id{i}"])
+    return manifest
+
+
+def test_diff_reports_new_changed_and_deleted_files(tmp_path):
+    kept = _write(tmp_path / "kept.txt", "same")
+    edited = _write(tmp_path / "edited.txt", "before")
+    gone = _write(tmp_path / "gone.txt", "bye")
+    manifest = _manifest(kept, edited, gone)
+
+    _write(edited, "after the edit")
+    os.remove(gone)
+    added = _write(tmp_path / "added.txt", "new")
+
+    changed, deleted = manifest.diff([kept, edited, added], str(tmp_path))
+
+    assert changed == [edited, added]
+    assert deleted == [gone]
+    assert manifest.remove(gone) == ["id2"]
+
+
+def test_touched_but_identical_file_is_not_changed(tmp_path):
+    path = _write(tmp_path / "a.txt", "content")
+    manifest = _manifest(path)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+
+    assert manifest.diff([path], str(tmp_path)) == ([], [])
+
+
+def test_only_files_below_root_count_as_deleted(tmp_path):
+    # Indexing one drive must not drop the vectors of another
+    first = _write(tmp_path / "drive1" / "a.txt", "a")
+    second = _write(tmp_path / "drive2" / "b.txt", "b")
+    manifest = _manifest(first, second)
+    os.remove(first)
+    os.remove(second)
+
+    _, deleted = manifest.diff([], str(tmp_path / "drive1"))
+
+    assert deleted == [first]
+
+
+def test_files_that_still_exist_are_not_deleted_when_unlisted(tmp_path):
+    path = _write(tmp_path / "a.txt", "a")
+    manifest = _manifest(path)
+
+    assert manifest.diff([], str(tmp_path)) == ([], [])
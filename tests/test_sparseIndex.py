@@ -0,0 +1,49 @@
+import pytest
+
+from tmp.sparseIndex import BM25Index
+
+
+def _index():
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        [
+            "paged optimizers move optimizer states to CPU memory",
+            "double quantization quantizes the quantization constants",
+            "optimizer states of the adapters stay small",
+        ],
+    )
+    return index
+
+
+def test_removed_chunks_are_not_returned():
+    index = _index()
+    index.remove(["a", "unknown"])
+
+    hits = index.search("optimizer states", k=3)
+
+    assert [doc_id for doc_id, _ in hits] == ["c"]
+    assert len(index) == 2
+
+
+def test_saved_index_matches_the_one_in_memory(tmp_path):
+    index = _index()
+    index.remove(["b"])
+    index.add(["d"], ["optimizer states paged to CPU"])
+    index.save(str(tmp_path), version="v1")
+
+    loaded = BM25Index.load(str(tmp_path))
+    expected = index.search("optimizer states CPU", k=4)
+    hits = loaded.search("optimizer states CPU", k=4)
+
+    assert loaded.version == "v1"
+    assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in expected] == ["d", "a", "c"]
+    assert [score for _, score in hits] == pytest.approx([score for _, score in expected])
+    assert loaded.search("quantization") == []
+
+
+def test_adding_an_existing_id_raises():
+    index = _index()
+
+    with pytest.raises(ValueError):
+        index.add(["a"], ["again"])
@@ -0,0 +1,167 @@
+"""
+Build Checkpoint - Journal of embedded chunks for resuming interrupted builds.
+
+Embedding is the slow part of a build. Every embedded batch is committed
+to a SQLite journal next to the vectorstore (`<path>.checkpoint`) in one
+transaction, together with the files it finished. When a build crashes
+or is stopped, the next build replays the chunks of finished files from
+the journal instead of embedding them again and only processes the rest.
+
+Chunks of the file that was in progress are thrown away on resume, since
+a file is only worth reusing as a whole. The journal is deleted once the
+finished vectorstore has been published.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+# Chunks read back per replayed batch
+_REPLAY_BATCH = 1024
+
+
+def checkpoint_path(vectorstore_path: str) -> str:
+    """Location of the build journal for the vectorstore at `vectorstore_path`."""
+    return vectorstore_path.rstrip("/\\") + CHECKPOINT_SUFFIX
+
+
+class BuildCheckpoint:
+    """Append-only journal of embedded chunks, keyed by the file they came from."""
+
+    def __init__(self, path: str, settings: Dict):
+        """
+        Open (or start) the journal at `path`.
+
+        Args:
+            path: Journal file (see checkpoint_path)
+            settings: Everything the journaled vectors depend on (embedding
+                      model, chunking, index type, the store being updated).
+                      A journal written with other settings is discarded.
+        """
+        self.path = path
+        self.settings = json.loads(json.dumps(settings, default=str))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS chunks (
+                seq INTEGER PRIMARY KEY, file TEXT, id TEXT NOT NULL,
+                content TEXT NOT NULL, metadata TEXT NOT NULL, vector BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_file ON chunks (file);
+            CREATE TABLE IF NOT EXISTS duplicates (
+                seq INTEGER PRIMARY KEY, file TEXT, id TEXT NOT NULL, source TEXT
+            );
+            CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, entry TEXT);
+        """)
+
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'settings'").fetchone()
+        with self._conn:
+            if row is not None and json.loads(row[0]) != self.settings:
+                print("⚠ Discarding build checkpoint made with different settings")
+                self._clear()
+                row = None
+            if row is None:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)",
+                                   (json.dumps(self.settings),))
+            else:
+                # Chunks of the file that was in progress cannot be reused
+                self._conn.execute("DELETE FROM chunks WHERE file NOT IN (SELECT file FROM files)")
+                self._conn.execute("DELETE FROM duplicates WHERE file NOT IN (SELECT file FROM files)")
+
+        self.files: Dict[str, Optional[Dict]] = {
+            file: json.loads(entry) if entry is not None else None
+            for file, entry in self._conn.execute("SELECT file, entry FROM files")
+        }
+        if self.files:
+            chunks = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            print(f"✓ Resuming from checkpoint: {len(self.files)} file(s), "
+                  f"{chunks} embedded chunk(s)")
+
+    def _clear(self):
+        for table in ("meta", "chunks", "duplicates", "files"):
+            self._conn.execute(f"DELETE FROM {table}")
+
+    def commit(self, files: List[Optional[str]], ids: List[str], texts: List[str],
+               metadatas: List[Dict], vectors, duplicates: Iterable[Tuple] = (),
+               completed: Optional[Dict[str, Optional[Dict]]] = None):
+        """
+        Durably record one embedded batch.
+
+        Args:
+            files: File each chunk belongs to
+            ids, texts, metadatas, vectors: The chunks added to the index
+            duplicates: (file, stored chunk ID, source) for near-duplicate
+                        chunks that only added a source to a stored chunk
+            completed: Files finished with this batch, with an optional
+                       entry (e.g. their manifest record) to return on resume
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO chunks (file, id, content, metadata, vector) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (file, doc_id, text, json.dumps(metadata, default=str), vector.tobytes())
+                    for file, doc_id, text, metadata, vector
+                    in zip(files, ids, texts, metadatas, vectors)
+                ]
+            )
+            self._conn.executemany(
+                "INSERT INTO duplicates (file, id, source) VALUES (?, ?, ?)", list(duplicates)
+            )
+            self._insert_files(completed or {})
+
+    def complete(self, completed: Dict[str, Optional[Dict]]):
+        """Record files finished without a batch of their own (see commit)."""
+        with self._conn:
+            self._insert_files(completed)
+
+    def _insert_files(self, completed: Dict[str, Optional[Dict]]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?)",
+            [(file, json.dumps(entry) if entry is not None else None)
+             for file, entry in completed.items()]
+        )
+        self.files.update(completed)
+
+    def chunks(self, file: str) -> Iterator[Tuple[List[str], List[str], List[Dict], np.ndarray]]:
+        """Journaled chunks of a finished file, as (ids, texts, metadatas, vectors) batches."""
+        cursor = self._conn.execute(
+            "SELECT id, content, metadata, vector FROM chunks WHERE file = ? ORDER BY seq", (file,)
+        )
+        while True:
+            rows = cursor.fetchmany(_REPLAY_BATCH)
+            if not rows:
+                break
+            yield (
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [json.loads(row[2]) for row in rows],
+                np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows]),
+            )
+
+    def duplicates(self, file: str) -> List[Tuple[str, str]]:
+        """(stored chunk ID, source) of each near-duplicate chunk of a finished file."""
+        return self._conn.execute(
+            "SELECT id, source FROM duplicates WHERE file = ? ORDER BY seq", (file,)
+        ).fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def discard(self):
+        """Delete the journal, e.g. once the finished store is published."""
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
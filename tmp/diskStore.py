@@ -0,0 +1,391 @@
+"""
+Disk Store - Pickle-free vectorstore persistence.
+
+The FAISS index is saved with faiss.write_index and opened memory-mapped,
+so loading is instant and processes on one host share the page cache.
+Chunk text and metadata live in SQLite and are read lazily by ID.
+
+Layout of a saved vectorstore directory:
+    index.faiss       FAISS index
+    docstore.sqlite   chunk text/metadata and index position -> chunk ID
+    manifest.json     (optional) file manifest for incremental builds
+    version.json      version stamp, written last
+
+A save is written to `<path>.staging` and published by renaming it over
+`<path>`; the previous store is moved to `<path>.old` for the instant in
+between. Readers see either the old or the new store, never a mix, but
+`<path>` is missing between the two renames: wait_for_publish() waits
+that instant out, and recover_publish() finishes or rolls back a publish
+that was interrupted by a crash.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import faiss
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+INDEX_FILENAME = "index.faiss"
+DOCSTORE_FILENAME = "docstore.sqlite"
+LEGACY_PICKLE_FILENAME = "index.pkl"
+STAMP_FILENAME = "version.json"
+STAGING_SUFFIX = ".staging"
+OLD_SUFFIX = ".old"
+# How long a reader waits for a store that is being published to reappear
+PUBLISH_WAIT_S = 2.0
+
+# Map flat codes too where faiss supports it, not just IVF lists
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def _connect_readonly(db_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore that reads chunks from a saved SQLite file on demand.
+
+    The file itself is never modified: added and deleted chunks are kept
+    in memory until the vectorstore is saved again.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._conn = _connect_readonly(db_path) if db_path else None
+        self._lock = threading.Lock()
+        self._added: Dict[str, Document] = {}
+        self._deleted = set()
+
+    def search(self, search: str):
+        """Return the Document for an ID, or a message string if missing."""
+        if search in self._added:
+            return self._added[search]
+        if search in self._deleted or self._conn is None:
+            return f"ID {search} not found."
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata FROM docs WHERE id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [i for i in texts if i in self._added]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+        self._deleted.difference_update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is None:
+                self._deleted.add(doc_id)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SQLiteIndexMap(MutableMapping):
+    """
+    Lazy index position -> chunk ID mapping backed by the same SQLite file.
+
+    Saved positions are 0..n-1; positions added after loading are kept in
+    memory until the next save.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = _connect_readonly(db_path)
+        self._lock = threading.Lock()
+        self._base_len = self._conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+        self._added: Dict[int, str] = {}
+
+    def __getitem__(self, position: int) -> str:
+        if position in self._added:
+            return self._added[position]
+        if not 0 <= position < self._base_len:
+            raise KeyError(position)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM positions WHERE position = ?", (int(position),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __setitem__(self, position: int, doc_id: str):
+        self._added[position] = doc_id
+
+    def __delitem__(self, position: int):
+        raise TypeError("Saved index positions cannot be removed in place")
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._added)
+
+    def __iter__(self) -> Iterator[int]:
+        yield from range(self._base_len)
+        yield from self._added
+
+    def items(self):
+        # One pass over the table instead of a query per position
+        with self._lock:
+            rows = self._conn.execute("SELECT position, id FROM positions ORDER BY position").fetchall()
+        yield from rows
+        yield from self._added.items()
+
+    def values(self):
+        for _, doc_id in self.items():
+            yield doc_id
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def is_saved_store(path: str) -> bool:
+    """Whether `path` holds a vectorstore in this format."""
+    return os.path.exists(os.path.join(path, DOCSTORE_FILENAME))
+
+
+def is_legacy_store(path: str) -> bool:
+    """Whether `path` holds a LangChain save_local (pickle) vectorstore."""
+    return (os.path.exists(os.path.join(path, LEGACY_PICKLE_FILENAME))
+            and not is_saved_store(path))
+
+
+def save_store(path: str, index: faiss.Index, docstore: Docstore,
+               index_to_docstore_id, version: Optional[str] = None) -> int:
+    """
+    Write the index and all chunks to `path`.
+
+    `version` identifies this build of the index and is stored alongside
+    the chunks (see read_version).
+
+    Returns:
+        Number of chunks written
+    """
+    os.makedirs(path, exist_ok=True)
+
+    index_path = os.path.join(path, INDEX_FILENAME)
+    faiss.write_index(index, index_path + ".tmp")
+
+    db_path = os.path.join(path, DOCSTORE_FILENAME)
+    tmp_db_path = db_path + ".tmp"
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+
+    conn = sqlite3.connect(tmp_db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL)")
+    conn.execute("CREATE TABLE positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL)")
+    conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+    if version is not None:
+        conn.execute("INSERT INTO meta VALUES ('version', ?)", (version,))
+
+    def rows() -> Iterator[Tuple[int, str, str, str]]:
+        for position, doc_id in sorted(index_to_docstore_id.items()):
+            doc = docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Could not find document for id {doc_id}, got {doc}")
+            yield position, doc_id, doc.page_content, json.dumps(doc.metadata, default=str)
+
+    count = 0
+    batch = []
+    for row in rows():
+        batch.append(row)
+        if len(batch) >= 10000:
+            _insert_rows(conn, batch)
+            count += len(batch)
+            batch = []
+    _insert_rows(conn, batch)
+    count += len(batch)
+
+    conn.commit()
+    conn.close()
+
+    # Only replace the old files once both new ones are complete. Readers
+    # of the file being replaced must let go of it first (Windows).
+    for source in (docstore, index_to_docstore_id):
+        if isinstance(source, (SQLiteDocstore, SQLiteIndexMap)) and source.db_path == db_path:
+            source.close()
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(tmp_db_path, db_path)
+
+    legacy_path = os.path.join(path, LEGACY_PICKLE_FILENAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+    return count
+
+
+def _insert_rows(conn: sqlite3.Connection, rows: List[Tuple[int, str, str, str]]):
+    conn.executemany("INSERT INTO docs VALUES (?, ?, ?)", [(i, c, m) for _, i, c, m in rows])
+    conn.executemany("INSERT INTO positions VALUES (?, ?)", [(p, i) for p, i, _, _ in rows])
+
+
+def read_version(path: str) -> Optional[str]:
+    """Version stamp of a saved vectorstore, or None if it has none."""
+    conn = _connect_readonly(os.path.join(path, DOCSTORE_FILENAME))
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def load_store(path: str, mmap: bool = True):
+    """
+    Open a saved vectorstore without reading it into memory.
+
+    Args:
+        path: Directory written by save_store
+        mmap: Memory-map the index (read-only). Use False when the index
+              will be modified, e.g. for incremental updates.
+
+    Returns:
+        Tuple of (faiss index, SQLiteDocstore, SQLiteIndexMap)
+    """
+    index_path = os.path.join(path, INDEX_FILENAME)
+    db_path = os.path.join(path, DOCSTORE_FILENAME)
+
+    if mmap:
+        index = faiss.read_index(index_path, _MMAP_FLAG | faiss.IO_FLAG_READ_ONLY)
+    else:
+        index = faiss.read_index(index_path)
+
+    return index, SQLiteDocstore(db_path), SQLiteIndexMap(db_path)
+
+
+def staging_path(path: str) -> str:
+    """Directory a new version of the store at `path` is written to."""
+    return path.rstrip("/\\") + STAGING_SUFFIX
+
+
+def write_stamp(path: str, version: Optional[str], **info):
+    """Mark the store in `path` as complete. Must be the last file written."""
+    stamp = dict(info, version=version, published=time.time())
+    tmp_path = os.path.join(path, STAMP_FILENAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, STAMP_FILENAME))
+
+
+def read_stamp(path: str) -> Optional[Dict]:
+    """Version stamp of a published store, or None if it has none."""
+    try:
+        with open(os.path.join(path, STAMP_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _fsync_dir(path: str):
+    # Make the renames durable; not possible (or needed) on Windows
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publish(staging: str, path: str):
+    """
+    Replace the store at `path` with the complete one in `staging`.
+
+    `path` does not exist between moving the old store away and renaming
+    the new one into place; readers bridge that with wait_for_publish().
+    Readers holding files of the old store open must close them first
+    (Windows cannot rename directories with open files).
+    """
+    path = path.rstrip("/\\")
+    old_path = path + OLD_SUFFIX
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    try:
+        os.replace(staging, path)
+    except OSError:
+        if os.path.exists(old_path):
+            os.replace(old_path, path)
+        raise
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def wait_for_publish(path: str, timeout: float = PUBLISH_WAIT_S) -> bool:
+    """
+    Wait for a store that another process is publishing to reappear.
+
+    Returns:
+        True if `path` exists, False if it is still missing after
+        `timeout` or no publish is in progress
+    """
+    path = path.rstrip("/\\")
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        publishing = os.path.exists(path + STAGING_SUFFIX) or os.path.exists(path + OLD_SUFFIX)
+        if not publishing or time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def recover_publish(path: str) -> bool:
+    """
+    Finish or roll back a publish that was interrupted by a crash.
+
+    A complete (stamped) staging directory is published if the store is
+    missing; otherwise the previous store is put back. Leftover staging
+    and old directories are removed, so only call this when no other
+    process is saving to `path`.
+
+    Returns:
+        True if anything had to be repaired
+    """
+    path = path.rstrip("/\\")
+    staging = path + STAGING_SUFFIX
+    old_path = path + OLD_SUFFIX
+    repaired = False
+
+    if not os.path.exists(path):
+        if os.path.exists(staging) and read_stamp(staging) is not None:
+            os.replace(staging, path)
+            print(f"✓ Finished publishing interrupted save of '{path}'")
+            repaired = True
+        elif os.path.exists(old_path):
+            os.replace(old_path, path)
+            print(f"⚠ Save of '{path}' was interrupted; restored the previous version")
+            repaired = True
+
+    for leftover in (staging, old_path):
+        if os.path.exists(leftover):
+            shutil.rmtree(leftover, ignore_errors=True)
+            repaired = True
+    return repaired
@@ -0,0 +1,204 @@
+"""
+Embedding Cache - Persist chunk embeddings on disk so identical text is
+never embedded twice, across drives, re-runs and rebuilds.
+
+Vectors live in a memory-mapped float32 matrix; a small SQLite table maps
+each text hash to its row and tracks when it was last used for eviction.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """On-disk, size-bounded store of embeddings keyed by text hash."""
+
+    INITIAL_ROWS = 4096
+
+    def __init__(self, cache_dir: str, namespace: str, max_bytes: int):
+        """
+        Args:
+            cache_dir: Root directory of the cache
+            namespace: Identifies the embedding setup (model + options);
+                       each namespace gets its own matrix and index
+            max_bytes: Upper bound for the size of the vector matrix
+        """
+        self.path = os.path.join(cache_dir, hashlib.sha1(namespace.encode()).hexdigest()[:16])
+        os.makedirs(self.path, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.db = sqlite3.connect(os.path.join(self.path, "index.sqlite"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self.db.execute(
+            "INSERT OR IGNORE INTO meta VALUES ('namespace', ?)", (namespace,)
+        )
+        self.db.commit()
+
+        self.matrix_path = os.path.join(self.path, "vectors.f32")
+        self.dim = self._get_meta("dim", int)
+        self.capacity = self._get_meta("capacity", int) or 0
+        self.matrix = None
+        if self.dim and self.capacity:
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                    shape=(self.capacity, self.dim))
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _get_meta(self, name, cast):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return cast(row[0]) if row else None
+
+    def _set_meta(self, name, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, str(value)))
+
+    @property
+    def max_rows(self) -> int:
+        return max(1, self.max_bytes // (4 * self.dim)) if self.dim else 0
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings; returns None for keys that are not cached."""
+        if self.matrix is None or not keys:
+            return [None] * len(keys)
+
+        rows = {}
+        unique = list(set(keys))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self.db.execute(
+                f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall())
+
+        if rows:
+            now = time.time()
+            self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                [(now, key) for key in rows])
+            self.db.commit()
+
+        return [np.array(self.matrix[rows[k]]) if k in rows else None for k in keys]
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Store new embeddings, evicting the least recently used if full."""
+        entries = {}
+        for key, vector in zip(keys, vectors):
+            entries[key] = vector
+        if not entries:
+            return
+
+        if self.dim is None:
+            self.dim = len(next(iter(entries.values())))
+            self._set_meta("dim", self.dim)
+
+        # Never cache more than fits, keep the most recent ones
+        entries = dict(list(entries.items())[-self.max_rows:])
+        rows = self._allocate_rows(len(entries))
+
+        now = time.time()
+        for (key, vector), row in zip(entries.items(), rows):
+            self.matrix[row] = np.asarray(vector, dtype=np.float32)
+        self.db.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+            [(key, row, now) for key, row in zip(entries, rows)]
+        )
+        self.matrix.flush()
+        self.db.commit()
+
+    def _allocate_rows(self, count: int) -> List[int]:
+        """Return `count` free rows, growing the matrix or evicting entries."""
+        used = len(self)
+        if used + count > self.capacity and self.capacity < self.max_rows:
+            new_capacity = max(self.INITIAL_ROWS, self.capacity)
+            while new_capacity < used + count:
+                new_capacity *= 2
+            self._resize(min(new_capacity, self.max_rows))
+
+        # Rows are handed out densely, so everything past `used` is free;
+        # beyond that, reuse the rows of the least recently used entries
+        free = list(range(used, min(self.capacity, used + count)))
+        overflow = count - len(free)
+        if overflow > 0:
+            victims = self.db.execute(
+                "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (overflow,)
+            ).fetchall()
+            self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            free.extend(row for _, row in victims)
+        return free
+
+    def _resize(self, capacity: int):
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+
+        self.capacity = capacity
+        self._set_meta("capacity", capacity)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                shape=(capacity, self.dim))
+
+    def close(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.db.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated chunk text from an EmbeddingCache."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), new_vectors)
+            computed = dict(zip(missing, new_vectors))
+        else:
+            computed = {}
+
+        self.hits += len(texts) - sum(v is None for v in cached)
+        self.misses += len(missing)
+
+        return [
+            computed[key] if vector is None else vector.tolist()
+            for key, vector in zip(keys, cached)
+        ]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in one model call, bypassing the cache."""
+        if hasattr(self.embeddings, "embed_queries"):
+            return self.embeddings.embed_queries(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries rarely repeat verbatim and must stay cheap; no lookup
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,215 @@
+"""
+Embedding Engine - Spread chunk embedding over several CPU processes.
+
+A single sentence-transformers process leaves most cores of a CPU-only
+machine idle, and batches of mixed lengths waste work on padding. The
+engine sorts each call's texts by token length, cuts them into batches
+of similar length under a token budget, encodes the batches in a pool of
+worker processes with a fixed number of threads each, and returns the
+vectors in the original order.
+
+Queries and single-process setups use an in-process model instead.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import config
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    HuggingFaceEmbeddings that only imports and loads the model when the
+    first text is embedded, so loading a vectorstore does not wait for it.
+    """
+
+    def __init__(self, model_name, encode_kwargs):
+        self.model_name = model_name
+        self.encode_kwargs = encode_kwargs
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._embeddings is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+
+                self._embeddings = HuggingFaceEmbeddings(
+                    model_name=self.model_name,
+                    encode_kwargs=self.encode_kwargs
+                )
+        return self._embeddings
+
+    def embed_documents(self, texts):
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.load().embed_query(text)
+
+
+def length_batches(lengths: List[int], batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+    """
+    Group text positions into batches of similar length.
+
+    Texts are taken shortest first; a batch is closed when it holds
+    batch_size texts or when padding every text to the longest one would
+    exceed max_batch_tokens.
+
+    Returns:
+        Lists of positions into `lengths`
+    """
+    batches = []
+    current = []
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        length = max(1, lengths[i])
+        if current and (len(current) >= batch_size or length * (len(current) + 1) > max_batch_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Model owned by each embedding worker process
+_worker_model = None
+_worker_encode_kwargs = None
+
+
+def _init_worker(model_name: str, encode_kwargs: dict, threads: int):
+    """Pin the worker's thread pools, then load its copy of the model."""
+    global _worker_model, _worker_encode_kwargs
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+    _worker_encode_kwargs = encode_kwargs
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    kwargs = dict(_worker_encode_kwargs, batch_size=len(texts))
+    vectors = _worker_model.encode(texts, convert_to_numpy=True, show_progress_bar=False, **kwargs)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class EmbeddingEngine(Embeddings):
+    """Embeddings backed by a pool of sentence-transformer processes."""
+
+    def __init__(self, model_name: str, encode_kwargs: Optional[dict] = None,
+                 workers: Optional[int] = config.EMBED_WORKERS,
+                 threads_per_worker: int = config.EMBED_THREADS_PER_WORKER,
+                 batch_size: int = config.EMBED_ENCODE_BATCH_SIZE,
+                 max_batch_tokens: int = config.EMBED_MAX_BATCH_TOKENS):
+        """
+        Args:
+            model_name: sentence-transformers model
+            encode_kwargs: Passed to SentenceTransformer.encode
+                           (e.g. {"normalize_embeddings": True})
+            workers: Worker processes; None picks cores / threads_per_worker
+                     on CPU-only machines and 1 when a GPU is present
+            threads_per_worker: Torch threads in each worker
+            batch_size: Most texts encoded together
+            max_batch_tokens: Most padded tokens encoded together
+        """
+        self.model_name = model_name
+        self.encode_kwargs = dict(encode_kwargs or {})
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+
+        # In-process model for queries and when there is a single worker
+        self.local = LazyEmbeddings(model_name, dict(self.encode_kwargs, batch_size=batch_size))
+        self._pool = None
+        self._tokenizer = None
+        self._max_length = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the in-process model now instead of on first use."""
+        self.local.load()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if self._worker_count() <= 1:
+            return self.local.embed_documents(texts)
+
+        batches = length_batches(self._token_lengths(texts), self.batch_size, self.max_batch_tokens)
+        pool = self._get_pool()
+        futures = [pool.submit(_encode_in_worker, [texts[i] for i in batch]) for batch in batches]
+
+        vectors = None
+        for batch, future in zip(batches, futures):
+            result = future.result()
+            if vectors is None:
+                vectors = np.empty((len(texts), result.shape[1]), dtype=np.float32)
+            vectors[batch] = result
+        return vectors.tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries with the in-process model; never starts the pool."""
+        return self.local.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.local.embed_query(text)
+
+    def shutdown(self):
+        """Stop the worker processes; they are started again when needed."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def _worker_count(self) -> int:
+        if self.workers is None:
+            import torch
+
+            if torch.cuda.is_available():
+                self.workers = 1
+            else:
+                self.workers = max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        return self.workers
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                print(f"Starting {self.workers} embedding worker(s) with "
+                      f"{self.threads_per_worker} thread(s) each...")
+                # Spawn, not fork: the parent may already run torch threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.encode_kwargs, self.threads_per_worker)
+                )
+            return self._pool
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count of each text, capped at the model's input length."""
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            try:
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._max_length = min(self._tokenizer.model_max_length, 512)
+            except OSError:
+                # No standalone tokenizer: about four characters per token
+                self._tokenizer = False
+                self._max_length = 512
+
+        if self._tokenizer is False:
+            return [min(self._max_length, len(text) // 4 + 1) for text in texts]
+        encoded = self._tokenizer(texts, add_special_tokens=True, truncation=False)["input_ids"]
+        return [min(self._max_length, len(ids)) for ids in encoded]
@@ -0,0 +1,115 @@
+"""
+FAISS Index Types - Build flat, IVF, PQ, HNSW or scalar-quantized indexes
+for VectorStoreManager and tune them at query time.
+"""
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8")
+
+# k-means wants roughly this many training points per IVF list
+POINTS_PER_LIST = 39
+# An 8-bit PQ codebook has 256 centroids per sub-quantizer
+MIN_PQ_TRAINING_POINTS = 256
+
+
+def needs_training(index_type: str) -> bool:
+    """Whether the index type must be trained on sample vectors before adding."""
+    return index_type in ("ivf_flat", "ivf_pq", "sq8")
+
+
+def index_spec(index_type: str, dim: int, n_train: int,
+               nlist: int = 1024, pq_m: int = 96, hnsw_m: int = 32) -> str:
+    """
+    Translate an index type into a faiss.index_factory string.
+
+    The number of IVF lists is capped by the amount of training data, and
+    PQ falls back to IVF-Flat when there are too few points for codebooks.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from {INDEX_TYPES}")
+
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    if index_type == "sq8":
+        return "SQ8"
+
+    nlist = max(1, min(nlist, n_train // POINTS_PER_LIST))
+    if index_type == "ivf_pq" and n_train >= MIN_PQ_TRAINING_POINTS:
+        # Sub-quantizers must split the vector evenly
+        m = max(d for d in range(1, min(pq_m, dim) + 1) if dim % d == 0)
+        return f"IVF{nlist},PQ{m}"
+    return f"IVF{nlist},Flat"
+
+
+def build_index(index_type: str, sample: np.ndarray, **params) -> faiss.Index:
+    """
+    Create an empty index for vectors like `sample`, trained on it if needed.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        sample: float32 matrix of vectors used for training
+        **params: nlist, pq_m, hnsw_m passed to index_spec
+
+    Returns:
+        A trained, empty faiss index using L2 distance
+    """
+    sample = np.ascontiguousarray(sample, dtype=np.float32)
+    spec = index_spec(index_type, sample.shape[1], len(sample), **params)
+    index = faiss.index_factory(sample.shape[1], spec, faiss.METRIC_L2)
+
+    if not index.is_trained:
+        print(f"Training {spec} index on {len(sample)} vectors...")
+        index.train(sample)
+    return index
+
+
+def set_search_params(index: faiss.Index, nprobe=None, ef_search=None):
+    """Set query-time accuracy/speed knobs where the index supports them."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if nprobe is not None and ivf is not None:
+        ivf.nprobe = nprobe
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """
+    Whether index.remove_ids keeps vector IDs contiguous.
+
+    LangChain's FAISS wrapper maps positions 0..n-1 to docstore IDs. Flat
+    and scalar-quantized indexes compact on removal; IVF indexes keep the
+    old IDs and HNSW cannot remove at all.
+    """
+    return faiss.try_extract_index_ivf(index) is None and not isinstance(index, faiss.IndexHNSW)
+
+
+def rebuild_without(index: faiss.Index, keep_positions) -> faiss.Index:
+    """
+    Re-add only the vectors at `keep_positions` to a reset copy of the index.
+
+    Used for index types that cannot remove vectors and keep positions
+    contiguous (IVF keeps the old IDs, HNSW cannot remove at all). Every
+    call decodes and re-adds all surviving vectors, so it costs O(N) no
+    matter how few are removed. Training is kept and nothing is
+    re-embedded. IVF-Flat and HNSW store raw vectors and stay exact. With
+    PQ, a decoded vector can land in another list or get another residual
+    code, so each rebuild adds some quantization error; rebuild the store
+    from scratch after many incremental deletes.
+    """
+    keep_positions = np.asarray(keep_positions, dtype=np.int64)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+
+    vectors = index.reconstruct_batch(keep_positions) if len(keep_positions) else None
+
+    index.reset()
+    if ivf is not None:
+        ivf.make_direct_map(False)
+    if vectors is not None:
+        index.add(vectors)
+    return index
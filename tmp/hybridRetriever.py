@@ -0,0 +1,136 @@
+"""
+Hybrid Retriever - Combine dense FAISS search with BM25 keyword search.
+
+Both searches return their own candidate lists, which are merged with
+weighted reciprocal rank fusion: a chunk scores
+sum(weight / (rrf_k + rank)) over the lists it appears in. Fusing ranks
+instead of raw scores needs no calibration between cosine distances
+and BM25 scores.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from instrumentation import span
+
+
+def embed_queries(embedder, queries: Sequence[str]) -> np.ndarray:
+    """
+    Embed many queries in one call.
+
+    Uses embed_queries when the embedder has one (EmbeddingEngine,
+    CachedEmbeddings), which keeps queries on the in-process model instead
+    of the ingestion worker pool.
+    """
+    with span("retrieve.embed_query", queries=len(queries)):
+        if hasattr(embedder, "embed_queries"):
+            vectors = embedder.embed_queries(list(queries))
+        else:
+            vectors = embedder.embed_documents(list(queries))
+    return np.array(vectors, dtype=np.float32)
+
+
+def dense_search_ids(store, queries: Sequence[str], k: int) -> List[List[str]]:
+    """
+    Embed all queries in one call and search them with one index.search.
+
+    Args:
+        store: LangChain FAISS vectorstore
+        queries: Query strings
+        k: Results per query
+
+    Returns:
+        List with one list of docstore IDs per query, best first
+    """
+    vectors = embed_queries(store.embeddings, queries)
+    if store._normalize_L2:
+        faiss.normalize_L2(vectors)
+
+    with span("retrieve.faiss_search", queries=len(queries), k=k):
+        _, indices = store.index.search(vectors, k)
+
+    return [
+        [store.index_to_docstore_id[int(position)] for position in row if position != -1]
+        for row in indices
+    ]
+
+
+def load_documents(store, ids: Sequence[str], limit: Optional[int] = None) -> List[Document]:
+    """Documents for docstore IDs in order, skipping missing ones, at most `limit`."""
+    docs = []
+    for doc_id in ids:
+        if limit is not None and len(docs) == limit:
+            break
+        doc = store.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            docs.append(doc)
+    return docs
+
+
+def dense_search(store, queries: Sequence[str], k: int) -> List[List[Document]]:
+    """Like dense_search_ids, but returns the Documents of each query's results."""
+    results = dense_search_ids(store, queries, k)
+    with span("retrieve.docstore_lookup") as stage:
+        results = [load_documents(store, ids) for ids in results]
+        stage.set(chunks=sum(len(docs) for docs in results))
+    return results
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[str]],
+                           weights: Sequence[float], rrf_k: int = 60) -> List[str]:
+    """Merge ranked ID lists into one, best first."""
+    scores: Dict[str, float] = {}
+    for ids, weight in zip(ranked_lists, weights):
+        for rank, doc_id in enumerate(ids, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing FAISS similarity search with a BM25Index."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    sparse_index: Any
+    k: int = 4
+    # Candidates taken from each search before fusion
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.batch_documents([query])[0]
+
+    def batch_documents(self, queries: Sequence[str]) -> List[List[Document]]:
+        """
+        Retrieve for many queries with a single dense index search.
+
+        Candidates are fused by ID; only the documents of the top k fused
+        results are read from the docstore.
+        """
+        dense_results = dense_search_ids(self.vectorstore, queries, self.fetch_k)
+
+        results = []
+        for query, dense_ids in zip(queries, dense_results):
+            with span("retrieve.bm25_search"):
+                sparse_ids = [doc_id for doc_id, _ in self.sparse_index.search(query, self.fetch_k)]
+
+            fused = reciprocal_rank_fusion(
+                [dense_ids, sparse_ids],
+                [self.dense_weight, self.sparse_weight],
+                self.rrf_k
+            )
+            with span("retrieve.docstore_lookup") as stage:
+                docs = load_documents(self.vectorstore, fused, self.k)
+                stage.set(chunks=len(docs))
+            results.append(docs)
+        return results
@@ -0,0 +1,170 @@
+"""
+Index Manifest - Remember which files went into a vectorstore so that a
+re-run only embeds new or changed files and drops vectors for deleted ones.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """Persisted map of indexed files (size, mtime, hash) to their vector IDs."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = settings or {}
+        self.files: Dict[str, Dict] = {}
+        self._fingerprints: Dict[str, Tuple[int, float, str]] = {}
+
+    @staticmethod
+    def manifest_path(vectorstore_path: str) -> str:
+        """Location of the manifest inside a saved vectorstore."""
+        return os.path.join(vectorstore_path, MANIFEST_FILENAME)
+
+    @classmethod
+    def load(cls, vectorstore_path: str, settings: Optional[Dict] = None) -> "IndexManifest":
+        """
+        Load the manifest saved with a vectorstore.
+
+        Args:
+            vectorstore_path: Directory the vectorstore was saved to
+            settings: Index settings (embedding model, chunking) of this run
+
+        Returns:
+            The stored manifest, or an empty one if none exists or it was
+            built with different settings
+        """
+        path = cls.manifest_path(vectorstore_path)
+        if not os.path.exists(path):
+            return cls(settings)
+
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        manifest = cls(settings if settings is not None else data.get("settings"))
+
+        if data.get("format_version") != cls.FORMAT_VERSION:
+            return manifest
+        if settings is not None and data.get("settings") != settings:
+            print("⚠ Index settings changed since last build, re-indexing everything")
+            return manifest
+
+        manifest.files = data.get("files", {})
+        return manifest
+
+    def save(self, vectorstore_path: str):
+        """Write the manifest next to the saved index files."""
+        os.makedirs(vectorstore_path, exist_ok=True)
+        path = self.manifest_path(vectorstore_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format_version": self.FORMAT_VERSION,
+                "settings": self.settings,
+                "files": self.files,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.files
+
+    def diff(self, file_paths: List[str],
+             root: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """
+        Compare files on disk against the manifest.
+
+        Size and mtime are checked first; the content hash is only computed
+        when they differ, so unchanged files cost a single stat.
+
+        Args:
+            file_paths: Files currently selected for indexing
+            root: Directory that was scanned. Only manifest entries below it
+                  are considered for deletion, so indexing one folder never
+                  drops the vectors of another.
+
+        Returns:
+            Tuple of (new or changed files, deleted files)
+        """
+        changed = []
+        current = set()
+
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            current.add(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+
+            entry = self.files.get(file_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+
+            digest = hash_file(file_path)
+            self._fingerprints[file_path] = (stat.st_size, stat.st_mtime, digest)
+            if entry and entry["sha256"] == digest:
+                # Touched but identical: refresh the stat so we skip it next time
+                entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime
+                continue
+
+            changed.append(file_path)
+
+        prefix = os.path.join(os.path.abspath(root), "") if root else None
+        deleted = [
+            path for path in self.files
+            if path not in current
+            and (prefix is None or path.startswith(prefix))
+            and not os.path.exists(path)
+        ]
+
+        return changed, deleted
+
+    def ids_for(self, file_path: str) -> List[str]:
+        """Vector IDs currently stored for a file."""
+        entry = self.files.get(os.path.abspath(file_path))
+        return list(entry["ids"]) if entry else []
+
+    def record(self, file_path: str, ids: List[str]):
+        """Store the vector IDs produced for a (re-)indexed file."""
+        file_path = os.path.abspath(file_path)
+        fingerprint = self._fingerprints.pop(file_path, None)
+        if fingerprint is None:
+            stat = os.stat(file_path)
+            fingerprint = (stat.st_size, stat.st_mtime, hash_file(file_path))
+
+        size, mtime, digest = fingerprint
+        self.files[file_path] = {
+            "size": size,
+            "mtime": mtime,
+            "sha256": digest,
+            "ids": list(ids),
+        }
+
+    def remove(self, file_path: str) -> List[str]:
+        """Forget a file and return the vector IDs that belonged to it."""
+        entry = self.files.pop(os.path.abspath(file_path), None)
+        return list(entry["ids"]) if entry else []
+
+    def referenced_ids(self) -> Set[str]:
+        """
+        Vector IDs still used by any file.
+
+        With deduplication several files can share a vector, so a vector
+        is only stale once no file refers to it.
+        """
+        return {doc_id for entry in self.files.values() for doc_id in entry["ids"]}
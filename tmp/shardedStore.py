@@ -0,0 +1,449 @@
+"""
+Sharded Store - Many independently built vectorstores searched as one.
+
+Files are assigned to shards by drive (mount point), by top-level folder
+or by a hash of their path. Each shard is a complete saved vectorstore
+(see vectorStore.py) in its own sub-directory, so one drive can be
+re-indexed, loaded or dropped without touching the others.
+
+Queries are embedded once and fanned out to all loaded shards in a
+thread pool (FAISS and SQLite release the GIL while they work). Each
+shard returns its best vector and BM25 candidates; these are merged
+into global top lists by distance and score, fused with reciprocal
+rank fusion, and only the winning chunks are read from their shard.
+
+Layout of a sharded store directory:
+    shards.json       partition scheme and one entry per shard
+    <shard name>/     a saved vectorstore
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import faiss
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from instrumentation import span
+from tmp.buildCheckpoint import checkpoint_path
+from tmp.faissIndex import set_search_params
+from tmp.hybridRetriever import embed_queries, reciprocal_rank_fusion
+from tmp.indexManifest import IndexManifest
+from tmp.vectorStore import VectorStoreManager
+import config
+
+REGISTRY_FILENAME = "shards.json"
+
+
+def _safe_name(text: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", text).strip("._")
+    return name or "root"
+
+
+@lru_cache(maxsize=4096)
+def _mount_point(directory: str) -> str:
+    path = directory
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def shard_key(file_path: str, partition: str = "drive", root: Optional[str] = None) -> str:
+    """
+    Name of the shard a file belongs to.
+
+    Args:
+        file_path: File being indexed
+        partition: "drive" (drive letter or mount point), "folder"
+                   (first folder below root) or "hash:<n>" (n shards by
+                   path hash, for one very large drive)
+        root: Folder that was scanned; required for "folder"
+
+    Returns:
+        A shard name that is safe to use as a directory name
+    """
+    path = os.path.abspath(file_path)
+
+    if partition == "drive":
+        drive, _ = os.path.splitdrive(path)
+        return _safe_name(drive or _mount_point(os.path.dirname(path)))
+
+    if partition == "folder":
+        if root is None:
+            raise ValueError("Partitioning by folder needs the scanned root folder")
+        relative = os.path.relpath(path, os.path.abspath(root))
+        parts = relative.split(os.sep)
+        return _safe_name(parts[0]) if len(parts) > 1 else "root"
+
+    if partition.startswith("hash:"):
+        count = int(partition.split(":", 1)[1])
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return f"hash{int(digest, 16) % count:03d}"
+
+    raise ValueError(f"Unknown shard partition '{partition}'. "
+                     f"Use 'drive', 'folder' or 'hash:<n>'")
+
+
+def _reader_workers(reader) -> int:
+    return getattr(reader, "workers", config.INGEST_WORKERS)
+
+
+class ShardedStore:
+    """
+    A directory of vectorstore shards sharing one embedding model.
+
+    Exposes `version`, `embeddings` and get_retriever() like
+    VectorStoreManager, so it works with QAChain and AnswerCache.
+    """
+
+    def __init__(self, path: str = config.SHARDED_VECTORSTORE_PATH,
+                 embedding_model: str = config.EMBEDDING_MODEL,
+                 partition: Optional[str] = None,
+                 search_workers: int = config.SHARD_SEARCH_WORKERS,
+                 **manager_kwargs):
+        """
+        Args:
+            path: Directory holding the shards
+            embedding_model: Embedding model shared by all shards
+            partition: How files are assigned to shards (see shard_key);
+                       None uses SHARD_PARTITION. An existing store keeps
+                       the scheme it was built with.
+            search_workers: Threads searching shards in parallel
+            manager_kwargs: Passed to every shard's VectorStoreManager
+                            (index_type, hybrid, ...)
+        """
+        self.path = path
+        self.embedding_model = embedding_model
+        self.search_workers = search_workers
+        self.manager_kwargs = manager_kwargs
+
+        registry = self._read_registry()
+        self.partition = registry.get("partition", partition or config.SHARD_PARTITION)
+        self.shards: Dict[str, Dict] = registry.get("shards", {})
+        if partition is not None and self.partition != partition:
+            print(f"⚠ Store at '{path}' is partitioned by '{self.partition}', keeping that")
+
+        # Owns the embedding model, cache and worker pool for all shards
+        self._base = VectorStoreManager(embedding_model, **manager_kwargs)
+        self.embeddings = self._base.embeddings
+        # Loaded shards, by name
+        self.managers: Dict[str, VectorStoreManager] = {}
+        # Query-time index knobs applied to every loaded shard (see get_retriever)
+        self.nprobe = config.FAISS_NPROBE
+        self.ef_search = config.FAISS_EF_SEARCH
+        self._executor = None
+
+    def _registry_path(self) -> str:
+        return os.path.join(self.path, REGISTRY_FILENAME)
+
+    def _read_registry(self) -> Dict:
+        try:
+            with open(self._registry_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_registry(self):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._registry_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format_version": 1,
+                "partition": self.partition,
+                "embedding_model": self.embedding_model,
+                "shards": self.shards,
+            }, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def shard_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def version(self) -> str:
+        """Changes whenever any loaded shard changes (for AnswerCache)."""
+        parts = sorted(f"{name}:{manager.version}" for name, manager in self.managers.items())
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    def partition_files(self, file_paths: Iterable[str],
+                        root: Optional[str] = None) -> Dict[str, List[str]]:
+        """Group files by the shard they belong to."""
+        groups: Dict[str, List[str]] = {}
+        for file_path in file_paths:
+            groups.setdefault(shard_key(file_path, self.partition, root), []).append(file_path)
+        return groups
+
+    def _new_manager(self) -> VectorStoreManager:
+        kwargs = dict(self.manager_kwargs, cache_path=None, lazy=True)
+        manager = VectorStoreManager(self.embedding_model, **kwargs)
+        manager.share_embeddings(self._base)
+        return manager
+
+    def index_files(self, reader, file_paths: Sequence[str], root: Optional[str] = None,
+                    only: Optional[Iterable[str]] = None,
+                    incremental: bool = config.INCREMENTAL_INDEXING) -> Dict[str, int]:
+        """
+        Build or update the shards that the given files belong to.
+
+        Shards are processed one at a time and saved as soon as they are
+        done, so an interrupted run keeps the shards it finished. Shards
+        without files in `file_paths` are left as they are, except that an
+        incremental run drops the vectors of their files that were deleted
+        (a shard left with no files is removed).
+
+        Args:
+            reader: ContentReader used to parse and split files
+            file_paths: Files to index (e.g. everything on one drive)
+            root: Folder that was scanned; limits which missing files count
+                  as deleted, and is needed for "folder" partitioning
+            only: Only (re)build these shards
+            incremental: Re-embed only new or changed files of each shard
+
+        Returns:
+            Chunks in each shard that was built, by shard name
+        """
+        from content.fileReader import iter_documents, iter_file_documents
+        from processor.tokenChunker import chunk_settings
+
+        groups = self.partition_files(file_paths, root)
+        if only is not None:
+            only = set(only)
+            groups = {name: paths for name, paths in groups.items() if name in only}
+        if incremental:
+            # Shards none of whose files were listed may still have lost files
+            for name in self.shards:
+                if name in groups or (only is not None and name not in only):
+                    continue
+                _, deleted = IndexManifest.load(self.shard_path(name)).diff([], root)
+                if deleted:
+                    groups[name] = []
+
+        settings = chunk_settings(reader.text_splitter)
+        built = {}
+        try:
+            for name, paths in sorted(groups.items()):
+                print("\n" + "=" * 60)
+                print(f"Shard '{name}': {len(paths)} file(s)")
+                print("=" * 60)
+
+                manager = self._new_manager()
+                path = self.shard_path(name)
+                checkpoint = checkpoint_path(path) if config.BUILD_CHECKPOINTS else None
+                with span("shard.build", shard=name, files=len(paths)):
+                    if incremental:
+                        manifest = manager.load_incremental(path, settings, checkpoint)
+                        changed, deleted = manifest.diff(paths, root)
+                        print(f"Incremental update: {len(changed)} new/changed, "
+                              f"{len(deleted)} deleted, {len(paths) - len(changed)} unchanged")
+                        manager.update_vectorstore(
+                            iter_file_documents(reader, changed, workers=_reader_workers(reader)),
+                            deleted
+                        )
+                    else:
+                        manager.create_vectorstore(
+                            iter_documents(reader, paths, workers=_reader_workers(reader)),
+                            checkpoint
+                        )
+
+                    if (incremental and name in self.shards and manager.vectorstore is not None
+                            and manager.manifest.is_empty):
+                        print(f"✓ All files of shard '{name}' were deleted, removing it")
+                        if manager.checkpoint is not None:
+                            manager.checkpoint.discard()
+                        self.remove_shard(name)
+                        continue
+                    if manager.vectorstore is None:
+                        print(f"⚠ No documents for shard '{name}', skipping it")
+                        continue
+                    manager.save_vectorstore(path)
+
+                vectors = manager.vectorstore.index.ntotal
+                self.shards[name] = {
+                    "version": manager.version,
+                    "vectors": vectors,
+                    "files": len(manager.manifest.files) if incremental else len(paths),
+                    "updated": datetime.now(timezone.utc).isoformat(),
+                }
+                self._write_registry()
+                built[name] = vectors
+                print(f"✓ Shard '{name}' saved ({vectors} vectors)")
+
+                # Serve the new version if this shard was already loaded
+                if name in self.managers:
+                    self.load([name])
+        finally:
+            self._base.engine.shutdown()
+        return built
+
+    def remove_shard(self, name: str):
+        """Delete a shard from disk and stop searching it."""
+        if name not in self.shards:
+            raise ValueError(f"No shard named '{name}'")
+        self.managers.pop(name, None)
+        del self.shards[name]
+        self._write_registry()
+        shutil.rmtree(self.shard_path(name), ignore_errors=True)
+
+    def load(self, names: Optional[Iterable[str]] = None) -> "ShardedStore":
+        """
+        Load shards in parallel (all of them by default).
+
+        Each shard's index is memory-mapped, so loading many shards costs
+        little RAM until they are searched.
+        """
+        names = list(self.shards) if names is None else list(names)
+        missing = [name for name in names if name not in self.shards]
+        if missing:
+            raise ValueError(f"Unknown shard(s): {', '.join(missing)}")
+
+        def load_one(name):
+            manager = self._new_manager()
+            manager.load_vectorstore(self.shard_path(name))
+            set_search_params(manager.vectorstore.index, nprobe=self.nprobe,
+                              ef_search=self.ef_search)
+            return name, manager
+
+        with span("shard.load", shards=len(names)):
+            for name, manager in self._pool().map(load_one, names):
+                self.managers[name] = manager
+        print(f"✓ Loaded {len(names)} shard(s) from {self.path}")
+        return self
+
+    def unload(self, names: Iterable[str]):
+        """Stop searching these shards and release them."""
+        for name in names:
+            self.managers.pop(name, None)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.search_workers),
+                                                thread_name_prefix="shard")
+        return self._executor
+
+    def _search_shard(self, name, manager, vectors, queries, fetch_k):
+        """Candidate (score, shard, chunk ID) lists of one shard for every query."""
+        store = manager.vectorstore
+        dense = [[] for _ in queries]
+        if store.index.ntotal:
+            search_vectors = vectors.copy() if store._normalize_L2 else vectors
+            if store._normalize_L2:
+                faiss.normalize_L2(search_vectors)
+            distances, positions = store.index.search(search_vectors, min(fetch_k, store.index.ntotal))
+            for hits, row_distances, row_positions in zip(dense, distances, positions):
+                for distance, position in zip(row_distances, row_positions):
+                    if position != -1:
+                        hits.append((float(distance), name, store.index_to_docstore_id[int(position)]))
+
+        sparse = None
+        if manager.sparse_index is not None:
+            sparse = [
+                [(score, name, doc_id) for doc_id, score in manager.sparse_index.search(query, fetch_k)]
+                for query in queries
+            ]
+        return dense, sparse, store.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    def search(self, queries: Sequence[str], k: int = config.HYBRID_K,
+               fetch_k: int = config.HYBRID_FETCH_K) -> List[List[Document]]:
+        """
+        Retrieve the top k chunks across all loaded shards for each query.
+
+        Returns:
+            One list of Documents per query, best first
+        """
+        if not self.managers:
+            raise ValueError("No shards loaded. Build or load some first.")
+        fetch_k = max(fetch_k, k)
+        queries = list(queries)
+        vectors = embed_queries(self.embeddings, queries)
+
+        managers = list(self.managers.items())
+        with span("shard.fan_out", shards=len(managers), queries=len(queries)):
+            shard_results = list(self._pool().map(
+                lambda item: self._search_shard(item[0], item[1], vectors, queries, fetch_k),
+                managers
+            ))
+
+        results = []
+        for i in range(len(queries)):
+            dense = [hit for shard_dense, _, _ in shard_results for hit in shard_dense[i]]
+            # Distances from one embedding model are comparable across shards
+            higher_is_better = any(inner_product for _, _, inner_product in shard_results)
+            dense.sort(key=lambda hit: hit[0], reverse=higher_is_better)
+            dense_keys = [(shard, doc_id) for _, shard, doc_id in dense[:fetch_k]]
+
+            sparse_lists = [shard_sparse[i] for _, shard_sparse, _ in shard_results
+                            if shard_sparse is not None]
+            if sparse_lists:
+                # BM25 scores use per-shard statistics; close enough to rank
+                # candidates that fusion then weighs against vector rank
+                sparse = sorted((hit for hits in sparse_lists for hit in hits),
+                                key=lambda hit: hit[0], reverse=True)
+                sparse_keys = [(shard, doc_id) for _, shard, doc_id in sparse[:fetch_k]]
+                ranked = reciprocal_rank_fusion(
+                    [dense_keys, sparse_keys],
+                    [config.HYBRID_DENSE_WEIGHT, config.HYBRID_SPARSE_WEIGHT],
+                    config.HYBRID_RRF_K
+                )
+            else:
+                ranked = dense_keys
+
+            docs = []
+            for shard, doc_id in ranked:
+                doc = self.managers[shard].vectorstore.docstore.search(doc_id)
+                if isinstance(doc, Document):
+                    docs.append(doc)
+                if len(docs) == k:
+                    break
+            results.append(docs)
+        return results
+
+    def get_retriever(self, search_kwargs=None, nprobe=config.FAISS_NPROBE,
+                      ef_search=config.FAISS_EF_SEARCH) -> "ShardedRetriever":
+        """
+        Retriever searching all loaded shards.
+
+        Args:
+            search_kwargs: Retriever settings (e.g. {"k": 4})
+            nprobe: IVF lists scanned per query (IVF index types only)
+            ef_search: HNSW candidate list size (HNSW index type only)
+        """
+        self.nprobe, self.ef_search = nprobe, ef_search
+        for manager in self.managers.values():
+            set_search_params(manager.vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+        k = (search_kwargs or {}).get("k", config.HYBRID_K)
+        return ShardedRetriever(store=self, k=k, fetch_k=max(config.HYBRID_FETCH_K, k))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class ShardedRetriever(BaseRetriever):
+    """LangChain retriever over a ShardedStore."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    store: Any
+    k: int = 4
+    fetch_k: int = 20
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.store.search([query], self.k, self.fetch_k)[0]
+
+    def batch_documents(self, queries: Sequence[str]) -> List[List[Document]]:
+        """Retrieve for many queries with one fan-out."""
+        return self.store.search(queries, self.k, self.fetch_k)
@@ -0,0 +1,261 @@
+"""
+Sparse Index - BM25 keyword search over the chunks of a vectorstore.
+
+Dense embeddings blur exact identifiers, part numbers and rare terms; an
+inverted index finds them directly. The index is filled in the same pass
+that embeds the chunks and saved next to the FAISS index as
+bm25.sqlite, one row of posting lists per term. A saved index is opened
+lazily: only the posting lists of the query terms are read.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+SPARSE_FILENAME = "bm25.sqlite"
+
+# Words, plus identifiers such as "AB-1234", "v2.1" or "x_max" kept whole
+_TOKEN_RE = re.compile(r"\w+(?:[-./:]\w+)*")
+_SPLIT_RE = re.compile(r"[-./:_]")
+
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the
+this to was were will with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of `text` for indexing and querying.
+
+    Compound identifiers are kept whole and also split into their parts,
+    so "AB-1234" matches both "AB-1234" and "1234".
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = [p for p in _SPLIT_RE.split(token) if p]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring, keyed by docstore ID."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc number: term frequency}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # Doc numbers are positions in these lists; removed docs become None
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_lens: List[int] = []
+        self._num_by_id: Dict[str, int] = {}
+        self._total_len = 0
+        self.version = None
+
+        # Set when opened lazily from a saved file
+        self._conn = None
+        self._lock = threading.Lock()
+        self._lens_array = None
+
+    def __len__(self) -> int:
+        if self._conn is not None:
+            return len(self._lens_array)
+        return len(self._num_by_id)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Index chunk texts under their docstore IDs."""
+        self._materialize()
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self._num_by_id:
+                raise ValueError(f"Tried to add an id that already exists: {doc_id}")
+            terms = Counter(tokenize(text))
+            num = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            length = sum(terms.values())
+            self._doc_lens.append(length)
+            self._num_by_id[doc_id] = num
+            self._total_len += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[num] = tf
+
+    def remove(self, ids: Iterable[str]):
+        """Drop chunks from the index; unknown IDs are ignored."""
+        self._materialize()
+        removed = set()
+        for doc_id in ids:
+            num = self._num_by_id.pop(doc_id, None)
+            if num is None:
+                continue
+            removed.add(num)
+            self._doc_ids[num] = None
+            self._total_len -= self._doc_lens[num]
+            self._doc_lens[num] = 0
+        if not removed:
+            return
+
+        for term in list(self._postings):
+            postings = self._postings[term]
+            for num in removed.intersection(postings):
+                del postings[num]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Best matching chunks for a query.
+
+        Returns:
+            Up to k (docstore ID, BM25 score) pairs, best first
+        """
+        n_docs = len(self)
+        if n_docs == 0:
+            return []
+
+        lens = self._lengths()
+        avg_len = (self._total_len / n_docs) or 1.0
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            docs, tfs = self._posting_arrays(term)
+            if not len(docs):
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lens[docs] / avg_len)
+            term_scores = idf * tfs * (self.k1 + 1) / (tfs + norm)
+            for num, score in zip(docs.tolist(), term_scores.tolist()):
+                scores[num] = scores.get(num, 0.0) + score
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self._doc_id(num), score) for num, score in best]
+
+    def _posting_arrays(self, term: str):
+        if self._conn is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+            return (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                    np.fromiter(postings.values(), dtype=np.float64, count=len(postings)))
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT docs, tfs FROM terms WHERE term = ?", (term,)
+            ).fetchone()
+        if row is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return (np.frombuffer(row[0], dtype=np.int32).astype(np.int64),
+                np.frombuffer(row[1], dtype=np.int32).astype(np.float64))
+
+    def _lengths(self) -> np.ndarray:
+        if self._conn is not None:
+            return self._lens_array
+        return np.asarray(self._doc_lens, dtype=np.float64)
+
+    def _doc_id(self, num: int) -> str:
+        if self._conn is None:
+            return self._doc_ids[num]
+        with self._lock:
+            return self._conn.execute("SELECT id FROM docs WHERE num = ?", (num,)).fetchone()[0]
+
+    def save(self, path: str, version: Optional[str] = None):
+        """Write the index to `path`/bm25.sqlite, dropping removed chunks."""
+        self._materialize()
+        os.makedirs(path, exist_ok=True)
+        db_path = os.path.join(path, SPARSE_FILENAME)
+        tmp_path = db_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        # Renumber the remaining chunks 0..n-1
+        renumber = {}
+        doc_rows = []
+        lens = []
+        for num, doc_id in enumerate(self._doc_ids):
+            if doc_id is not None:
+                renumber[num] = len(doc_rows)
+                doc_rows.append((len(doc_rows), doc_id))
+                lens.append(self._doc_lens[num])
+
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE terms (term TEXT PRIMARY KEY, docs BLOB NOT NULL, tfs BLOB NOT NULL)")
+        conn.execute("CREATE TABLE docs (num INTEGER PRIMARY KEY, id TEXT NOT NULL)")
+        conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value)")
+        conn.executemany("INSERT INTO docs VALUES (?, ?)", doc_rows)
+
+        def term_rows():
+            for term, postings in self._postings.items():
+                docs = np.array([renumber[num] for num in postings], dtype=np.int32)
+                tfs = np.array(list(postings.values()), dtype=np.int32)
+                yield term, docs.tobytes(), tfs.tobytes()
+
+        conn.executemany("INSERT INTO terms VALUES (?, ?, ?)", term_rows())
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("k1", self.k1),
+            ("b", self.b),
+            ("total_len", self._total_len),
+            ("lens", np.array(lens, dtype=np.int32).tobytes()),
+            ("version", version),
+        ])
+        conn.commit()
+        conn.close()
+
+        os.replace(tmp_path, db_path)
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str, lazy: bool = True) -> "BM25Index":
+        """
+        Open the index saved in `path`.
+
+        Args:
+            path: Vectorstore directory
+            lazy: Read posting lists on demand. Pass False to load the
+                  whole index into memory for updates.
+        """
+        db_path = os.path.join(path, SPARSE_FILENAME)
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        meta = dict(conn.execute("SELECT name, value FROM meta").fetchall())
+
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index.version = meta.get("version")
+        index._total_len = meta["total_len"]
+        index._conn = conn
+        index._lens_array = np.frombuffer(meta["lens"], dtype=np.int32).astype(np.float64)
+        if not lazy:
+            index._materialize()
+        return index
+
+    def _materialize(self):
+        """Read a lazily opened index fully into memory so it can change."""
+        if self._conn is None:
+            return
+        conn = self._conn
+        self._doc_ids = [row[0] for row in conn.execute("SELECT id FROM docs ORDER BY num")]
+        self._num_by_id = {doc_id: num for num, doc_id in enumerate(self._doc_ids)}
+        self._doc_lens = self._lens_array.astype(np.int64).tolist()
+        self._postings = {}
+        for term, docs, tfs in conn.execute("SELECT term, docs, tfs FROM terms"):
+            self._postings[term] = dict(zip(
+                np.frombuffer(docs, dtype=np.int32).tolist(),
+                np.frombuffer(tfs, dtype=np.int32).tolist()
+            ))
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._lens_array = None
@@ -1,44 +1,699 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import shutil
+import uuid
+from itertools import islice
+
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from tmp.indexManifest import IndexManifest
+from tmp.embeddingCache import EmbeddingCache, CachedEmbeddings
+from tmp.embeddingEngine import EmbeddingEngine
+from tmp.faissIndex import (
+    build_index, needs_training, set_search_params, supports_removal, rebuild_without
+)
+from tmp.sparseIndex import SPARSE_FILENAME, BM25Index
+from tmp.hybridRetriever import HybridRetriever, dense_search
+from processor.deduplicator import ChunkDeduplicator
+from tmp.buildCheckpoint import BuildCheckpoint
+from tmp.diskStore import (
+    DOCSTORE_FILENAME, SQLiteDocstore, SQLiteIndexMap, is_legacy_store, load_store,
+    publish, read_version, recover_publish, save_store, staging_path, wait_for_publish,
+    write_stamp
+)
+from instrumentation import count, span
+import config
+
 
 class VectorStoreManager:
     """Manages vector store creation, saving, and loading."""
     
-    def __init__(self, embedding_model, encode_kwargs=None):
+    def __init__(self, embedding_model, encode_kwargs=None,
+                 batch_size=config.EMBED_BATCH_SIZE,
+                 cache_path=config.EMBEDDING_CACHE_PATH,
+                 cache_max_mb=config.EMBEDDING_CACHE_MAX_MB,
+                 index_type=config.FAISS_INDEX_TYPE, index_params=None,
+                 lazy=config.LAZY_LOADING, hybrid=config.HYBRID_SEARCH,
+                 dedup=config.DEDUP_CHUNKS):
         if encode_kwargs is None:
             encode_kwargs = {"normalize_embeddings": True}
         
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            encode_kwargs=encode_kwargs
-        )
+        if index_params is None:
+            index_params = {
+                "nlist": config.FAISS_NLIST,
+                "pq_m": config.FAISS_PQ_M,
+                "hnsw_m": config.FAISS_HNSW_M,
+            }
+        
+        self.embedding_model = embedding_model
+        # Multi-process, length-bucketed encoding for ingestion; the model
+        # itself is loaded on first use unless lazy loading is off
+        self.engine = EmbeddingEngine(embedding_model, encode_kwargs)
+        if not lazy:
+            self.engine.load()
+        self.embeddings = self.engine
+        # False when the engine is borrowed from another manager, which
+        # then decides when its worker processes stop
+        self._owns_engine = True
+        
+        # Serve chunks that were embedded before (by any build) from disk
+        if cache_path:
+            normalize = bool(encode_kwargs.get("normalize_embeddings", False))
+            cache = EmbeddingCache(
+                cache_path,
+                namespace=f"{embedding_model}|normalize={normalize}",
+                max_bytes=cache_max_mb * 1024 * 1024
+            )
+            self.embeddings = CachedEmbeddings(self.embeddings, cache)
+        # Chunks embedded and added to the index per step
+        self.batch_size = batch_size
+        self.index_type = index_type
+        self.index_params = index_params
+        self.train_size = config.FAISS_TRAIN_SIZE
+        # Embedded batches held back until there is enough data to train on
+        self._pending = []
         self.vectorstore = None
+        self.manifest = None
+        # BM25 keyword index over the same chunks (None when hybrid is off)
+        self.hybrid = hybrid
+        self.sparse_index = None
+        # Near-duplicate chunks share one vector (None when dedup is off)
+        self.dedup = dedup
+        self.deduplicator = None
+        # Metadata of chunks held in _pending, by ID, so their sources can
+        # be updated before they reach the docstore
+        self._metadata = {}
+        # Changes whenever the index content changes; used to invalidate
+        # anything derived from it, such as cached answers
+        self.version = None
+        # Journal of embedded batches for resuming an interrupted build
+        self.checkpoint = None
+        self._open_file = None
+        self._finished_files = set()
+        # Incremental updates: IDs that files replayed from the journal
+        # replace, and how many chunks were replayed
+        self._replaced_ids = {}
+        self._replayed_chunks = 0
     
-    def create_vectorstore(self, documents):
-        """Create a FAISS vectorstore from documents."""
-        self.vectorstore = FAISS.from_documents(documents, self.embeddings)
+    def create_vectorstore(self, documents, checkpoint_path=None):
+        """
+        Create a FAISS vectorstore from documents.
+        
+        `documents` may be any iterable, including a generator streaming
+        chunks from a reader. Chunks are embedded and added to the index
+        in batches of `batch_size`, so only one batch is held at a time.
+        
+        Args:
+            documents: Chunks, file by file
+            checkpoint_path: Journal embedded batches here (see
+                             tmp/buildCheckpoint.py). Files finished by an
+                             interrupted build are taken from the journal
+                             instead of being embedded again.
+        """
+        self.vectorstore = None
+        # A full rebuild does not track which file produced which vector
+        self.manifest = None
+        self.sparse_index = BM25Index() if self.hybrid else None
+        self.deduplicator = self._new_deduplicator()
+        self._metadata = {}
+        self._open_checkpoint(checkpoint_path)
+        try:
+            self._add_documents(documents)
+            if self._open_file is not None and self.checkpoint is not None:
+                self.checkpoint.complete({self._open_file: None})
+            self._flush_pending()
+        except BaseException:
+            self._close_checkpoint()
+            raise
+        finally:
+            if self._owns_engine:
+                self.engine.shutdown()
+        self.version = uuid.uuid4().hex
         return self.vectorstore
     
+    def share_embeddings(self, other):
+        """
+        Use the embedding model, cache and worker pool of another manager.
+        
+        Managers of many small stores (e.g. shards) then load the model
+        once, and builds do not restart the workers for every store.
+        """
+        self.engine = other.engine
+        self.embeddings = other.embeddings
+        self._owns_engine = False
+    
+    def _new_deduplicator(self):
+        return ChunkDeduplicator(config.DEDUP_THRESHOLD) if self.dedup else None
+    
+    def _add_documents(self, documents, track_ids=False, file_path=None):
+        """
+        Embed documents batch by batch and add them to the index (and BM25).
+        
+        Args:
+            documents: Chunks to add
+            track_ids: Collect the docstore ID of every chunk
+            file_path: File all chunks come from (incremental updates).
+                       Otherwise each chunk's "source" names its file.
+        
+        Returns:
+            Tuple of (vectors added, docstore ID of each document or None).
+            IDs are only collected with track_ids; a near-duplicate chunk
+            gets the ID of the stored chunk it duplicates.
+        """
+        documents = iter(documents)
+        chunk_ids = [] if track_ids else None
+        added = 0
+        
+        while True:
+            batch = list(islice(documents, self.batch_size))
+            if not batch:
+                break
+            
+            completed = None
+            if file_path is not None:
+                files = [file_path] * len(batch)
+            else:
+                files = [doc.metadata.get("source") for doc in batch]
+                if self.checkpoint is not None:
+                    batch, files, completed = self._resume_files(batch, files)
+            
+            batch_ids = [str(uuid.uuid4()) for _ in batch]
+            duplicates = []
+            if self.deduplicator is not None:
+                with span("index.dedup_chunks", chunks=len(batch)) as stage:
+                    batch, batch_ids, files, assigned_ids, duplicates = self._drop_duplicates(
+                        batch, batch_ids, files
+                    )
+                    stage.set(duplicates=len(duplicates))
+            else:
+                assigned_ids = batch_ids
+            if chunk_ids is not None:
+                chunk_ids.extend(assigned_ids)
+            
+            texts = [doc.page_content for doc in batch]
+            metadatas = [doc.metadata for doc in batch]
+            vectors = []
+            if batch:
+                with span("index.embed", chunks=len(texts)):
+                    vectors = self.embeddings.embed_documents(texts)
+                self._add_embedded(texts, vectors, metadatas, batch_ids)
+            
+            if self.checkpoint is not None and (batch or duplicates or completed):
+                self.checkpoint.commit(files, batch_ids, texts, metadatas, vectors,
+                                       duplicates, completed)
+            added += len(batch)
+        
+        return added, chunk_ids
+    
+    def _add_embedded(self, texts, vectors, metadatas, ids):
+        """Add embedded chunks to the index (or hold them for training) and BM25."""
+        text_embeddings = list(zip(texts, vectors))
+        with span("index.add", chunks=len(texts)):
+            if self.vectorstore is None:
+                self._pending.append((text_embeddings, metadatas, ids))
+                pending_count = sum(len(p[0]) for p in self._pending)
+                if not needs_training(self.index_type) or pending_count >= self.train_size:
+                    self._flush_pending()
+            else:
+                self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            if self.sparse_index is not None:
+                self.sparse_index.add(ids, texts)
+        count("index.chunks", len(texts))
+    
+    def _open_checkpoint(self, path, base_version=None, settings=None):
+        """Start or resume the build journal at `path` (None disables it)."""
+        self._close_checkpoint()
+        self._open_file = None
+        self._finished_files = set()
+        if path is None:
+            return
+        
+        settings = dict(
+            settings or {},
+            embedding_model=self.embedding_model,
+            index_type=self.index_type,
+            index_params=self.index_params,
+            hybrid=self.hybrid,
+            dedup_threshold=config.DEDUP_THRESHOLD if self.dedup else None,
+            base_version=base_version,
+        )
+        self.checkpoint = BuildCheckpoint(path, settings)
+    
+    def _close_checkpoint(self):
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.checkpoint = None
+    
+    def _resume_files(self, batch, files):
+        """
+        Replace chunks of files finished by an interrupted build with their
+        journaled vectors, and note the files this batch finishes.
+        
+        Documents arrive file by file, so a file is finished as soon as
+        the next one starts.
+        
+        Returns:
+            Tuple of (documents to embed, their files, finished files)
+        """
+        kept, kept_files, completed = [], [], {}
+        for doc, file in zip(batch, files):
+            if file in self._finished_files:
+                continue
+            if file in self.checkpoint.files:
+                self._replay_file(file)
+                continue
+            if file != self._open_file:
+                if self._open_file is not None:
+                    completed[self._open_file] = None
+                    self._finished_files.add(self._open_file)
+                self._open_file = file
+            kept.append(doc)
+            kept_files.append(file)
+        return kept, kept_files, completed
+    
+    def _replay_file(self, file):
+        """Add the journaled chunks of a finished file without embedding them."""
+        self._finished_files.add(file)
+        added = 0
+        for ids, texts, metadatas, vectors in self.checkpoint.chunks(file):
+            if self.deduplicator is not None:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    self.deduplicator.add(doc_id, self.deduplicator.signature(text))
+                    if self.vectorstore is None:
+                        self._metadata[doc_id] = metadata
+            self._add_embedded(texts, vectors, metadatas, ids)
+            added += len(ids)
+        for doc_id, source in self.checkpoint.duplicates(file):
+            self._update_sources(doc_id, add=source)
+        count("index.replayed_chunks", added)
+        return added
+    
+    def _drop_duplicates(self, batch, batch_ids, files):
+        """
+        Split a batch into new chunks and near-duplicates of stored ones.
+        
+        The source of each duplicate is added to the chunk it duplicates.
+        
+        Returns:
+            Tuple of (new documents, their IDs, their files, ID assigned to
+            every document, (file, stored ID, source) of each duplicate)
+        """
+        kept, kept_ids, kept_files, assigned_ids, duplicates = [], [], [], [], []
+        for doc, doc_id, file in zip(batch, batch_ids, files):
+            signature = self.deduplicator.signature(doc.page_content)
+            duplicate_id = self.deduplicator.find(signature)
+            if duplicate_id is not None:
+                source = doc.metadata.get("source")
+                self._update_sources(duplicate_id, add=source)
+                assigned_ids.append(duplicate_id)
+                duplicates.append((file, duplicate_id, source))
+                continue
+            
+            self.deduplicator.add(doc_id, signature)
+            if self.vectorstore is None:
+                self._metadata[doc_id] = doc.metadata
+            kept.append(doc)
+            kept_ids.append(doc_id)
+            kept_files.append(file)
+            assigned_ids.append(doc_id)
+        return kept, kept_ids, kept_files, assigned_ids, duplicates
+    
+    def _update_sources(self, doc_id, add=None, remove=None):
+        """Add or remove a file in the `sources` metadata of a stored chunk."""
+        stored = self.vectorstore.docstore.search(doc_id) if self.vectorstore else None
+        if isinstance(stored, Document):
+            metadata = dict(stored.metadata)
+        else:
+            stored = None
+            metadata = self._metadata.get(doc_id)
+            if metadata is None:
+                return
+        
+        sources = list(metadata.get("sources") or [metadata.get("source")])
+        sources = [source for source in sources if source is not None]
+        changed = False
+        if add is not None and add not in sources:
+            sources.append(add)
+            changed = True
+        if remove is not None:
+            remaining = [s for s in sources if os.path.abspath(s) != os.path.abspath(remove)]
+            changed = changed or len(remaining) != len(sources)
+            sources = remaining
+        if not changed:
+            return
+        
+        metadata["sources"] = sources
+        if sources and metadata.get("source") not in sources:
+            metadata["source"] = sources[0]
+        
+        if stored is not None:
+            store = self.vectorstore
+            store.docstore.delete([doc_id])
+            store.docstore.add({doc_id: Document(id=doc_id, page_content=stored.page_content,
+                                                 metadata=metadata)})
+    
+    def _flush_pending(self):
+        """Build the index from the held-back batches (training it if needed)."""
+        if self.vectorstore is not None or not self._pending:
+            return
+        
+        pending, self._pending = self._pending, []
+        sample = np.array(
+            [vector for text_embeddings, _, _ in pending for _, vector in text_embeddings],
+            dtype=np.float32
+        )
+        index = build_index(self.index_type, sample, **self.index_params)
+        
+        self.vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        for text_embeddings, metadatas, ids in pending:
+            self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        self._metadata = {}
+    
+    def _delete_ids(self, ids):
+        """Remove vectors and their documents by docstore ID."""
+        if self.sparse_index is not None:
+            self.sparse_index.remove(ids)
+        if self.deduplicator is not None:
+            self.deduplicator.remove(ids)
+        
+        store = self.vectorstore
+        if supports_removal(store.index):
+            store.delete(ids)
+            return
+        
+        # IVF/HNSW cannot drop vectors and stay contiguous: re-add the rest
+        ids = set(ids)
+        keep = [
+            (position, doc_id)
+            for position, doc_id in sorted(store.index_to_docstore_id.items())
+            if doc_id not in ids
+        ]
+        rebuild_without(store.index, [position for position, _ in keep])
+        store.docstore.delete(list(ids))
+        store.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(keep)}
+    
+    def load_incremental(self, path, settings=None, checkpoint_path=None):
+        """
+        Prepare an incremental update of the vectorstore saved at `path`.
+        
+        The existing store is only reused when its manifest matches the
+        given settings; otherwise the next update rebuilds from scratch.
+        
+        With a checkpoint_path, files finished by an interrupted update of
+        the same store are restored from the journal and recorded in the
+        manifest, so they no longer show up as changed.
+        """
+        recover_publish(path)
+        settings = dict(settings or {}, embedding_model=self.embedding_model,
+                        index_type=self.index_type)
+        manifest = IndexManifest.load(path, settings)
+        
+        if not manifest.is_empty and os.path.exists(path):
+            self.load_vectorstore(path, mmap=False)
+            if self.hybrid and self.sparse_index is None:
+                # Saved without a keyword index: start over so it gets one
+                manifest = IndexManifest(manifest.settings)
+                self.vectorstore = None
+        else:
+            self.vectorstore = None
+        
+        if self.vectorstore is None:
+            self.sparse_index = BM25Index() if self.hybrid else None
+            self.deduplicator = self._new_deduplicator()
+            self._metadata = {}
+        
+        self.manifest = manifest
+        self._replaced_ids = {}
+        self._replayed_chunks = 0
+        base_version = self.version if self.vectorstore is not None else None
+        self._open_checkpoint(checkpoint_path, base_version, manifest.settings)
+        if self.checkpoint is not None:
+            for file_path, entry in self.checkpoint.files.items():
+                # Replaces the file's old vectors; its own are dropped too
+                # should it change again before this update is saved
+                self._replaced_ids[file_path] = manifest.ids_for(file_path) + entry["ids"]
+                self._replayed_chunks += self._replay_file(file_path)
+                manifest.files[file_path] = entry
+        return manifest
+    
+    def update_vectorstore(self, file_documents, deleted_files=()):
+        """
+        Embed new or changed files and drop vectors of removed ones.
+        
+        Args:
+            file_documents: Iterable of (file_path, documents) for new or
+                            changed files; documents is None for files
+                            that failed to load
+            deleted_files: Files that no longer exist
+            
+        Returns:
+            Tuple of (vectors added, vectors removed)
+        """
+        if self.manifest is None:
+            raise ValueError("No manifest loaded. Call load_incremental first.")
+        
+        # IDs each removed or re-indexed file used to have
+        previous_ids = dict(self._replaced_ids)
+        for file_path in deleted_files:
+            previous_ids.setdefault(file_path, [])
+            previous_ids[file_path] += self.manifest.remove(file_path)
+        
+        added = self._replayed_chunks
+        self._replaced_ids = {}
+        self._replayed_chunks = 0
+        try:
+            for file_path, documents in file_documents:
+                if documents is None:
+                    # Failed to load: keep the old vectors and retry next run
+                    continue
+                
+                file_path = os.path.abspath(file_path)
+                previous_ids.setdefault(file_path, self.manifest.ids_for(file_path))
+                file_added, ids = self._add_documents(documents, track_ids=True,
+                                                      file_path=file_path)
+                added += file_added
+                self.manifest.record(file_path, ids)
+                if self.checkpoint is not None:
+                    self.checkpoint.complete({file_path: self.manifest.files[file_path]})
+            
+            self._flush_pending()
+        except BaseException:
+            self._close_checkpoint()
+            raise
+        finally:
+            if self._owns_engine:
+                self.engine.shutdown()
+        
+        # Vectors shared with other files (deduplicated chunks) stay until
+        # no file uses them; they only lose this file as a source
+        referenced = self.manifest.referenced_ids()
+        stale_ids = []
+        for file_path, ids in previous_ids.items():
+            current = set(self.manifest.ids_for(file_path))
+            for doc_id in dict.fromkeys(ids):
+                if doc_id not in referenced:
+                    stale_ids.append(doc_id)
+                elif doc_id not in current and self.deduplicator is not None:
+                    self._update_sources(doc_id, remove=file_path)
+        stale_ids = list(dict.fromkeys(stale_ids))
+        
+        if stale_ids and self.vectorstore is not None:
+            known_ids = set(self.vectorstore.index_to_docstore_id.values())
+            stale_ids = [i for i in stale_ids if i in known_ids]
+            if stale_ids:
+                self._delete_ids(stale_ids)
+        
+        if added or stale_ids:
+            self.version = uuid.uuid4().hex
+        
+        return added, len(stale_ids)
+    
     def save_vectorstore(self, path):
-        """Save the vectorstore to disk."""
+        """
+        Save the vectorstore to disk.
+        
+        The index is written with faiss and the chunks to SQLite (see
+        tmp/diskStore.py); nothing is pickled. Afterwards the in-memory
+        docstore is swapped for the saved one, releasing the chunk text.
+        
+        Everything is written to a staging directory, stamped with the
+        version and then renamed over `path`, so a crash while saving
+        leaves the previous store intact. The build checkpoint is deleted
+        once the new store is in place.
+        """
         if self.vectorstore is None:
             raise ValueError("No vectorstore to save. Create one first.")
-        self.vectorstore.save_local(path)
-    
-    def load_vectorstore(self, path):
-        """Load a vectorstore from disk."""
-        self.vectorstore = FAISS.load_local(
-            path, 
-            self.embeddings,
-            allow_dangerous_deserialization=True
+        
+        store = self.vectorstore
+        staging = staging_path(path)
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        
+        with span("index.save", vectors=store.index.ntotal):
+            save_store(staging, store.index, store.docstore, store.index_to_docstore_id,
+                       version=self.version)
+            if self.sparse_index is not None:
+                self.sparse_index.save(staging, version=self.version)
+            if self.deduplicator is not None:
+                self.deduplicator.save(staging, version=self.version)
+            # A full rebuild saves no manifest: an old one would not match the index
+            if self.manifest is not None:
+                self.manifest.save(staging)
+            write_stamp(staging, self.version, vectors=store.index.ntotal,
+                        embedding_model=self.embedding_model, index_type=self.index_type)
+            
+            # Let go of the files being replaced before renaming (Windows)
+            for source in (store.docstore, store.index_to_docstore_id):
+                if isinstance(source, (SQLiteDocstore, SQLiteIndexMap)):
+                    source.close()
+            publish(staging, path)
+        
+        db_path = os.path.join(path, DOCSTORE_FILENAME)
+        store.docstore = SQLiteDocstore(db_path)
+        store.index_to_docstore_id = SQLiteIndexMap(db_path)
+        
+        if self.checkpoint is not None:
+            self.checkpoint.discard()
+            self.checkpoint = None
+    
+    def load_vectorstore(self, path, mmap=True):
+        """
+        Load a vectorstore from disk.
+        
+        The index is memory-mapped and chunks are read from SQLite only
+        when a search returns them, so loading takes milliseconds and
+        processes on the same host share the OS page cache.
+        
+        Args:
+            path: Directory the vectorstore was saved to
+            mmap: Map the index read-only. Pass False to modify it.
+        """
+        if not wait_for_publish(path):
+            # A save was interrupted between moving the old store away
+            # and renaming the new one into place
+            recover_publish(path)
+        
+        if is_legacy_store(path):
+            if not config.ALLOW_LEGACY_PICKLE_LOAD:
+                raise ValueError(
+                    f"'{path}' was saved in the old pickle format. Rebuild it, or set "
+                    "ALLOW_LEGACY_PICKLE_LOAD = True in config.py once to convert it."
+                )
+            # Trusted local file: load it once and rewrite it in the new format
+            legacy = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            save_store(path, legacy.index, legacy.docstore, legacy.index_to_docstore_id,
+                       version=uuid.uuid4().hex)
+        
+        if not os.path.exists(os.path.join(path, DOCSTORE_FILENAME)):
+            raise ValueError(f"No saved vectorstore found at '{path}'")
+        
+        with span("index.load", mmap=mmap):
+            index, docstore, index_to_docstore_id = load_store(path, mmap=mmap)
+        self.version = read_version(path) or uuid.uuid4().hex
+        self.vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id
         )
+        
+        self.sparse_index = None
+        if self.hybrid and os.path.exists(os.path.join(path, SPARSE_FILENAME)):
+            sparse_index = BM25Index.load(path, lazy=mmap)
+            # Only use it if it was saved together with this index
+            if sparse_index.version == self.version:
+                self.sparse_index = sparse_index
+            else:
+                sparse_index.close()
+        if self.hybrid and self.sparse_index is None:
+            print("⚠ No keyword index saved with this vectorstore; using vector search only. "
+                  "Rebuild it to enable hybrid search.")
+        
+        # Only needed to add chunks, so read-only loads skip it
+        self.deduplicator = None
+        self._metadata = {}
+        if self.dedup and not mmap:
+            self.deduplicator = ChunkDeduplicator.load(path, config.DEDUP_THRESHOLD)
+            if self.deduplicator is None or self.deduplicator.version != self.version:
+                self.deduplicator = self._deduplicator_from_store()
+        
+        if os.path.exists(IndexManifest.manifest_path(path)):
+            self.manifest = IndexManifest.load(path)
+        else:
+            self.manifest = None
         return self.vectorstore
     
-    def get_retriever(self, search_kwargs=None):
-        """Get a retriever from the vectorstore."""
+    def _deduplicator_from_store(self):
+        """Compute signatures for the chunks of the loaded vectorstore."""
+        print("Computing duplicate-detection signatures for stored chunks...")
+        deduplicator = self._new_deduplicator()
+        store = self.vectorstore
+        for doc_id in store.index_to_docstore_id.values():
+            doc = store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                deduplicator.add(doc_id, deduplicator.signature(doc.page_content))
+        return deduplicator
+    
+    def get_retriever(self, search_kwargs=None, nprobe=config.FAISS_NPROBE,
+                      ef_search=config.FAISS_EF_SEARCH):
+        """
+        Get a retriever from the vectorstore.
+        
+        When a BM25 index is available this is a HybridRetriever fusing
+        vector and keyword results; otherwise plain similarity search.
+        
+        Args:
+            search_kwargs: Passed to the LangChain retriever (e.g. {"k": 4})
+            nprobe: IVF lists scanned per query (IVF index types only)
+            ef_search: HNSW candidate list size (HNSW index type only)
+        """
         if self.vectorstore is None:
             raise ValueError("No vectorstore available. Create or load one first.")
         
+        set_search_params(self.vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+        
+        if self.sparse_index is not None:
+            k = (search_kwargs or {}).get("k", config.HYBRID_K)
+            return HybridRetriever(
+                vectorstore=self.vectorstore,
+                sparse_index=self.sparse_index,
+                k=k,
+                fetch_k=max(config.HYBRID_FETCH_K, k),
+                rrf_k=config.HYBRID_RRF_K,
+                dense_weight=config.HYBRID_DENSE_WEIGHT,
+                sparse_weight=config.HYBRID_SPARSE_WEIGHT
+            )
+        
         if search_kwargs is None:
             return self.vectorstore.as_retriever()
-        return self.vectorstore.as_retriever(search_kwargs=search_kwargs)
\ No newline at end of file
+        return self.vectorstore.as_retriever(search_kwargs=search_kwargs)
+
+
+def batch_retrieve(retriever, queries):
+    """
+    Retrieve documents for many queries at once.
+    
+    For FAISS similarity, hybrid and sharded retrievers, all queries are
+    embedded in one call and searched with a single vectorized
+    index.search (per shard). Other retrievers fall back to their own
+    batch method.
+    
+    Returns:
+        List with one list of Documents per query, in order
+    """
+    # Hybrid and sharded retrievers search many queries at once themselves
+    if hasattr(retriever, "batch_documents"):
+        return retriever.batch_documents(queries)
+    
+    store = getattr(retriever, "vectorstore", None)
+    if not isinstance(store, FAISS) or retriever.search_type != "similarity":
+        return retriever.batch(queries)
+    
+    return dense_search(store, queries, retriever.search_kwargs.get("k", 4))